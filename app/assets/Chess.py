@@ -1,22 +1,33 @@
 import sys
-from dotenv import load_dotenv
-load_dotenv()
-
-from datetime import datetime
+import hashlib
+import json
+from datetime import datetime, timezone
 import re
+import time
 from dateutil.relativedelta import relativedelta
 from pathlib import Path
+import numpy as np
 import pandas as pd
-from sqlalchemy import Table, MetaData, Column, Integer, String, Float
+from sqlalchemy import Table, MetaData, Column, Integer, String, Float, text, bindparam
+from sqlalchemy.sql.elements import TextClause
 import os
 
-# Adding this to decide how module should be imported: with app. prefix is for pytest running, without it is for running the script
-if r'\app' in os.getcwd() or r'/app' in os.getcwd():
+# Modules are imported without app. prefix when running the pipeline from the app folder and with it for pytest runs.
+# Environment variables are loaded by the pipeline entry points, not on import.
+try:
     from connectors.postgresql import PostgreSqlClient
-    from connectors.Chess import ChessApiClient    
-else:
+    from connectors.Chess import ChessApiClient
+    from connectors.raw_archive import RawArchiveLake
+    from connectors.parquet_checkpoint import ParquetCheckpoint
+    from assets.opening_classifier import OpeningTrie
+    from assets.game_store import GameStore, get_game_id
+except ModuleNotFoundError:
     from app.connectors.postgresql import PostgreSqlClient
     from app.connectors.Chess import ChessApiClient
+    from app.connectors.raw_archive import RawArchiveLake
+    from app.connectors.parquet_checkpoint import ParquetCheckpoint
+    from app.assets.opening_classifier import OpeningTrie
+    from app.assets.game_store import GameStore, get_game_id
 
 
 def generate_monthly_dates(start_date: str, end_date: str) -> list[datetime]:
@@ -64,13 +75,108 @@ def generate_monthly_dates(start_date: str, end_date: str) -> list[datetime]:
 
     return dates
 
-def extract_games(start_date: str, end_date: str, chess_api_client: ChessApiClient) -> pd.DataFrame:
-
+def generate_months(start_date: str, end_date: str) -> list[str]:
+    """
+    Returns the months ('YYYY-MM') between start_date and end_date ('YYYY-MM-DD'), both included.
+    """
+    month = datetime.strptime(start_date[:7], "%Y-%m")
+    end = datetime.strptime(end_date[:7], "%Y-%m")
+    months = []
+    while month <= end:
+        months.append(month.strftime("%Y-%m"))
+        month += relativedelta(months=1)
+    return months
+
+def get_month_window(month: str) -> tuple[str, str]:
+    """
+    Returns the first and last day ('YYYY-MM-DD') of a month ('YYYY-MM'), the date window extracting a single month.
+    """
+    start = datetime.strptime(month, "%Y-%m")
+    end = start + relativedelta(months=1, days=-1)
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+def get_archive_fingerprint(games: list[dict]) -> str:
+  """
+  Returns a fingerprint (sha1) of a monthly games archive, independent of the key order of the response
+  """
+  return hashlib.sha1(json.dumps(games, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+# Date header of a PGN, found without parsing the other headers ("UTCDate" and "EndDate" don't match)
+PGN_DATE_HEADER = re.compile(r'\[Date "(\d{4})\.(\d{2})\.(\d{2})"\]')
+# live games end within a day of their start, daily games carry their start epoch in the archive
+MAX_LIVE_GAME_SEC = 86400
+# margin around the window for PGN dates which are not in UTC
+WINDOW_MARGIN_SEC = 86400
+
+def get_epoch_window(start_date: datetime, end_date: datetime) -> tuple[int, int]:
+  """
+  Returns the (min, max) epoch of the raw `start_time`/`end_time` of games which may have started between
+  start_date and end_date (both days included), with a margin for time zones
+  """
+  min_epoch = int(start_date.replace(tzinfo=timezone.utc).timestamp()) - WINDOW_MARGIN_SEC
+  max_epoch = int((end_date + relativedelta(days=1)).replace(tzinfo=timezone.utc).timestamp()) + WINDOW_MARGIN_SEC
+  return min_epoch, max_epoch
+
+def is_outside_epoch_window(game: dict, min_epoch: int, max_epoch: int) -> bool:
+  """
+  Checks on the raw epochs of a game if it surely did not start within the window (see get_epoch_window),
+  so it can be dropped before its PGN is parsed. Games close to the window edges are kept.
+  """
+  end_time = game.get("end_time")
+  if end_time is not None and end_time < min_epoch:
+      return True
+  start_time = game.get("start_time")
+  if start_time is not None:
+      return start_time < min_epoch or start_time >= max_epoch
+  return end_time is not None and end_time >= max_epoch + MAX_LIVE_GAME_SEC
+
+def get_pgn_date(pgn: str) -> str:
+  """Returns the Date header of a PGN as 'YYYY-MM-DD' (the start_date of parse_game), None if it is missing"""
+  date_header = PGN_DATE_HEADER.search(pgn) if pgn is not None else None
+  if date_header is None:
+      return None
+  return "-".join(date_header.groups())
+
+def extract_games(start_date: str,
+                  end_date: str,
+                  chess_api_client: ChessApiClient,
+                  raw_archive: RawArchiveLake = None,
+                  stats: dict = None,
+                  game_store: GameStore = None) -> pd.DataFrame:
+  """
+  Extracts and parses the games played by a user between start_date and end_date.
+
+  Parameters:
+  - start_date (str): The start date in the format 'YYYY-MM-DD'.
+  - end_date (str): The end date in the format 'YYYY-MM-DD'.
+  - chess_api_client (ChessApiClient): client to get monthly games from. A RawArchiveChessClient can be passed
+    to replay games from the raw archive lake instead of calling the API.
+  - raw_archive (RawArchiveLake): optional lake to persist each raw monthly response to.
+  - stats (dict): optional dict filled with `games_fetched`, `games_skipped` (dropped before parsing), `games_parsed`,
+    `parse_sec` (time spent in filtering and parse_game) and `archive_fingerprints` (month 'YYYY-MM' -> fingerprint of its raw archive, see get_archive_fingerprint).
+  - game_store (GameStore): optional store of the games parsed earlier in the run, games other tracked users
+    played against this user are not parsed again.
+
+  Returns:
+  - pd.DataFrame: parsed games which were started within the window.
+
+  Games of the partial first and last months are dropped before parsing: first on the raw end_time/start_time
+  epochs (see is_outside_epoch_window), then on the PGN Date header alone (see get_pgn_date). Only the remaining
+  games get the full header parse and move split.
+  """
   months = generate_monthly_dates(start_date, end_date)
   valid_games = []
   start_date = months[0]
   end_date = months[-1]
+  min_epoch, max_epoch = get_epoch_window(start_date, end_date)
+  start_day = start_date.strftime('%Y-%m-%d')
+  end_day = end_date.strftime('%Y-%m-%d')
   dates_ran = []
+  games_fetched = 0
+  games_skipped = 0
+  games_parsed = 0
+  parse_sec = 0.0
+  archive_fingerprints = {}
   for date in months:
       month_str = date.strftime('%Y-%m')
       year = date.year
@@ -78,12 +184,42 @@ def extract_games(start_date: str, end_date: str, chess_api_client: ChessApiClie
       if month_str not in dates_ran:
         dates_ran.append(month_str)
         games = chess_api_client.get_monthly_games(year=year, month=month)
+        if games is None:
+            raise Exception(f"No games returned for user {chess_api_client.username} and month {month_str}")
+        if raw_archive is not None:
+            raw_archive.write_monthly_games(username=chess_api_client.username, year=year, month=month, games=games)
+        games_fetched += len(games)
+        if stats is not None:
+            archive_fingerprints[month_str] = get_archive_fingerprint(games)
+        parse_start = time.perf_counter()
         for game in games:
-            parsed_game = parse_game(game, chess_api_client.username)
+            if is_outside_epoch_window(game, min_epoch, max_epoch):
+                games_skipped += 1
+                continue
+            pgn_date = get_pgn_date(game.get('pgn'))
+            if pgn_date is not None and not start_day <= pgn_date <= end_day:
+                games_skipped += 1
+                continue
+            if game_store is not None:
+                game_facts = game_store.get(get_game_id(game.get('url')))
+                if game_facts is None:
+                    game_facts = parse_game_facts(game)
+                    if game_facts is not None:
+                        game_store.add(game_facts)
+                parsed_game = get_user_view(game_facts, chess_api_client.username, game.get('pgn')) if game_facts is not None else None
+            else:
+                parsed_game = parse_game(game, chess_api_client.username)
             if parsed_game is not None:
-                game_date = datetime.strptime(parsed_game.get("start_date"),'%Y-%m-%d')
-                if start_date <= game_date <= end_date:
+                games_parsed += 1
+                if start_day <= parsed_game.get("start_date") <= end_day:
                     valid_games.append(parsed_game)
+        parse_sec += time.perf_counter() - parse_start
+  if stats is not None:
+      stats.update(games_fetched=games_fetched,
+                   games_skipped=games_skipped,
+                   games_parsed=games_parsed,
+                   parse_sec=parse_sec,
+                   archive_fingerprints=archive_fingerprints)
   return pd.DataFrame(valid_games)
 
 def incremental_modify_dates(ChessApiClient: ChessApiClient,
@@ -132,7 +268,10 @@ def incremental_modify_dates(ChessApiClient: ChessApiClient,
     if PostgreSqlClient.table_exists(table_name=target_table):
         max_value = PostgreSqlClient.engine.execute(statement).fetchall()[0][0]
         if max_value is not None:
-            start_date = datetime.strptime(max_value,'%Y-%m-%d') + relativedelta(days=-2)
+            # typed games tables return a date, legacy ones a 'YYYY-MM-DD' string
+            if isinstance(max_value, str):
+                max_value = datetime.strptime(max_value,'%Y-%m-%d')
+            start_date = max_value + relativedelta(days=-2)
             end_date = datetime.now()
             start_date = start_date.strftime('%Y-%m-%d')
             end_date = end_date.strftime('%Y-%m-%d')
@@ -160,52 +299,68 @@ def pgn_to_dict(pgn: list) -> dict:
             pgn_dict['moves_row'] = moves
     return pgn_dict
 
-def parse_game(game: dict, username: str) -> dict:
-    parsed_game = {}
+def parse_game_facts(game: dict) -> dict:
+    """
+    Parses the facts of a game which don't depend on whose archive it came from: both players with their
+    ratings, results and accuracies, and the PGN derived fields. The PGN itself is not kept, as the facts of
+    shared games stay in the GameStore for the whole run. Returns None for games without PGN.
+    """
     if game.get('pgn') is None:
         return
-    parsed_game["game_url"] = game.get('url')
-    parsed_game["pgn"] = game.get('pgn')
-    parsed_game["game_id"] = re.search(r"(live|daily)\/(\d+)$",parsed_game["game_url"]).group(2)
-    parsed_game["time_class"] = game.get("time_class")
-    parsed_game['end_date_time'] = game.get("end_time")
-    parsed_game["username"] = username
-
-    if game.get("white").get("username").lower() == username or game.get("white").get("username") == username:
-        parsed_game["user_color"] = "white"
-        parsed_game["user_rating"] = game.get("white").get("rating")
-        parsed_game["opponent"] = game.get("black").get("username")
-        parsed_game["opponent_rating"] = game.get("black").get("rating")
-        parsed_game["opponent_url"] = f"https://www.chess.com/member/{parsed_game['opponent']}"
-        parsed_game["result"] = game.get("white").get("result")
-        if game.get("accuracies") is not None:
-            parsed_game["user_accuracy"] = game.get("accuracies").get("white")
-            parsed_game["opponent_accuracy"] = game.get("accuracies").get("black")
-        else:
-            parsed_game["user_accuracy"] = None
-            parsed_game["opponent_accuracy"] = None
+    game_facts = {}
+    game_facts["game_url"] = game.get('url')
+    game_facts["game_id"] = get_game_id(game_facts["game_url"])
+    game_facts["time_class"] = game.get("time_class")
+    game_facts['end_date_time'] = game.get("end_time")
+    accuracies = game.get("accuracies") or {}
+    for color in ["white", "black"]:
+        game_facts[f"{color}_username"] = game.get(color).get("username")
+        game_facts[f"{color}_rating"] = game.get(color).get("rating")
+        game_facts[f"{color}_result"] = game.get(color).get("result")
+        game_facts[f"{color}_accuracy"] = accuracies.get(color)
+    parsed_pgn = pgn_to_dict(game.get('pgn'))
+    game_facts["pgn_result"] = parsed_pgn.get('Result')
+    game_facts["start_date"] = parsed_pgn.get("Date").replace('.','-')
+    game_facts["ECO"] = parsed_pgn.get("ECO")
+    game_facts["ECOUrl"] = parsed_pgn.get("ECOUrl")
+    game_facts["start_time"] = parsed_pgn.get("StartTime")
+    game_facts['moves_per_player'] = parsed_pgn.get("moves_count_per_player")
+    return game_facts
+
+def get_user_view(game_facts: dict, username: str, pgn: str) -> dict:
+    """
+    Returns the game as seen by one of its players: the user's color, rating and result and the opponent's,
+    with the PGN of the game from the user's archive
+    """
+    if game_facts["white_username"].lower() == username or game_facts["white_username"] == username:
+        user_color, opponent_color = "white", "black"
     else:
-        parsed_game["user_color"] = "black"
-        parsed_game["user_rating"] = game.get("black").get("rating")
-        parsed_game["opponent"] = game.get("white").get("username")
-        parsed_game["opponent_rating"] = game.get("white").get("rating")
-        parsed_game["opponent_url"] = f"https://www.chess.com/member/{parsed_game['opponent']}"
-        parsed_game["result"] = game.get("black").get("result")
-        if game.get("accuracies") is not None:
-            parsed_game["user_accuracy"] = game.get("accuracies").get("black")
-            parsed_game["opponent_accuracy"] = game.get("accuracies").get("white")
-        else:
-            parsed_game["user_accuracy"] = None
-            parsed_game["opponent_accuracy"] = None
-    parsed_pgn = pgn_to_dict(parsed_game["pgn"])
-    parsed_game["pgn_result"] = parsed_pgn.get('Result')
-    parsed_game["start_date"] = parsed_pgn.get("Date").replace('.','-')
-    parsed_game["ECO"] = parsed_pgn.get("ECO")
-    parsed_game["ECOUrl"] = parsed_pgn.get("ECOUrl")
-    parsed_game["start_time"] = parsed_pgn.get("StartTime")
-    parsed_game['moves_per_player'] = parsed_pgn.get("moves_count_per_player")
+        user_color, opponent_color = "black", "white"
+    parsed_game = {}
+    parsed_game["game_url"] = game_facts["game_url"]
+    parsed_game["pgn"] = pgn
+    parsed_game["game_id"] = game_facts["game_id"]
+    parsed_game["time_class"] = game_facts["time_class"]
+    parsed_game['end_date_time'] = game_facts['end_date_time']
+    parsed_game["username"] = username
+    parsed_game["user_color"] = user_color
+    parsed_game["user_rating"] = game_facts[f"{user_color}_rating"]
+    parsed_game["opponent"] = game_facts[f"{opponent_color}_username"]
+    parsed_game["opponent_rating"] = game_facts[f"{opponent_color}_rating"]
+    parsed_game["opponent_url"] = f"https://www.chess.com/member/{parsed_game['opponent']}"
+    parsed_game["result"] = game_facts[f"{user_color}_result"]
+    parsed_game["user_accuracy"] = game_facts[f"{user_color}_accuracy"]
+    parsed_game["opponent_accuracy"] = game_facts[f"{opponent_color}_accuracy"]
+    for key in ["pgn_result", "start_date", "ECO", "ECOUrl", "start_time", "moves_per_player"]:
+        parsed_game[key] = game_facts[key]
     return parsed_game
 
+def parse_game(game: dict, username: str) -> dict:
+    game_facts = parse_game_facts(game)
+    if game_facts is None:
+        return
+    return get_user_view(game_facts, username, game.get('pgn'))
+
 def extract_eco_codes(eco_codes_path: Path) -> pd.DataFrame:
     """Extracts data from the eco codes file
        run to test: extract_eco_codes('./data/eco_codes.csv')
@@ -248,7 +403,108 @@ def _get_avg_move_time(valid_games:pd.DataFrame)-> pd.DataFrame:
               raise Exception("The User does not have a valid color i.e either white or black")
       return valid_games
 
-def transform(valid_games: pd.DataFrame, eco_codes: pd.DataFrame):
+def get_move_times(pgn: str) -> dict:
+    """
+    Parses the clock comments of a PGN into per ply clocks and think times (in seconds).
+
+    Plies alternate between white (even indexes) and black (odd indexes). The think time of a ply is the mover's
+    previous clock (the base time for their first move) minus the clock after the move, plus the increment.
+    Daily games ("1/seconds per move") have no running clock: each clock is the time left of the move's own
+    allowance, so the think time is the allowance minus the clock. Think times are NaN without a time control.
+
+    Returns:
+    - dict: time_control, base_time_sec, increment_sec, clocks_sec and think_times_sec
+    """
+    time_control = re.search(r'\[TimeControl "([^"]*)"\]', pgn)
+    time_control = time_control.group(1) if time_control is not None else None
+    base_time_sec, increment_sec, move_time_sec = None, 0.0, None
+    # live games have "base" or "base+increment" time controls, daily games "1/seconds per move"
+    if time_control is not None and "/" in time_control:
+        move_time_sec = float(time_control.partition("/")[2])
+    elif time_control is not None and time_control != "-":
+        base, _, increment = time_control.partition("+")
+        base_time_sec = float(base)
+        increment_sec = float(increment) if increment else 0.0
+    clocks = [
+        int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        for hours, minutes, seconds in re.findall(r'\[%clk (\d+):(\d+):(\d+(?:\.\d+)?)\]', pgn)
+    ]
+    think_times = []
+    for ply, clock in enumerate(clocks):
+        if move_time_sec is not None:
+            think_times.append(round(move_time_sec - clock, 1))
+            continue
+        previous_clock = clocks[ply - 2] if ply >= 2 else base_time_sec
+        if previous_clock is None:
+            think_times.append(float("nan"))
+        else:
+            think_times.append(round(previous_clock - clock + increment_sec, 1))
+    return {
+        "time_control": time_control,
+        "base_time_sec": base_time_sec,
+        "increment_sec": increment_sec,
+        "clocks_sec": clocks,
+        "think_times_sec": think_times,
+    }
+
+def transform_moves(valid_games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Transforms the PGN of each game into a row of the game_moves table, so time analytics don't need the PGN again.
+    Games seen from both players' perspectives are stored once.
+    """
+    game_moves = []
+    for game_id, pgn in valid_games[["game_id", "pgn"]].drop_duplicates(subset="game_id").itertuples(index=False):
+        move_times = get_move_times(pgn)
+        move_times["game_id"] = game_id
+        move_times["plies"] = len(move_times["clocks_sec"])
+        game_moves.append(move_times)
+    return pd.DataFrame(game_moves, columns=['game_id',
+                                             'time_control',
+                                             'base_time_sec',
+                                             'increment_sec',
+                                             'plies',
+                                             'clocks_sec',
+                                             'think_times_sec'])
+
+def transform_game_facts(game_facts: list[dict]) -> pd.DataFrame:
+    """
+    Transforms the facts of each game (see parse_game_facts) into a row of the game_facts table, without the PGN
+    """
+    game_facts = pd.DataFrame(game_facts)
+    game_facts['start_date'] = pd.to_datetime(game_facts['start_date']).dt.date
+    game_facts['end_date_time'] = pd.to_datetime(game_facts['end_date_time'], unit='s')
+    return game_facts.rename(columns={'ECO': 'eco', 'ECOUrl': 'eco_url'})[['game_id',
+                                                                            'game_url',
+                                                                            'time_class',
+                                                                            'start_date',
+                                                                            'start_time',
+                                                                            'end_date_time',
+                                                                            'white_username',
+                                                                            'white_rating',
+                                                                            'white_result',
+                                                                            'white_accuracy',
+                                                                            'black_username',
+                                                                            'black_rating',
+                                                                            'black_result',
+                                                                            'black_accuracy',
+                                                                            'pgn_result',
+                                                                            'eco',
+                                                                            'eco_url',
+                                                                            'moves_per_player']]
+
+def classify_openings(valid_games: pd.DataFrame, eco_codes: pd.DataFrame, opening_classifier: OpeningTrie) -> pd.Series:
+    """
+    Labels each game with the opening variation found by walking its moves down the opening trie.
+    Games which leave the known lines before any opening matches get the name of their ECO code.
+    """
+    eco_names = dict(zip(eco_codes['ECO'], eco_codes['Desc']))
+    openings = []
+    for pgn, eco in valid_games[['pgn', 'ECO']].itertuples(index=False):
+        opening = opening_classifier.classify_pgn(pgn)
+        openings.append(opening[1] if opening is not None else eco_names.get(eco))
+    return pd.Series(openings, index=valid_games.index, dtype=object)
+
+def transform(valid_games: pd.DataFrame, eco_codes: pd.DataFrame, opening_classifier: OpeningTrie = None):
     valid_games=_get_avg_move_time(pd.DataFrame(valid_games))
     valid_games["start_date_time"]= valid_games["start_date"].astype(str) + " " + valid_games["start_time"].astype(str)
     valid_games['start_date_time'] = valid_games['start_date_time'].astype('datetime64')
@@ -261,7 +517,11 @@ def transform(valid_games: pd.DataFrame, eco_codes: pd.DataFrame):
     valid_games['game_duration'] = valid_games['game_duration'].apply(format_timedelta)
     valid_games['match_result'] = valid_games['pgn_result'].map({'1-0':'win','0-1':'defet','1/2-1/2':'draw'})
     valid_games['user_avg_move_time_sec'] =     valid_games['user_avg_move_time_sec'].round(1)
-    transformed_games = valid_games.merge(eco_codes, on='ECO', how='left')
+    if opening_classifier is None:
+        transformed_games = valid_games.merge(eco_codes, on='ECO', how='left')
+    else:
+        transformed_games = valid_games
+        transformed_games['Desc'] = classify_openings(valid_games, eco_codes, opening_classifier)
     transformed_games.drop(columns=['pgn','opponent_url','start_time','ECO','ECOUrl','pgn_result'], inplace=True)
     transformed_games.rename(columns={'time_class':'game_mode',
                                 'moves_per_player':'rounds',
@@ -290,6 +550,90 @@ def transform(valid_games: pd.DataFrame, eco_codes: pd.DataFrame):
                                            'opening']]
     return transformed_games
 
+# clock comments counted by _get_avg_move_time (clocks without tenths of a second are not matched)
+CLOCK_COMMENT = re.compile(r'\[%clk (\d+):(\d+):(\d+\.\d+)\]')
+# low cardinality text columns stored as categoricals by transform_columnar
+CATEGORICAL_COLUMNS = ['game_mode', 'user_color', 'match_result', 'result_subcategory', 'opening']
+
+def get_user_avg_move_time(pgn: str, user_color: str) -> float:
+    """
+    Average time (seconds) the user spent per move, the same arithmetic as _get_avg_move_time for a single game,
+    converting only the clocks of the user's moves
+    """
+    clocks = CLOCK_COMMENT.findall(pgn)
+    if user_color == "white":
+        user_clocks = clocks[0::2]
+    elif user_color == "black":
+        user_clocks = clocks[1::2]
+    else:
+        raise Exception("The User does not have a valid color i.e either white or black")
+    user_times = [int(hours) * 3600 + int(minutes) * 60 + float(seconds) for hours, minutes, seconds in user_clocks]
+    time_spent = [user_times[i] - user_times[i + 1] for i in range(len(user_times) - 1)]
+    return sum(time_spent) / len(time_spent) if time_spent else 0
+
+def format_durations(duration_sec: pd.Series) -> pd.Series:
+    """
+    Formats durations in seconds as HH:MM:SS like format_timedelta, on whole columns instead of row by row
+    """
+    hours, remainder = np.divmod(duration_sec.to_numpy(), 3600)
+    minutes, seconds = np.divmod(remainder, 60)
+    return (
+        pd.Series(hours, index=duration_sec.index).astype(str).str.zfill(2)
+        + ':' + pd.Series(minutes, index=duration_sec.index).astype(str).str.zfill(2)
+        + ':' + pd.Series(seconds, index=duration_sec.index).astype(str).str.zfill(2)
+    )
+
+def transform_columnar(valid_games: pd.DataFrame, eco_codes: pd.DataFrame, opening_classifier: OpeningTrie = None) -> pd.DataFrame:
+    """
+    Columnar version of `transform` with the same output values, meant for large batches of games.
+
+    Every output column is computed once from the parsed games, without row by row pandas access or copies of
+    the whole frame, and the parsed games are left unchanged. Dates and durations are converted and formatted
+    on whole columns, and the low cardinality text columns (see CATEGORICAL_COLUMNS) are categoricals.
+    """
+    valid_games = pd.DataFrame(valid_games)
+    start_date_time = pd.to_datetime(valid_games['start_date'], format='%Y-%m-%d') + pd.to_timedelta(valid_games['start_time'])
+    end_date_time = pd.to_datetime(valid_games['end_date_time'], unit='s')
+    game_duration_sec = (end_date_time - start_date_time).dt.total_seconds().astype('int')
+    user_avg_move_time_sec = pd.Series(
+        [get_user_avg_move_time(pgn, user_color) for pgn, user_color in zip(valid_games['pgn'], valid_games['user_color'])],
+        index=valid_games.index,
+        dtype=float,
+    )
+    if opening_classifier is None:
+        opening = valid_games['ECO'].map(dict(zip(eco_codes['ECO'], eco_codes['Desc'])))
+    else:
+        opening = classify_openings(valid_games, eco_codes, opening_classifier)
+    transformed_games = pd.DataFrame({
+        'game_id': valid_games['game_id'],
+        'game_url': valid_games['game_url'],
+        'game_mode': valid_games['time_class'],
+        'start_date': valid_games['start_date'],
+        'username': valid_games['username'],
+        'user_color': valid_games['user_color'],
+        'user_rating': valid_games['user_rating'],
+        'user_accuracy': valid_games['user_accuracy'],
+        'opponent': valid_games['opponent'],
+        'opponent_rating': valid_games['opponent_rating'],
+        'opponent_accuracy': valid_games['opponent_accuracy'],
+        'rating_diff': valid_games['user_rating'] - valid_games['opponent_rating'],
+        'match_result': valid_games['pgn_result'].map({'1-0':'win','0-1':'defet','1/2-1/2':'draw'}),
+        'result_subcategory': valid_games['result'],
+        'start_date_time': start_date_time,
+        'end_date_time': end_date_time,
+        'game_duration': format_durations(game_duration_sec),
+        'game_duration_sec': game_duration_sec,
+        'rounds': valid_games['moves_per_player'],
+        'user_avg_move_time_sec': user_avg_move_time_sec.round(1),
+        'opening': opening,
+    })
+    for column in CATEGORICAL_COLUMNS:
+        transformed_games[column] = transformed_games[column].astype('category')
+    if opening_classifier is None:
+        # transform merges the eco codes, which renumbers the rows
+        transformed_games.reset_index(drop=True, inplace=True)
+    return transformed_games
+
 def transform_players(df: pd.DataFrame) -> pd.DataFrame:
     """
     Transforms the 'last_online' and 'joined' columns in players data to datetime format.
@@ -348,3 +692,167 @@ def load(
         raise Exception(
             "Please specify a correct load method: [insert, upsert, overwrite]"
         )
+
+
+def get_daily_ratings_sql(games_table: str, table_name: str, backfill: bool = False) -> list[TextClause]:
+    """
+    Returns the statements refreshing the daily ratings of the user bound to `:username`: the upsert of the last
+    rating of each touched (game mode, day) in `:dates` and the update of the deltas from the earliest touched day
+    (`:first_date`) on. With backfill all days of the user are refreshed and no dates are bound.
+    """
+    dates_filter = "" if backfill else "and start_date in :dates"
+    deltas_filter = "" if backfill else f"and {table_name}.start_date >= :first_date"
+    # start_date_time strings of legacy games tables sort like timestamps, so no cast is needed
+    upsert_sql = text(f"""
+        with touched_days as (
+            select distinct username, game_mode, start_date
+            from {games_table}
+            where username = :username {dates_filter}
+        )
+        insert into {table_name} (username, game_mode, start_date, last_rating, games_count)
+        select touched_days.username, touched_days.game_mode::text, touched_days.start_date::date, last_game.user_rating, last_game.games_count
+        from touched_days
+        cross join lateral (
+            select user_rating, count(*) over () as games_count
+            from {games_table} as games
+            where games.username = touched_days.username
+                and games.game_mode = touched_days.game_mode
+                and games.start_date = touched_days.start_date
+            order by games.start_date_time desc
+            limit 1
+        ) as last_game
+        on conflict (username, game_mode, start_date) do update
+        set last_rating = excluded.last_rating, games_count = excluded.games_count
+    """)
+    if not backfill:
+        upsert_sql = upsert_sql.bindparams(bindparam("dates", expanding=True))
+    deltas_sql = text(f"""
+        update {table_name}
+        set rating_delta = {table_name}.last_rating - (
+            select previous_day.last_rating
+            from {table_name} as previous_day
+            where previous_day.username = {table_name}.username
+                and previous_day.game_mode = {table_name}.game_mode
+                and previous_day.start_date < {table_name}.start_date
+            order by previous_day.start_date desc
+            limit 1
+        )
+        where {table_name}.username = :username {deltas_filter}
+    """)
+    return [upsert_sql, deltas_sql]
+
+
+def update_daily_ratings(
+    postgresql_client: PostgreSqlClient,
+    games_table: str,
+    daily_ratings_table: Table,
+    metadata: MetaData,
+    username: str,
+    dates: list[str] = None,
+) -> None:
+    """
+    Refreshes the daily ratings of a user for the days touched by a load, instead of recomputing the series from all games.
+
+    The last rating of each (game mode, day) is looked up with the (username, start_date) index of games, then the
+    deltas are recomputed from the earliest touched day on, as the next day's delta depends on the touched day.
+    All days of the user are refreshed when dates are not given or the user has no daily ratings yet (backfill).
+    Both statements run in one transaction (see get_daily_ratings_sql).
+
+    Args:
+        postgresql_client: postgresql client
+        games_table: name of the games table
+        daily_ratings_table: sqlalchemy table of the daily ratings
+        metadata: sqlalchemy metadata
+        username: user whose ratings are refreshed
+        dates: 'YYYY-MM-DD' days touched by the load
+    """
+    table_name = daily_ratings_table.name
+    postgresql_client.create_table(table_name=table_name, metadata=metadata)
+    with postgresql_client.engine.begin() as connection:
+        has_ratings = connection.execute(
+            text(f"select 1 from {table_name} where username = :username limit 1"), dict(username=username)
+        ).first() is not None
+        params = dict(username=username)
+        backfill = dates is None or not has_ratings
+        if not backfill:
+            params.update(dates=sorted(set(dates)), first_date=min(dates))
+        for statement in get_daily_ratings_sql(games_table, table_name, backfill=backfill):
+            connection.execute(statement, params)
+
+
+def backfill_daily_ratings(
+    postgresql_client: PostgreSqlClient,
+    games_table: str,
+    daily_ratings_table: Table,
+    metadata: MetaData,
+    usernames: list[str],
+) -> list[str]:
+    """
+    Refreshes all days of the users without daily ratings, e.g. every user when the table is created, so users
+    without new games (or skipped by the scheduler) still get their history. Returns the backfilled users.
+    """
+    if not postgresql_client.table_exists(games_table) or len(usernames) == 0:
+        return []
+    table_name = daily_ratings_table.name
+    postgresql_client.create_table(table_name=table_name, metadata=metadata)
+    with postgresql_client.engine.connect() as connection:
+        rated_usernames = {
+            row["username"]
+            for row in connection.execute(
+                text(f"select distinct username from {table_name} where username in :usernames").bindparams(
+                    bindparam("usernames", expanding=True)
+                ),
+                dict(usernames=usernames),
+            ).mappings()
+        }
+    backfilled_usernames = [username for username in usernames if username not in rated_usernames]
+    for username in backfilled_usernames:
+        update_daily_ratings(postgresql_client=postgresql_client,
+                             games_table=games_table,
+                             daily_ratings_table=daily_ratings_table,
+                             metadata=metadata,
+                             username=username)
+    return backfilled_usernames
+
+
+def load_from_checkpoint(
+    checkpoint: ParquetCheckpoint,
+    postgresql_client: PostgreSqlClient,
+    table: Table,
+    metadata: MetaData,
+    load_method: str = "upsert",
+    username: str = None,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Load pending checkpoint files to a database, streaming each file in record batches.
+    Every file is marked as loaded once all of its batches are in the database, so a failed load
+    can be resumed by calling this function again.
+
+    Args:
+        checkpoint: parquet checkpoint to load from
+        postgresql_client: postgresql client
+        table: sqlalchemy table
+        metadata: sqlalchemy metadata
+        load_method: supports one of: [insert, upsert]
+        username: only load files of this user (all users if not provided)
+        batch_size: max number of rows sent to the database at once
+
+    Returns:
+        number of loaded rows
+    """
+    if load_method not in ["insert", "upsert"]:
+        raise Exception(
+            "Please specify a correct load method for checkpoint loads: [insert, upsert]"
+        )
+    loaded_rows = 0
+    for file_path in checkpoint.pending_files(username=username):
+        for df in checkpoint.iter_batches(file_path, batch_size=batch_size):
+            load(df=df,
+                postgresql_client=postgresql_client,
+                table=table,
+                metadata=metadata,
+                load_method=load_method)
+            loaded_rows += df.shape[0]
+        checkpoint.mark_loaded(file_path)
+    return loaded_rows
@@ -1,20 +1,70 @@
 from jinja2 import Environment
-from connectors.postgresql import PostgreSqlClient
+try:
+    from connectors.postgresql import PostgreSqlClient
+except ModuleNotFoundError:
+    from app.connectors.postgresql import PostgreSqlClient
 from pathlib import Path
-from sqlalchemy import Table, MetaData
+from datetime import datetime
+from sqlalchemy import Table, Column, String, MetaData, TIMESTAMP, tuple_
 import logging
 
+CDC_CHANGELOG_TABLE = "cdc_changelog"
+CDC_POSITIONS_TABLE = "cdc_positions"
+# source side of the cdc extract: every row change of a tracked table is logged with the key of the changed row
+# and the id of the writing transaction. The trigger function gets the table name and then the key columns as
+# arguments, as the trigger of a partitioned table fires on its partitions (TG_TABLE_NAME is the partition's name).
+CDC_CHANGELOG_SQL = f"""
+    create table if not exists {CDC_CHANGELOG_TABLE} (
+        change_id bigserial primary key,
+        table_name text not null,
+        operation char(1) not null,
+        row_key jsonb not null,
+        txid bigint not null default txid_current(),
+        changed_at timestamptz not null default now()
+    );
+    create index if not exists {CDC_CHANGELOG_TABLE}_table_name_change_id_idx on {CDC_CHANGELOG_TABLE} (table_name, change_id);
+    create index if not exists {CDC_CHANGELOG_TABLE}_table_name_txid_idx on {CDC_CHANGELOG_TABLE} (table_name, txid);
+
+    create or replace function cdc_log_change() returns trigger as $cdc$
+    declare
+        new_key jsonb := '{{}}';
+        old_key jsonb := '{{}}';
+        key_column text;
+    begin
+        foreach key_column in array TG_ARGV[1:] loop
+            if TG_OP <> 'DELETE' then
+                new_key := new_key || jsonb_build_object(key_column, to_jsonb(NEW) -> key_column);
+            end if;
+            if TG_OP <> 'INSERT' then
+                old_key := old_key || jsonb_build_object(key_column, to_jsonb(OLD) -> key_column);
+            end if;
+        end loop;
+        if TG_OP <> 'DELETE' then
+            insert into {CDC_CHANGELOG_TABLE} (table_name, operation, row_key) values (TG_ARGV[0], left(TG_OP, 1), new_key);
+        end if;
+        -- an update changing the key removes the row of the old key
+        if TG_OP = 'DELETE' or (TG_OP = 'UPDATE' and old_key <> new_key) then
+            insert into {CDC_CHANGELOG_TABLE} (table_name, operation, row_key) values (TG_ARGV[0], 'D', old_key);
+        end if;
+        return null;
+    end;
+    $cdc$ language plpgsql;
+"""
+
 
 class SqlExtractConfig:
     FULL_EXTRACT = "full"
     INCREMENTAL_EXTRACT = "incremental"
-    EXTRACT_TYPES = [FULL_EXTRACT, INCREMENTAL_EXTRACT]
+    CDC_EXTRACT = "cdc"
+    EXTRACT_TYPES = [FULL_EXTRACT, INCREMENTAL_EXTRACT, CDC_EXTRACT]
 
     def __init__(
         self,
         source_table_name: str,
         extract_type: str = FULL_EXTRACT,
         incremental_column: str = None,
+        batch_size: int = 1000,
+        prune_changelog: bool = True,
     ):
         if extract_type not in SqlExtractConfig.EXTRACT_TYPES:
             raise Exception(
@@ -27,6 +77,10 @@ class SqlExtractConfig:
         self.source_table_name = source_table_name
         self.extract_type = extract_type
         self.incremental_column = incremental_column
+        # number of changelog entries applied at a time by the cdc extract
+        self.batch_size = batch_size
+        # deletes the applied changelog entries, only if no other target replicates the same source table
+        self.prune_changelog = prune_changelog
 
 
 class SqlExtractParser:
@@ -96,6 +150,7 @@ class DatabaseTableExtractor:
         """
         Performs database table extraction using either a full extract or incremental extract pattern.
         The extraction method used will depend on the SqlExtractParser instance passed to the constructor.
+        The cdc extract type applies its changes to the target itself, see replicate.
         """
         if self.sql_extract_parser.config.extract_type == SqlExtractConfig.FULL_EXTRACT:
             return self._full_extract()
@@ -109,6 +164,206 @@ class DatabaseTableExtractor:
                 f"Extraction type '{self.sql_extract_parser.config.extract_type}' is not supported. Skipping extraction."
             )
 
+    def _get_key_columns(self, table: Table) -> list[str]:
+        key_columns = [pk_column.name for pk_column in table.primary_key.columns.values()]
+        if len(key_columns) == 0:
+            raise Exception(
+                f"Table '{table.name}' has no primary key, which is needed by the '{SqlExtractConfig.CDC_EXTRACT}' extract type."
+            )
+        return key_columns
+
+    def _get_positions_table(self) -> tuple[Table, MetaData]:
+        metadata = MetaData()
+        table = Table(
+            CDC_POSITIONS_TABLE,
+            metadata,
+            Column("table_name", String, primary_key=True),
+            Column("snapshot", String),
+            Column("synced_at", TIMESTAMP),
+        )
+        return table, metadata
+
+    def _get_position(self) -> str:
+        """Returns the source txid snapshot the table was last replicated at, None before the first replication"""
+        if not self.target_postgresql_client.table_exists(CDC_POSITIONS_TABLE):
+            return None
+        sql_response = self.target_postgresql_client.run_sql(
+            f"""
+            select snapshot from {CDC_POSITIONS_TABLE}
+            where table_name = '{self.sql_extract_parser.config.source_table_name}'
+            """
+        )
+        return sql_response[0].get("snapshot") if len(sql_response) > 0 else None
+
+    def _set_position(self, snapshot: str) -> None:
+        table, metadata = self._get_positions_table()
+        self.target_postgresql_client.upsert(
+            data=[
+                dict(
+                    table_name=self.sql_extract_parser.config.source_table_name,
+                    snapshot=snapshot,
+                    synced_at=datetime.now(),
+                )
+            ],
+            table=table,
+            metadata=metadata,
+        )
+
+    def _get_snapshot(self) -> str:
+        return self.source_postgresql_client.run_sql("select cast(txid_current_snapshot() as text) as snapshot")[0].get("snapshot")
+
+    def _get_trigger_sql(self, key_columns: list[str]) -> str:
+        """
+        Returns the statements (re)creating the changelog trigger of the source table. The changes are logged under
+        the source table name, which is also the name of the changes of its partitions.
+        """
+        source_table_name = self.sql_extract_parser.config.source_table_name
+        trigger_arguments = ", ".join(f"'{argument}'" for argument in [source_table_name, *key_columns])
+        return f"""
+            drop trigger if exists {source_table_name}_cdc on {source_table_name};
+            create trigger {source_table_name}_cdc after insert or update or delete on {source_table_name}
+                for each row execute procedure cdc_log_change({trigger_arguments});
+        """
+
+    def _install_changelog(self, key_columns: list[str]) -> None:
+        """Creates the changelog if it does not exist yet and recreates its trigger on the source table with the given key columns"""
+        self.source_postgresql_client.execute_sql(CDC_CHANGELOG_SQL + self._get_trigger_sql(key_columns))
+
+    def _prune_changelog(self, snapshot: str) -> None:
+        """Deletes the changelog entries of the source table committed before the snapshot, which were applied"""
+        current = f"cast('{snapshot}' as txid_snapshot)"
+        self.source_postgresql_client.execute_sql(
+            f"""
+            delete from {CDC_CHANGELOG_TABLE} as changes
+            where changes.table_name = '{self.sql_extract_parser.config.source_table_name}'
+                and changes.txid < txid_snapshot_xmax({current})
+                and txid_visible_in_snapshot(changes.txid, {current})
+            """
+        )
+
+    def _get_changes_filter(self, previous_snapshot: str, current_snapshot: str) -> str:
+        """
+        Selects the changelog entries of the transactions committed between two snapshots. Changes are selected
+        by transaction visibility rather than by change_id alone, as a change_id is taken before its transaction commits
+        and a later change_id may be committed first. The txid range is looked up with the (table_name, txid) index.
+        """
+        previous = f"cast('{previous_snapshot}' as txid_snapshot)"
+        current = f"cast('{current_snapshot}' as txid_snapshot)"
+        return f"""
+            changes.table_name = '{self.sql_extract_parser.config.source_table_name}'
+            and changes.txid >= txid_snapshot_xmin({previous})
+            and changes.txid < txid_snapshot_xmax({current})
+            and txid_visible_in_snapshot(changes.txid, {current})
+            and not txid_visible_in_snapshot(changes.txid, {previous})
+        """
+
+    def _apply_changes(
+        self, table: Table, metadata: MetaData, key_columns: list[str], previous_snapshot: str, current_snapshot: str
+    ) -> dict:
+        """
+        Applies the changes between two snapshots in batches of batch_size changelog entries. The changelog only holds
+        keys: the rows of changed keys still in the source are read with the extract template and upserted,
+        the keys missing from the source are deleted. Replaying a batch gives the same result, so a failed run
+        is simply repeated from the stored position.
+        """
+        source_table_name = self.sql_extract_parser.config.source_table_name
+        changes_filter = self._get_changes_filter(previous_snapshot, current_snapshot)
+        key_list = ", ".join(key_columns)
+        changed_keys_join = ", ".join(f"changed.{key_column}" for key_column in key_columns)
+        stats = dict(changes=0, upserted_rows=0, deleted_rows=0)
+        # the batches start at the first change of the window instead of the first change of the changelog
+        first_change_id = self.source_postgresql_client.run_sql(
+            f"select min(change_id) as first_change_id from {CDC_CHANGELOG_TABLE} as changes where {changes_filter}"
+        )[0].get("first_change_id")
+        if first_change_id is None:
+            return stats
+        last_change_id = first_change_id - 1
+        while True:
+            batch = self.source_postgresql_client.run_sql(
+                f"""
+                select count(*) as changes, max(change_id) as last_change_id
+                from (
+                    select change_id from {CDC_CHANGELOG_TABLE} as changes
+                    where {changes_filter} and changes.change_id > {last_change_id}
+                    order by changes.change_id
+                    limit {int(self.sql_extract_parser.config.batch_size)}
+                ) as batch
+                """
+            )[0]
+            if batch.get("changes") == 0:
+                return stats
+            changed_keys = f"""
+                select distinct {changed_keys_join}
+                from {CDC_CHANGELOG_TABLE} as changes
+                cross join jsonb_populate_record(cast(null as {source_table_name}), changes.row_key) as changed
+                where {changes_filter}
+                    and changes.change_id > {last_change_id} and changes.change_id <= {batch.get("last_change_id")}
+            """
+            changed_rows = self.source_postgresql_client.run_sql(
+                f"""
+                select extract.*
+                from ({self.sql_extract_parser.get_templated_sql(is_incremental=False)}) as extract
+                where ({key_list}) in ({changed_keys})
+                """
+            )
+            deleted_keys = self.source_postgresql_client.run_sql(
+                f"""
+                select * from ({changed_keys}) as changed
+                where not exists (
+                    select from {source_table_name} as source
+                    where ({", ".join(f"source.{key_column}" for key_column in key_columns)}) = ({changed_keys_join})
+                )
+                """
+            )
+            if len(changed_rows) > 0:
+                self.target_postgresql_client.upsert_in_chunks(data=changed_rows, table=table, metadata=metadata)
+            if len(deleted_keys) > 0 and self.target_postgresql_client.table_exists(table.name):
+                self.target_postgresql_client.engine.execute(
+                    table.delete().where(
+                        tuple_(*[table.columns[key_column] for key_column in key_columns]).in_(
+                            [tuple(key[key_column] for key_column in key_columns) for key in deleted_keys]
+                        )
+                    )
+                )
+            stats["changes"] += batch.get("changes")
+            stats["upserted_rows"] += len(changed_rows)
+            stats["deleted_rows"] += len(deleted_keys)
+            last_change_id = batch.get("last_change_id")
+
+    def replicate(self, table: Table, metadata: MetaData) -> dict:
+        """
+        Performs a change data capture extract: only the rows inserted, updated or deleted in the source table since
+        the stored position are applied to the target table, so the cost scales with the number of changes.
+
+        Every replication (re)installs the trigger maintained changelog on the source table, so the logged keys follow
+        the current primary key of the source table. The first replication stores the current
+        source snapshot as position and copies the table with a full extract. Changes committed while copying
+        are applied again by the next replication, which converges on the same rows. With prune_changelog the applied
+        changelog entries are deleted afterwards, so the changelog only holds the changes not replicated yet.
+        Returns the number of applied changes, upserted and deleted rows.
+        """
+        source_table_name = self.sql_extract_parser.config.source_table_name
+        key_columns = self._get_key_columns(table)
+        previous_snapshot = self._get_position()
+        self._install_changelog(key_columns)
+        if previous_snapshot is None:
+            logging.info(f"No cdc position for table '{source_table_name}'. Performing full extract.")
+            current_snapshot = self._get_snapshot()
+            table_data = self._full_extract()
+            self.target_postgresql_client.upsert_in_chunks(data=table_data, table=table, metadata=metadata)
+            stats = dict(changes=0, upserted_rows=len(table_data), deleted_rows=0)
+        else:
+            current_snapshot = self._get_snapshot()
+            stats = self._apply_changes(table, metadata, key_columns, previous_snapshot, current_snapshot)
+        self._set_position(current_snapshot)
+        if self.sql_extract_parser.config.prune_changelog:
+            self._prune_changelog(current_snapshot)
+        logging.info(
+            f"Replicated table '{source_table_name}': {stats['changes']} changes, "
+            f"{stats['upserted_rows']} rows upserted, {stats['deleted_rows']} rows deleted"
+        )
+        return stats
+
     def get_table_schema(self) -> tuple[Table, MetaData]:
         return self.source_postgresql_client.get_table_schema(
             table_name=self.sql_extract_parser.config.source_table_name
@@ -1,10 +1,27 @@
+import hashlib
 from jinja2 import Environment
-from assets.database_extractor import (
-    SqlExtractParser,
-    DatabaseTableExtractor,
-)
-from connectors.postgresql import PostgreSqlClient
+try:
+    from assets.database_extractor import (
+        SqlExtractParser,
+        SqlExtractConfig,
+        DatabaseTableExtractor,
+    )
+    from connectors.postgresql import PostgreSqlClient
+    from assets.metadata_logging import MetaDataLogging
+    from assets.profiling import StageProfiler
+    from assets.query_plans import QueryPlanRecorder
+except ModuleNotFoundError:
+    from app.assets.database_extractor import (
+        SqlExtractParser,
+        SqlExtractConfig,
+        DatabaseTableExtractor,
+    )
+    from app.connectors.postgresql import PostgreSqlClient
+    from app.assets.metadata_logging import MetaDataLogging
+    from app.assets.profiling import StageProfiler
+    from app.assets.query_plans import QueryPlanRecorder
 from graphlib import TopologicalSorter
+from contextlib import ExitStack
 
 
 def extract_load(
@@ -16,6 +33,7 @@ def extract_load(
     Perform data extraction specified in a jinja template_environment.
 
     Data is extracted using a source_postgresql_client, and loaded using a target_postgresql_client.
+    Templates with the cdc extract type only apply the changes since their last run.
     """
     for asset in template_environment.list_templates():
         sql_extract_parser = SqlExtractParser(
@@ -27,41 +45,260 @@ def extract_load(
             target_postgresql_client=target_postgresql_client,
         )
         table_schema, metadata = database_table_extractor.get_table_schema()
+        if sql_extract_parser.get_config().extract_type == SqlExtractConfig.CDC_EXTRACT:
+            database_table_extractor.replicate(table=table_schema, metadata=metadata)
+            continue
         table_data = database_table_extractor.extract()
         target_postgresql_client.upsert_in_chunks(
             data=table_data, table=table_schema, metadata=metadata
         )
 
 
+class SqlTransformConfig:
+    TABLE = "table"
+    INCREMENTAL = "incremental"
+    MATVIEW = "matview"
+    MATERIALIZATIONS = [TABLE, INCREMENTAL, MATVIEW]
+
+    def __init__(
+        self,
+        materialization: str = TABLE,
+        unique_key: list[str] = None,
+        incremental_column: str = None,
+    ):
+        """
+        Config block of a transform template, e.g.
+        `{% set config = {"materialization": "matview", "unique_key": ["username"]} %}`
+
+        Parameters:
+        - materialization (str): "table" recreates the table with `create table as` on every run,
+          "incremental" upserts the rows selected with `is_incremental` and `incremental_value` (max incremental_column),
+          "matview" creates a materialized view refreshed concurrently
+        - unique_key (list): columns identifying a row, needed by incremental and matview materializations
+        - incremental_column (str): column whose max value is passed to the template as `incremental_value`
+        """
+        if materialization not in SqlTransformConfig.MATERIALIZATIONS:
+            raise Exception(
+                f"Materialization '{materialization}' is not supported. Please choose from {SqlTransformConfig.MATERIALIZATIONS}."
+            )
+        if materialization != SqlTransformConfig.TABLE and not unique_key:
+            raise Exception(
+                f"Please specify a unique_key in your asset's config block for the '{materialization}' materialization."
+            )
+        if materialization == SqlTransformConfig.INCREMENTAL and incremental_column is None:
+            raise Exception(
+                f"Please specify an incremental_column in your asset's config block for the '{materialization}' materialization."
+            )
+        self.materialization = materialization
+        self.unique_key = unique_key
+        self.incremental_column = incremental_column
+
+
 class SqlTransform:
     def __init__(
         self,
         postgresql_client: PostgreSqlClient,
         environment: Environment,
         table_name: str,
+        template_params: dict = None,
     ):
         self.postgresql_client = postgresql_client
         self.environment = environment
         self.table_name = table_name
+        # variables available in the template, e.g. `typed_schema`
+        self.template_params = template_params or {}
         self.template = self.environment.get_template(f"{table_name}.sql")
+        self.config = SqlTransformConfig(**getattr(self.template.make_module(self.template_params), "config", {}))
+        # set by `transform` to record the query plans of the node
+        self.plan_recorder: QueryPlanRecorder = None
+        # set by `transform` to the nodes materialized after this one, whose views may be dropped and rebuilt
+        self.later_node_names: set[str] = set()
+
+    def get_templated_sql(self, **kwargs) -> str:
+        return self.template.render(**self.template_params, **kwargs)
+
+    def _get_relation_kind(self) -> str:
+        """Returns 'table' or 'matview' for an existing relation of the node, None if it does not exist"""
+        rows = self.postgresql_client.run_sql(
+            f"select relkind from pg_class where relname = '{self.table_name}' and relkind in ('r', 'p', 'm')"
+        )
+        if len(rows) == 0:
+            return None
+        return SqlTransformConfig.MATVIEW if rows[0]["relkind"] == "m" else SqlTransformConfig.TABLE
+
+    def _get_dependent_views(self, relation_name: str) -> list[str]:
+        """Returns the views and materialized views selecting from a relation"""
+        return [
+            row["view_name"]
+            for row in self.postgresql_client.run_sql(
+                f"""
+                select distinct view.relname as view_name
+                from pg_depend
+                join pg_rewrite on pg_rewrite.oid = pg_depend.objid
+                join pg_class as view on view.oid = pg_rewrite.ev_class
+                join pg_class as relation on relation.oid = pg_depend.refobjid
+                where relation.relname = '{relation_name}' and view.relname <> '{relation_name}'
+                """
+            )
+        ]
+
+    def _get_drop_sql(self) -> str:
+        """
+        Drops the relation of the node, together with the materialized views built on it which are materialized
+        again later in the run (later_node_names). Any other dependent view, e.g. one created outside of the DAG,
+        stops the transform instead of being dropped with it.
+        """
+        drop_sql = []
+        visited = set()
+
+        def add_dependents(relation_name: str) -> None:
+            for view_name in self._get_dependent_views(relation_name):
+                if view_name in visited:
+                    continue
+                if view_name not in self.later_node_names:
+                    raise Exception(
+                        f"View '{view_name}' depends on '{relation_name}' and is not materialized after '{self.table_name}' "
+                        f"in the transform DAG. Please drop it or add it to the DAG to rebuild '{self.table_name}'."
+                    )
+                visited.add(view_name)
+                add_dependents(view_name)
+                drop_sql.append(f"drop materialized view if exists {view_name};")
+
+        relation_kind = self._get_relation_kind()
+        if relation_kind is None:
+            return ""
+        add_dependents(self.table_name)
+        if relation_kind == SqlTransformConfig.MATVIEW:
+            drop_sql.append(f"drop materialized view if exists {self.table_name};")
+        else:
+            drop_sql.append(f"drop table if exists {self.table_name};")
+        return "\n".join(drop_sql)
+
+    def _get_unique_index_sql(self) -> str:
+        return f"create unique index if not exists {self.table_name}_unique_key_idx on {self.table_name} ({', '.join(self.config.unique_key)});"
+
+    def _execute_node_sql(self, statement: str, before_sql: str = "", after_sql: str = "") -> None:
+        """
+        Executes the main statement of the node between before_sql and after_sql, in a single transaction.
+        With a plan recorder the statement is run with `explain (analyze, buffers, format json)`, which executes it
+        as well, and its plan is recorded.
+        """
+        if self.plan_recorder is None:
+            self.postgresql_client.execute_sql(f"{before_sql}\n{statement};\n{after_sql}")
+            return
+        with self.postgresql_client.engine.begin() as connection:
+            if before_sql:
+                connection.execute(before_sql)
+            plan = connection.execute(f"explain (analyze, buffers, format json) {statement}").scalar()
+            if after_sql:
+                connection.execute(after_sql)
+        self.plan_recorder.record(node=self.table_name, template_hash=self.get_template_hash(), plan=plan)
 
     def create_table_as(self) -> None:
         """
         Drops the table if it exists and creates a new copy of the table using the provided select statement.
         """
-        exec_sql = f"""
-            drop table if exists {self.table_name};
+        statement = f"""
             create table {self.table_name} as (
-                {self.template.render()}
+                {self.get_templated_sql(is_incremental=False)}
+            )
+        """
+        self._execute_node_sql(statement, before_sql=self._get_drop_sql())
+
+    def upsert_incremental(self) -> None:
+        """
+        Upserts the rows selected by the template for values of the incremental column from its current max value on.
+        Creates the table with all rows if it does not exist (or is not a table).
+        """
+        if self._get_relation_kind() != SqlTransformConfig.TABLE:
+            self.create_table_as()
+            self.postgresql_client.execute_sql(self._get_unique_index_sql())
+            return
+        incremental_value = self.postgresql_client.run_sql(
+            f"select max({self.config.incremental_column}) as incremental_value from {self.table_name}"
+        )[0].get("incremental_value")
+        columns = [
+            row["column_name"]
+            for row in self.postgresql_client.run_sql(
+                f"select column_name from information_schema.columns where table_name = '{self.table_name}' order by ordinal_position"
+            )
+        ]
+        update_columns = [column for column in columns if column not in self.config.unique_key]
+        conflict_action = (
+            "do update set " + ", ".join(f"{column} = excluded.{column}" for column in update_columns)
+            if update_columns
+            else "do nothing"
+        )
+        statement = f"""
+            insert into {self.table_name} ({', '.join(columns)})
+            select {', '.join(columns)} from (
+                {self.get_templated_sql(is_incremental=True, incremental_value=incremental_value)}
+            ) as incremental_rows
+            on conflict ({', '.join(self.config.unique_key)}) {conflict_action}
+        """
+        self._execute_node_sql(statement)
+
+    def get_template_hash(self) -> str:
+        return hashlib.sha1(self.get_templated_sql(is_incremental=False).encode()).hexdigest()
+
+    def refresh_materialized_view(self) -> None:
+        """
+        Refreshes the materialized view concurrently, so readers keep getting answers during the refresh.
+        The view is (re)created with a unique index if it does not exist or was created from a different template,
+        which is detected by the template hash stored in the view's comment. Only the creation's plan is recorded.
+        """
+        template_hash = self.get_template_hash()
+        rows = self.postgresql_client.run_sql(
+            f"select obj_description(oid, 'pg_class') as description from pg_class where relname = '{self.table_name}' and relkind = 'm'"
+        )
+        if len(rows) > 0 and rows[0]["description"] == f"template_hash:{template_hash}":
+            # a refresh can't be explained and explaining the view's query on its own would run it twice,
+            # so refreshes have no recorded plan, only the sql_transform duration of the node
+            self.postgresql_client.execute_sql(f"refresh materialized view concurrently {self.table_name}", autocommit=True)
+            return
+        statement = f"""
+            create materialized view {self.table_name} as (
+                {self.get_templated_sql(is_incremental=False)}
             )
         """
-        self.postgresql_client.execute_sql(exec_sql)
+        after_sql = f"""
+            {self._get_unique_index_sql()}
+            comment on materialized view {self.table_name} is 'template_hash:{template_hash}';
+        """
+        self._execute_node_sql(statement, before_sql=self._get_drop_sql(), after_sql=after_sql)
 
+    def materialize(self) -> None:
+        """
+        Builds the node with the materialization of its template's config block
+        """
+        if self.config.materialization == SqlTransformConfig.TABLE:
+            self.create_table_as()
+        elif self.config.materialization == SqlTransformConfig.INCREMENTAL:
+            self.upsert_incremental()
+        elif self.config.materialization == SqlTransformConfig.MATVIEW:
+            self.refresh_materialized_view()
 
-def transform(dag: TopologicalSorter):
+
+def transform(
+    dag: TopologicalSorter,
+    metadata_logger: MetaDataLogging = None,
+    profiler: StageProfiler = None,
+    plan_recorder: QueryPlanRecorder = None,
+):
     """
-    Performs `create table as` on all nodes in the provided DAG.
+    Materializes all nodes in the provided DAG (see SqlTransformConfig), in dependency order.
+    If a metadata_logger is provided, the duration of each node is logged as a `sql_transform` metric.
+    If a profiler is provided, each node is profiled as a `sql_transform:{table_name}` stage.
+    If a plan_recorder is provided, the query plan of each node (except refreshed materialized views) is recorded
+    and compared with earlier runs.
     """
     dag_rendered = tuple(dag.static_order())
-    for node in dag_rendered:
-        node.create_table_as()
+    for position, node in enumerate(dag_rendered):
+        node.plan_recorder = plan_recorder
+        node.later_node_names = {later_node.table_name for later_node in dag_rendered[position + 1:]}
+        with ExitStack() as stack:
+            if metadata_logger is not None:
+                stack.enter_context(metadata_logger.timer(stage="sql_transform", node=node.table_name))
+            if profiler is not None:
+                stack.enter_context(profiler.profile(f"sql_transform:{node.table_name}"))
+            node.materialize()
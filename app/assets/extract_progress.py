@@ -0,0 +1,125 @@
+from datetime import datetime
+from sqlalchemy import Table, Column, Integer, String, MetaData, TIMESTAMP, Boolean, DATE, text
+
+try:
+    from connectors.postgresql import PostgreSqlClient
+except ModuleNotFoundError:
+    from app.connectors.postgresql import PostgreSqlClient
+
+
+class ExtractProgress:
+    def __init__(self, postgresql_client: PostgreSqlClient, table_name: str = "extract_progress"):
+        """
+        Per user-month record of loaded games, so a rerun of an interrupted backfill continues from the first
+        unfinished month instead of starting the user's whole window over.
+
+        A month is recorded once its games are loaded, together with the loaded date window, the number of
+        fetched and loaded games and the fingerprint (sha1) of the raw monthly archive. A month which was already
+        over when it was loaded is closed: chess.com does not add games to it anymore, so it is skipped by later
+        runs covering the same window. Open (current) months are fetched again, but their transform and load are
+        skipped while the archive fingerprint does not change.
+
+        Parameters:
+        - postgresql_client (PostgreSqlClient): client of the database holding the progress table
+        - table_name (str): progress table name
+        """
+        self.postgresql_client = postgresql_client
+        self.table_name = table_name
+        self.metadata = MetaData()
+        self.table = Table(
+            self.table_name,
+            self.metadata,
+            Column("username", String, primary_key=True),
+            Column("month", String, primary_key=True),
+            Column("window_start", DATE),
+            Column("window_end", DATE),
+            Column("games_fetched", Integer),
+            Column("loaded_rows", Integer),
+            Column("archive_fingerprint", String),
+            Column("closed", Boolean),
+            Column("completed_at", TIMESTAMP),
+        )
+        self.postgresql_client.create_table(table_name=self.table_name, metadata=self.metadata)
+        self.months = {}
+        self.loaded_usernames = set()
+
+    def _execute(self, sql: str, **params) -> list[dict]:
+        with self.postgresql_client.engine.begin() as connection:
+            result = connection.execute(text(sql), params)
+            return [dict(row) for row in result.mappings().all()] if result.returns_rows else []
+
+    def load_user(self, username: str) -> None:
+        """Reads the recorded months of a user, with a single query per user"""
+        rows = self._execute(f"select * from {self.table_name} where username = :username", username=username)
+        self.months.update({(username, row["month"]): row for row in rows})
+        self.loaded_usernames.add(username)
+
+    def get(self, username: str, month: str) -> dict:
+        """Returns the recorded progress of a user-month, None if it was not loaded yet"""
+        if username not in self.loaded_usernames:
+            self.load_user(username)
+        return self.months.get((username, month))
+
+    def covers(self, username: str, month: str, start_date: str, end_date: str) -> bool:
+        """Checks if the games of the user-month between start_date and end_date ('YYYY-MM-DD') were already loaded"""
+        progress = self.get(username, month)
+        if progress is None:
+            return False
+        return str(progress["window_start"]) <= start_date and str(progress["window_end"]) >= end_date
+
+    def is_complete(self, username: str, month: str, start_date: str, end_date: str) -> bool:
+        """Checks if the user-month needs no fetch at all: it was closed when loaded and the window is covered"""
+        progress = self.get(username, month)
+        return progress is not None and progress["closed"] and self.covers(username, month, start_date, end_date)
+
+    def is_unchanged(self, username: str, month: str, start_date: str, end_date: str, archive_fingerprint: str) -> bool:
+        """Checks if the window was loaded from the same monthly archive as the one just fetched"""
+        progress = self.get(username, month)
+        return (
+            progress is not None
+            and progress["archive_fingerprint"] == archive_fingerprint
+            and self.covers(username, month, start_date, end_date)
+        )
+
+    def record(
+        self,
+        username: str,
+        month: str,
+        start_date: str,
+        end_date: str,
+        games_fetched: int,
+        loaded_rows: int,
+        archive_fingerprint: str,
+    ) -> None:
+        """Records the loaded window of a user-month, extending the window recorded by earlier runs"""
+        progress = self.get(username, month)
+        if progress is not None and progress["archive_fingerprint"] == archive_fingerprint:
+            # same archive - the windows loaded by both runs are complete
+            start_date = min(start_date, str(progress["window_start"]))
+            end_date = max(end_date, str(progress["window_end"]))
+        rows = self._execute(
+            f"""
+            insert into {self.table_name}
+                (username, month, window_start, window_end, games_fetched, loaded_rows, archive_fingerprint, closed, completed_at)
+            values
+                (:username, :month, :window_start, :window_end, :games_fetched, :loaded_rows, :archive_fingerprint, :closed, now())
+            on conflict (username, month) do update
+            set window_start = excluded.window_start,
+                window_end = excluded.window_end,
+                games_fetched = excluded.games_fetched,
+                loaded_rows = excluded.loaded_rows,
+                archive_fingerprint = excluded.archive_fingerprint,
+                closed = excluded.closed,
+                completed_at = excluded.completed_at
+            returning *
+            """,
+            username=username,
+            month=month,
+            window_start=start_date,
+            window_end=end_date,
+            games_fetched=games_fetched,
+            loaded_rows=loaded_rows,
+            archive_fingerprint=archive_fingerprint,
+            closed=month < datetime.now().strftime("%Y-%m"),
+        )
+        self.months[(username, month)] = rows[0]
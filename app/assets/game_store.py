@@ -0,0 +1,59 @@
+import re
+
+GAME_ID = re.compile(r"(live|daily)\/(\d+)$")
+
+
+def get_game_id(game_url: str) -> str:
+    """Returns the chess.com game id at the end of a game url"""
+    return GAME_ID.search(game_url).group(2)
+
+
+class GameStore:
+    def __init__(self, tracked_usernames: list[str] = None):
+        """
+        Perspective-neutral facts of the games seen during a run, keyed by game_id.
+
+        When tracked users play each other, the same game is in the monthly archives of both. Its facts
+        (see parse_game_facts) are parsed once and the per user rows are derived from them (see get_user_view).
+        The store also remembers which games were already loaded to the game centric tables (game_facts,
+        game_moves), so a game is loaded there once however many tracked users played it.
+
+        Only games between two tracked users are looked up again, so the facts of other games are dropped by
+        evict_unshared before the next user-month is extracted (their ids are kept). Without tracked_usernames
+        all facts are kept.
+
+        Parameters:
+        - tracked_usernames (list): users whose games are extracted in the run
+        """
+        self.tracked_usernames = {username.lower() for username in tracked_usernames} if tracked_usernames is not None else None
+        self.games = {}
+        self.loaded_game_ids = set()
+        self.hits = 0
+
+    def get(self, game_id: str) -> dict:
+        """Returns the facts of a game parsed earlier in the run, None if the game was not seen yet"""
+        game_facts = self.games.get(game_id)
+        if game_facts is not None:
+            self.hits += 1
+        return game_facts
+
+    def add(self, game_facts: dict) -> None:
+        self.games[game_facts["game_id"]] = game_facts
+
+    def get_unloaded(self, game_ids: list[str]) -> list[str]:
+        """Returns the (distinct) game ids which were not loaded to the game centric tables yet"""
+        return [game_id for game_id in dict.fromkeys(game_ids) if game_id not in self.loaded_game_ids]
+
+    def is_shared(self, game_facts: dict) -> bool:
+        """Checks if both players of a game are tracked, so the game is in the archive of another tracked user"""
+        return self.tracked_usernames is None or (
+            game_facts["white_username"].lower() in self.tracked_usernames
+            and game_facts["black_username"].lower() in self.tracked_usernames
+        )
+
+    def mark_loaded(self, game_ids: list[str]) -> None:
+        self.loaded_game_ids.update(game_ids)
+
+    def evict_unshared(self) -> None:
+        """Drops the facts of the games which no other tracked user can look up"""
+        self.games = {game_id: game_facts for game_id, game_facts in self.games.items() if self.is_shared(game_facts)}
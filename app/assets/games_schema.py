@@ -0,0 +1,322 @@
+import pandas as pd
+from sqlalchemy import (
+    Table,
+    MetaData,
+    Column,
+    Integer,
+    SmallInteger,
+    String,
+    Float,
+    BigInteger,
+    DATE,
+    TIMESTAMP,
+    Interval,
+    Enum,
+    Index,
+    REAL,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+
+try:
+    from connectors.postgresql import PostgreSqlClient
+except ModuleNotFoundError:
+    from app.connectors.postgresql import PostgreSqlClient
+
+
+class GamesSchemaMode:
+    # all columns stored as strings, as loaded by the first versions of the pipeline
+    LEGACY: str = "legacy"
+    # native date/time/interval columns, enums for low cardinality columns and smallint ratings
+    TYPED: str = "typed"
+
+
+GAME_MODES = ["bullet", "blitz", "rapid", "daily"]
+# 'defet' is the value the transform has always written for lost games
+MATCH_RESULTS = ["win", "defet", "draw"]
+USER_COLORS = ["white", "black"]
+
+GAME_MODE_TYPE = Enum(*GAME_MODES, name="game_mode")
+MATCH_RESULT_TYPE = Enum(*MATCH_RESULTS, name="match_result")
+USER_COLOR_TYPE = Enum(*USER_COLORS, name="user_color")
+
+# column -> (postgres type name as in information_schema.columns.udt_name, sql type used by the migration)
+TYPED_COLUMNS = {
+    "game_mode": ("game_mode", "game_mode"),
+    "start_date": ("date", "date"),
+    "user_color": ("user_color", "user_color"),
+    "user_rating": ("int2", "smallint"),
+    "opponent_rating": ("int2", "smallint"),
+    "rating_diff": ("int2", "smallint"),
+    "match_result": ("match_result", "match_result"),
+    "start_date_time": ("timestamp", "timestamp"),
+    "end_date_time": ("timestamp", "timestamp"),
+    "game_duration": ("interval", "interval"),
+    "rounds": ("int2", "smallint"),
+}
+
+
+def get_partitioning_kwargs(partitioned: bool) -> dict:
+    """Table options of a games table range partitioned by month of start_date (see PostgreSqlClient.create_partitions)"""
+    if not partitioned:
+        return {}
+    return {
+        "postgresql_partition_by": "RANGE (start_date)",
+        "info": {"monthly_partition_column": "start_date"},
+    }
+
+
+def get_games_table(
+    metadata: MetaData,
+    schema_mode: str = GamesSchemaMode.LEGACY,
+    table_name: str = "games",
+    partitioned: bool = False,
+) -> Table:
+    """
+    Returns the games table in the given schema mode (see GamesSchemaMode), with indexes for the per user lookups
+    of the incremental load and the summary queries.
+    Rows are per user views of a game, so the primary key is (game_id, username): a game between two tracked users
+    has a row for each of them.
+    A partitioned table is range partitioned by start_date, one partition per month created by the loader.
+    Postgres needs the partition key in the primary key, so it is (game_id, username, start_date) for partitioned tables.
+    """
+    if schema_mode == GamesSchemaMode.LEGACY:
+        games_table = Table(table_name,
+                metadata,
+                Column('game_id',BigInteger, primary_key=True),
+                Column('game_url', String),
+                Column('game_mode', String),
+                Column('start_date', String, primary_key=partitioned),
+                Column('username', String, primary_key=True),
+                Column('user_color', String),
+                Column('user_rating', Integer),
+                Column('user_accuracy', Float),
+                Column('opponent', String),
+                Column('opponent_rating', Integer),
+                Column('opponent_accuracy', Float),
+                Column('rating_diff', Integer),
+                Column('match_result', String),
+                Column('result_subcategory', String),
+                Column('start_date_time', String),
+                Column('end_date_time', String),
+                Column('game_duration', String),
+                Column('game_duration_sec', Integer),
+                Column('rounds', Integer),
+                Column('user_avg_move_time_sec', Float),
+                Column('opening', String),
+                **get_partitioning_kwargs(partitioned)
+                )
+    elif schema_mode == GamesSchemaMode.TYPED:
+        games_table = Table(table_name,
+                metadata,
+                Column('game_id',BigInteger, primary_key=True),
+                Column('game_url', String),
+                Column('game_mode', GAME_MODE_TYPE),
+                Column('start_date', DATE, primary_key=partitioned),
+                Column('username', String, primary_key=True),
+                Column('user_color', USER_COLOR_TYPE),
+                Column('user_rating', SmallInteger),
+                Column('user_accuracy', Float),
+                Column('opponent', String),
+                Column('opponent_rating', SmallInteger),
+                Column('opponent_accuracy', Float),
+                Column('rating_diff', SmallInteger),
+                Column('match_result', MATCH_RESULT_TYPE),
+                Column('result_subcategory', String),
+                Column('start_date_time', TIMESTAMP),
+                Column('end_date_time', TIMESTAMP),
+                Column('game_duration', Interval),
+                Column('game_duration_sec', Integer),
+                Column('rounds', SmallInteger),
+                Column('user_avg_move_time_sec', Float),
+                Column('opening', String),
+                **get_partitioning_kwargs(partitioned)
+                )
+    else:
+        raise Exception(
+            f"Games schema mode '{schema_mode}' is not supported. Please choose from ['{GamesSchemaMode.LEGACY}', '{GamesSchemaMode.TYPED}']."
+        )
+    Index(f"{table_name}_username_start_date_idx", games_table.columns["username"], games_table.columns["start_date"])
+    Index(
+        f"{table_name}_username_opening_game_mode_idx",
+        games_table.columns["username"],
+        games_table.columns["opening"],
+        games_table.columns["game_mode"],
+    )
+    return games_table
+
+
+def get_game_moves_table(metadata: MetaData, table_name: str = "game_moves") -> Table:
+    """
+    Returns the table with the clock and think time (in seconds) of every ply of a game, white's plies first
+    """
+    return Table(table_name,
+            metadata,
+            Column('game_id', BigInteger, primary_key=True),
+            Column('time_control', String),
+            Column('base_time_sec', REAL),
+            Column('increment_sec', REAL),
+            Column('plies', SmallInteger),
+            Column('clocks_sec', ARRAY(REAL)),
+            Column('think_times_sec', ARRAY(REAL))
+            )
+
+
+def get_game_facts_table(metadata: MetaData, table_name: str = "game_facts") -> Table:
+    """
+    Returns the table with the perspective-neutral facts of every game (both players' ratings, results and accuracies),
+    stored once even if several tracked users played the game. Clocks are in the game_moves table, keyed by game_id too.
+    """
+    return Table(table_name,
+            metadata,
+            Column('game_id', BigInteger, primary_key=True),
+            Column('game_url', String),
+            Column('time_class', String),
+            Column('start_date', DATE),
+            Column('start_time', String),
+            Column('end_date_time', TIMESTAMP),
+            Column('white_username', String),
+            Column('white_rating', Integer),
+            Column('white_result', String),
+            Column('white_accuracy', Float),
+            Column('black_username', String),
+            Column('black_rating', Integer),
+            Column('black_result', String),
+            Column('black_accuracy', Float),
+            Column('pgn_result', String),
+            Column('eco', String),
+            Column('eco_url', String),
+            Column('moves_per_player', SmallInteger)
+            )
+
+
+def get_daily_ratings_table(metadata: MetaData, table_name: str = "daily_ratings") -> Table:
+    """
+    Returns the table with the last rating of every user, game mode and day, and its change since the previous day played
+    """
+    return Table(table_name,
+            metadata,
+            Column('username', String, primary_key=True),
+            Column('game_mode', String, primary_key=True),
+            Column('start_date', DATE, primary_key=True),
+            Column('last_rating', Integer),
+            Column('games_count', Integer),
+            Column('rating_delta', Integer)
+            )
+
+
+def is_partitioned_table(postgresql_client: PostgreSqlClient, table_name: str) -> bool:
+    """
+    Checks if an existing table is a partitioned table
+    """
+    return len(postgresql_client.run_sql(
+        f"select 1 from pg_class where relname = '{table_name}' and relkind = 'p'"
+    )) > 0
+
+
+def to_typed_games(transformed_games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts games returned by the games transform to the value types of the typed games table:
+    dates instead of 'YYYY-MM-DD' strings and timedeltas instead of 'HH:MM:SS' durations.
+    """
+    typed_games = transformed_games.copy()
+    typed_games["start_date"] = pd.to_datetime(typed_games["start_date"]).dt.date
+    typed_games["start_date_time"] = pd.to_datetime(typed_games["start_date_time"])
+    typed_games["end_date_time"] = pd.to_datetime(typed_games["end_date_time"])
+    typed_games["game_duration"] = pd.to_timedelta(typed_games["game_duration_sec"], unit="s")
+    return typed_games
+
+
+def get_typed_migration_sql(table_name: str, column_types: dict) -> str:
+    """
+    Returns the `alter table` statement converting the columns of a legacy games table to the typed schema.
+    Columns already having their typed type are skipped, so the statement is empty for migrated tables.
+
+    Parameters:
+    - table_name (str): games table name
+    - column_types (dict): current column name -> udt_name (from information_schema.columns)
+    """
+    alter_columns = [
+        f"alter column {column} type {sql_type} using {column}::{sql_type}"
+        for column, (udt_name, sql_type) in TYPED_COLUMNS.items()
+        if column in column_types and column_types[column] != udt_name
+    ]
+    if len(alter_columns) == 0:
+        return ""
+    return f"alter table {table_name}\n    " + ",\n    ".join(alter_columns)
+
+
+def migrate_games_to_typed(postgresql_client: PostgreSqlClient, table_name: str = "games") -> int:
+    """
+    Migrates an existing games table in place from the legacy to the typed schema.
+    Creates the enum types if needed and converts all legacy columns in a single `alter table`
+    (one table rewrite). Returns the number of converted columns, 0 if the table was already typed.
+    """
+    if not postgresql_client.table_exists(table_name):
+        return 0
+    column_types = {
+        row["column_name"]: row["udt_name"]
+        for row in postgresql_client.run_sql(
+            f"select column_name, udt_name from information_schema.columns where table_name = '{table_name}'"
+        )
+    }
+    migration_sql = get_typed_migration_sql(table_name, column_types)
+    if migration_sql == "":
+        return 0
+    for enum_type in [GAME_MODE_TYPE, MATCH_RESULT_TYPE, USER_COLOR_TYPE]:
+        enum_type.create(bind=postgresql_client.engine, checkfirst=True)
+    postgresql_client.execute_sql(migration_sql)
+    return migration_sql.count("alter column")
+
+
+def get_primary_key_columns(partitioned: bool = False) -> list[str]:
+    """Primary key columns of the games table (see get_games_table)"""
+    return ["game_id", "username", "start_date"] if partitioned else ["game_id", "username"]
+
+
+def get_primary_key_migration_sql(table_name: str, constraint_name: str, key_columns: list[str], partitioned: bool = False) -> str:
+    """
+    Returns the `alter table` statement replacing the primary key of an existing games table by the per user key
+    of get_games_table, e.g. the game_id key of tables created before games of two tracked users were kept once per user.
+    The statement is empty if the table already has the per user key.
+
+    Parameters:
+    - table_name (str): games table name
+    - constraint_name (str): name of the current primary key constraint
+    - key_columns (list[str]): current primary key columns (from pg_constraint)
+    - partitioned (bool): if the table is partitioned by start_date
+    """
+    primary_key_columns = get_primary_key_columns(partitioned)
+    if sorted(key_columns) == sorted(primary_key_columns):
+        return ""
+    return (
+        f"alter table {table_name}\n"
+        f"    drop constraint {constraint_name},\n"
+        f"    add primary key ({', '.join(primary_key_columns)})"
+    )
+
+
+def migrate_games_primary_key(postgresql_client: PostgreSqlClient, table_name: str = "games", partitioned: bool = False) -> bool:
+    """
+    Migrates the primary key of an existing games table to the per user key (see get_primary_key_migration_sql).
+    Returns True if the key was replaced, False if the table does not exist or already has the per user key.
+    """
+    if not postgresql_client.table_exists(table_name):
+        return False
+    key_rows = postgresql_client.run_sql(
+        f"""select c.conname as constraint_name, a.attname as column_name
+        from pg_constraint c
+        join pg_attribute a on a.attrelid = c.conrelid and a.attnum = any(c.conkey)
+        where c.conrelid = '{table_name}'::regclass and c.contype = 'p'"""
+    )
+    if len(key_rows) == 0:
+        return False
+    migration_sql = get_primary_key_migration_sql(
+        table_name,
+        constraint_name=key_rows[0]["constraint_name"],
+        key_columns=[row["column_name"] for row in key_rows],
+        partitioned=partitioned,
+    )
+    if migration_sql == "":
+        return False
+    postgresql_client.execute_sql(migration_sql)
+    return True
@@ -1,7 +1,17 @@
-from connectors.postgresql import PostgreSqlClient
+try:
+    from connectors.postgresql import PostgreSqlClient
+except ModuleNotFoundError:
+    from app.connectors.postgresql import PostgreSqlClient
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from sqlalchemy import Table, Column, Integer, String, MetaData, JSON
-from sqlalchemy import insert, select, func
+import atexit
+import gzip
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import Table, Column, Integer, String, Float, MetaData, JSON, TIMESTAMP, LargeBinary
+from sqlalchemy import insert, text
 
 
 class MetaDataLoggingStatus:
@@ -19,11 +29,24 @@ class MetaDataLogging:
         postgresql_client: PostgreSqlClient,
         config: dict = {},
         log_table_name: str = "pipeline_logs",
+        metrics_table_name: str = "pipeline_metrics",
+        compress_logs: bool = True,
+        background_writer: bool = True,
     ):
+        """
+        Writes pipeline run metadata (status, config, logs and stage metrics) to a database.
+
+        Parameters:
+        - compress_logs (bool): store logs gzip compressed in the `logs_compressed` column instead of plain text in `logs`
+        - background_writer (bool): send writes to the database from a background thread, so logging never blocks
+          the pipeline. Call `close` at the end of the run to wait for pending writes.
+        """
         self.pipeline_name = pipeline_name
         self.log_table_name = log_table_name
+        self.metrics_table_name = metrics_table_name
         self.postgresql_client = postgresql_client
         self.config = config
+        self.compress_logs = compress_logs
         self.metadata = MetaData()
         self.table = Table(
             self.log_table_name,
@@ -34,25 +57,87 @@ class MetaDataLogging:
             Column("status", String, primary_key=True),
             Column("config", JSON),
             Column("logs", String),
+            Column("logs_compressed", LargeBinary),
+        )
+        # one row per measurement of a stage, e.g. duration_sec of the transform stage of a user
+        self.metrics_table = Table(
+            self.metrics_table_name,
+            self.metadata,
+            Column("pipeline_name", String, primary_key=True),
+            Column("run_id", Integer, primary_key=True),
+            Column("metric_id", Integer, primary_key=True),
+            Column("timestamp", TIMESTAMP),
+            Column("stage", String),
+            Column("username", String),
+            Column("month", String),
+            Column("node", String),
+            Column("metric", String),
+            Column("value", Float),
         )
+        self.metrics: list[dict] = []
+        self.metrics_count = 0
         self.run_id: int = self._get_run_id()
+        self.write_errors: list[Exception] = []
+        self.write_queue = None
+        self.writer_thread = None
+        if background_writer:
+            self.write_queue = queue.Queue()
+            self.writer_thread = threading.Thread(target=self._write_from_queue, daemon=True)
+            self.writer_thread.start()
+            atexit.register(self.close)
 
     def _create_log_table(self) -> None:
-        """Create log table if it does not exist."""
+        """Create log and metrics tables if they do not exist."""
         self.postgresql_client.create_table(metadata=self.metadata, table_name=self.log_table_name)
+        # log tables created before compressed logs were introduced are missing the column
+        self.postgresql_client.execute_sql(
+            f"alter table {self.log_table_name} add column if not exists logs_compressed bytea"
+        )
+        self.postgresql_client.create_table(metadata=self.metadata, table_name=self.metrics_table_name)
 
-    def _get_run_id(self):
-        """Gets the next run id. Sets run id to 1 if no run id exists."""
-        self._create_log_table()
-        run_id = self.postgresql_client.engine.execute(
-            select(func.max(self.table.c.run_id)).where(
-                self.table.c.pipeline_name == self.pipeline_name
-            )
-        ).first()[0]
-        if run_id is None:
-            return 1
+    def _write(self, statement) -> None:
+        """Executes a write statement, in the background writer thread if it is running"""
+        if self.write_queue is not None:
+            self.write_queue.put(statement)
         else:
-            return run_id + 1
+            self.postgresql_client.engine.execute(statement)
+
+    def _write_from_queue(self) -> None:
+        """Background writer loop, stops when it gets None from the queue"""
+        while True:
+            statement = self.write_queue.get()
+            try:
+                if statement is None:
+                    return
+                self.postgresql_client.engine.execute(statement)
+            except Exception as e:
+                # failing to write metadata must not fail the pipeline run
+                self.write_errors.append(e)
+                logging.getLogger(__name__).error(f"Failed to write pipeline metadata: {e}")
+            finally:
+                self.write_queue.task_done()
+
+    def close(self) -> None:
+        """Writes buffered metrics and waits for the background writer to finish all pending writes"""
+        self.flush_metrics()
+        if self.writer_thread is not None and self.writer_thread.is_alive():
+            self.write_queue.put(None)
+            self.writer_thread.join()
+
+    def _get_run_id(self) -> int:
+        """
+        Allocates the run id from a sequence, so processes started together (e.g. workers) never share a run id.
+        The RUN_START row is written in the background, so the max run id of the log table can't be used.
+        The sequence is created by the first allocation, starting after the run ids already logged.
+        """
+        self._create_log_table()
+        sequence_name = f"{self.log_table_name}_run_id_seq"
+        with self.postgresql_client.engine.begin() as connection:
+            connection.execute(text("select pg_advisory_xact_lock(hashtext(:sequence_name))"), dict(sequence_name=sequence_name))
+            if connection.execute(text("select to_regclass(:sequence_name)"), dict(sequence_name=sequence_name)).scalar() is None:
+                max_run_id = connection.execute(text(f"select coalesce(max(run_id), 0) from {self.log_table_name}")).scalar()
+                connection.execute(text(f"create sequence {sequence_name} start with {int(max_run_id) + 1}"))
+            return connection.execute(text(f"select nextval('{sequence_name}')")).scalar()
 
     def log(
         self,
@@ -60,9 +145,14 @@ class MetaDataLogging:
         timestamp: datetime = None,
         logs: str = None,
     ) -> None:
-        """Writes pipeline metadata log to a database"""
+        """Writes pipeline metadata log and buffered metrics to a database"""
+        self.flush_metrics()
         if timestamp is None:
             timestamp = datetime.now()
+        logs_compressed = None
+        if self.compress_logs and logs is not None:
+            logs_compressed = gzip.compress(logs.encode("utf-8"))
+            logs = None
         insert_statement = insert(self.table).values(
             pipeline_name=self.pipeline_name,
             timestamp=timestamp,
@@ -70,5 +160,67 @@ class MetaDataLogging:
             status=status,
             config=self.config,
             logs=logs,
+            logs_compressed=logs_compressed,
+        )
+        self._write(insert_statement)
+
+    def log_metric(
+        self,
+        stage: str,
+        metric: str,
+        value: float,
+        username: str = None,
+        month: str = None,
+        node: str = None,
+    ) -> None:
+        """Buffers a metric of a pipeline stage, buffered metrics are written by `flush_metrics`"""
+        self.metrics_count += 1
+        self.metrics.append(
+            dict(
+                pipeline_name=self.pipeline_name,
+                run_id=self.run_id,
+                metric_id=self.metrics_count,
+                timestamp=datetime.now(),
+                stage=stage,
+                username=username,
+                month=month,
+                node=node,
+                metric=metric,
+                value=value,
+            )
         )
-        self.postgresql_client.engine.execute(insert_statement)
+
+    @contextmanager
+    def timer(self, stage: str, username: str = None, month: str = None, node: str = None):
+        """
+        Measures the duration of a stage. The yielded dict collects additional metrics of the stage,
+        e.g. `stage_metrics["rows"] = 100`. If `rows` is set, `rows_per_sec` is also logged.
+        A stage which raises logs its duration and a `failed` metric before the exception is re-raised.
+
+                ```python
+                with metadata_logger.timer(stage="load", username="dolols") as stage_metrics:
+                    stage_metrics["rows"] = load_games()
+                ```
+        """
+        stage_metrics = {}
+        dimensions = dict(stage=stage, username=username, month=month, node=node)
+        start = time.perf_counter()
+        try:
+            yield stage_metrics
+        except BaseException:
+            self.log_metric(metric="duration_sec", value=time.perf_counter() - start, **dimensions)
+            self.log_metric(metric="failed", value=1, **dimensions)
+            raise
+        duration = time.perf_counter() - start
+        self.log_metric(metric="duration_sec", value=duration, **dimensions)
+        for metric, value in stage_metrics.items():
+            self.log_metric(metric=metric, value=value, **dimensions)
+        if stage_metrics.get("rows") is not None and duration > 0:
+            self.log_metric(metric="rows_per_sec", value=stage_metrics["rows"] / duration, **dimensions)
+
+    def flush_metrics(self) -> None:
+        """Writes buffered metrics to a database"""
+        if len(self.metrics) == 0:
+            return
+        self._write(insert(self.metrics_table).values(self.metrics))
+        self.metrics = []
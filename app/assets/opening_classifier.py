@@ -0,0 +1,104 @@
+import csv
+import hashlib
+import pickle
+import re
+from pathlib import Path
+from typing import Iterator
+
+# tokens of a PGN movetext: clock comments, move numbers ("1." and "1...") and SAN moves
+MOVETEXT_TOKEN = re.compile(r"\{[^}]*\}|\d+\.+|([^\s{}]+)")
+# annotations chess.com may add to SAN moves, e.g. "Nf3!?"
+SAN_ANNOTATIONS = "!?"
+
+
+class OpeningTrie:
+    def __init__(self, openings: list[tuple[str, str]], children: list[dict], labels: list[int], source_hash: str = None):
+        """
+        Opening classifier over SAN move sequences, stored as a flat prefix trie.
+
+        Node 0 is the root. `children[node]` maps a SAN move to the next node and `labels[node]` is the index of the
+        opening (in `openings`) whose line ends at the node, or -1. A game is labelled with the deepest opening
+        on the path of its moves, so variations win over their parent openings.
+        Use `from_tsv` or `load` to build it.
+
+        Parameters:
+        - openings (list): (eco, name) tuples
+        - children (list): per node dict of SAN move -> child node
+        - labels (list): per node opening index or -1
+        - source_hash (str): hash of the opening lines file the trie was built from, to invalidate caches
+        """
+        self.openings = openings
+        self.children = children
+        self.labels = labels
+        self.source_hash = source_hash
+
+    @classmethod
+    def from_tsv(cls, opening_lines_path: str) -> "OpeningTrie":
+        """
+        Builds the trie from a tab separated file with `eco`, `name` and `moves` (space separated SAN) columns
+        """
+        source = Path(opening_lines_path).read_bytes()
+        openings, children, labels = [], [{}], [-1]
+        with open(opening_lines_path, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file, delimiter="\t"):
+                node = 0
+                for move in row["moves"].split():
+                    next_node = children[node].get(move)
+                    if next_node is None:
+                        next_node = len(children)
+                        children[node][move] = next_node
+                        children.append({})
+                        labels.append(-1)
+                    node = next_node
+                labels[node] = len(openings)
+                openings.append((row["eco"], row["name"]))
+        return cls(openings, children, labels, source_hash=hashlib.sha1(source).hexdigest())
+
+    @classmethod
+    def load(cls, opening_lines_path: str, cache_path: str = None) -> "OpeningTrie":
+        """
+        Returns the trie of the opening lines file, from the pickled cache if it was built from the same file.
+        The cache is (re)written when missing or outdated.
+        """
+        if cache_path is None:
+            return cls.from_tsv(opening_lines_path)
+        source_hash = hashlib.sha1(Path(opening_lines_path).read_bytes()).hexdigest()
+        cache_path = Path(cache_path)
+        if cache_path.exists():
+            with open(cache_path, "rb") as file:
+                openings, children, labels, cached_source_hash = pickle.load(file)
+            if cached_source_hash == source_hash:
+                return cls(openings, children, labels, source_hash=source_hash)
+        trie = cls.from_tsv(opening_lines_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as file:
+            pickle.dump((trie.openings, trie.children, trie.labels, trie.source_hash), file, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(cache_path)
+        return trie
+
+    def classify(self, moves: Iterator[str]) -> tuple[str, str]:
+        """
+        Walks the moves down the trie and returns the (eco, name) of the deepest matching opening, None if no opening matches.
+        Stops consuming moves as soon as the game leaves the known lines.
+        """
+        node, label = 0, -1
+        for move in moves:
+            node = self.children[node].get(move.rstrip(SAN_ANNOTATIONS))
+            if node is None:
+                break
+            if self.labels[node] != -1:
+                label = self.labels[node]
+        return self.openings[label] if label != -1 else None
+
+    def classify_pgn(self, pgn: str) -> tuple[str, str]:
+        """
+        Classifies the opening of a game from its PGN, only tokenizing the moves needed to walk the trie
+        """
+        movetext_start = pgn.rfind("]\n") + 1
+        moves = (
+            token.group(1)
+            for token in MOVETEXT_TOKEN.finditer(pgn, movetext_start)
+            if token.group(1) is not None
+        )
+        return self.classify(moves)
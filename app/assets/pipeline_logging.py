@@ -1,9 +1,49 @@
 import logging
 import time
+from collections import deque
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity_bytes: int = 5 * 1024 * 1024):
+        """
+        Keeps the latest formatted log records in memory, dropping the oldest ones once capacity_bytes is reached
+        """
+        super().__init__()
+        self.capacity_bytes = capacity_bytes
+        self.records = deque()
+        self.size_bytes = 0
+        self.dropped_records = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            message = f"{self.format(record)}\n"
+        except Exception:
+            self.handleError(record)
+            return
+        self.acquire()
+        try:
+            self.records.append(message)
+            self.size_bytes += len(message)
+            while self.size_bytes > self.capacity_bytes and len(self.records) > 1:
+                self.size_bytes -= len(self.records.popleft())
+                self.dropped_records += 1
+        finally:
+            self.release()
+
+    def get_value(self) -> str:
+        self.acquire()
+        try:
+            logs = "".join(self.records)
+            dropped_records = self.dropped_records
+        finally:
+            self.release()
+        if dropped_records > 0:
+            return f"... {dropped_records} earlier log records dropped (log buffer capacity {self.capacity_bytes} bytes) ...\n{logs}"
+        return logs
 
 
 class PipelineLogging:
-    def __init__(self, pipeline_name: str, log_folder_path: str):
+    def __init__(self, pipeline_name: str, log_folder_path: str, log_buffer_capacity_bytes: int = 5 * 1024 * 1024):
         self.pipeline_name = pipeline_name
         self.log_folder_path = log_folder_path
         logger = logging.getLogger(pipeline_name)
@@ -15,15 +55,19 @@ class PipelineLogging:
         file_handler.setLevel(logging.INFO)
         stream_handler = logging.StreamHandler()
         stream_handler.setLevel(logging.INFO)
+        # in-memory copy of the run's logs, so get_logs does not need to re-read the log file
+        self.buffer_handler = RingBufferHandler(capacity_bytes=log_buffer_capacity_bytes)
+        self.buffer_handler.setLevel(logging.INFO)
         formatter = logging.Formatter(
             "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
         )
         file_handler.setFormatter(formatter)
         stream_handler.setFormatter(formatter)
+        self.buffer_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
         logger.addHandler(stream_handler)
+        logger.addHandler(self.buffer_handler)
         self.logger = logger
 
     def get_logs(self) -> str:
-        with open(self.file_path, "r") as file:
-            return "".join(file.readlines())
+        return self.buffer_handler.get_value()
@@ -0,0 +1,129 @@
+import cProfile
+import pstats
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class StageProfiler:
+    # functions of the games ETL reported in the summary of every stage they ran in
+    TRACKED_FUNCTIONS = [
+        "get_monthly_games",
+        "parse_game",
+        "pgn_to_dict",
+        "_get_avg_move_time",
+        "transform",
+        "format_timedelta",
+        "load",
+        "create_table_as",
+        "upsert_incremental",
+        "refresh_materialized_view",
+    ]
+
+    def __init__(
+        self,
+        output_folder_path: str,
+        run_name: str,
+        enabled: bool = True,
+        top_functions: int = 15,
+    ):
+        """
+        Profiles pipeline stages with cProfile (CPU) and tracemalloc (peak allocated memory).
+
+        Each profiled stage is dumped to `{output_folder_path}/{run_name}/{index}_{stage}.prof` (readable with pstats
+        or snakeviz) and `write_summary` writes a summary of the top functions and peak allocation per stage.
+        When disabled, `profile` does nothing so stages can always be wrapped.
+
+        Parameters:
+        - output_folder_path (str): folder to write the profile artifacts to, e.g. the logs folder
+        - run_name (str): name of the run's sub folder
+        - enabled (bool): turns profiling on
+        - top_functions (int): number of functions (by cumulative time) listed per stage in the summary
+        """
+        self.enabled = enabled
+        self.output_path = Path(output_folder_path) / run_name
+        self.top_functions = top_functions
+        self.stages: list[dict] = []
+        self.active_stage: str = None
+
+    @contextmanager
+    def profile(self, stage: str):
+        """Profiles the code run within the context as one stage, stages can't be nested"""
+        if not self.enabled:
+            yield
+            return
+        if self.active_stage is not None:
+            raise Exception(f"Can't profile stage '{stage}' while stage '{self.active_stage}' is being profiled.")
+        self.active_stage = stage
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        memory_before, _ = tracemalloc.get_traced_memory()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            _, memory_peak = tracemalloc.get_traced_memory()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            self.active_stage = None
+            self._add_stage(stage, profiler, duration, memory_peak - memory_before)
+
+    def _add_stage(self, stage: str, profiler: cProfile.Profile, duration: float, peak_memory_bytes: int) -> None:
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        file_name = re.sub(r"[^\w.-]+", "_", f"{len(self.stages) + 1:03}_{stage}")
+        profile_path = self.output_path / f"{file_name}.prof"
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(profile_path)
+        self.stages.append(
+            {
+                "stage": stage,
+                "duration_sec": duration,
+                "peak_memory_bytes": peak_memory_bytes,
+                "profile_path": profile_path,
+                "stats": stats,
+            }
+        )
+
+    def _get_function_rows(self, stats: pstats.Stats) -> list[tuple]:
+        """Returns (function, calls, total time, cumulative time) rows sorted by cumulative time"""
+        rows = []
+        for (file_name, line, function), (_, calls, total_time, cumulative_time, _) in stats.stats.items():
+            # built-in functions have no file and line
+            name = f"{function} ({Path(file_name).name}:{line})" if line else function
+            rows.append((name, function, calls, total_time, cumulative_time))
+        return sorted(rows, key=lambda row: row[4], reverse=True)
+
+    def get_summary(self) -> str:
+        """Returns a text summary of all profiled stages"""
+        lines = [f"{'stage':<50} {'duration_sec':>12} {'peak_memory_mb':>15}"]
+        for stage in self.stages:
+            lines.append(
+                f"{stage['stage']:<50} {stage['duration_sec']:>12.3f} {stage['peak_memory_bytes'] / 1024 / 1024:>15.2f}"
+            )
+        for stage in self.stages:
+            rows = self._get_function_rows(stage["stats"])
+            lines += ["", f"== {stage['stage']} ({stage['profile_path'].name})"]
+            lines.append(f"{'ncalls':>10} {'tottime':>10} {'cumtime':>10}  function")
+            for name, _, calls, total_time, cumulative_time in rows[: self.top_functions]:
+                lines.append(f"{calls:>10} {total_time:>10.3f} {cumulative_time:>10.3f}  {name}")
+            tracked_rows = [row for row in rows if row[1] in self.TRACKED_FUNCTIONS and row not in rows[: self.top_functions]]
+            for name, _, calls, total_time, cumulative_time in tracked_rows:
+                lines.append(f"{calls:>10} {total_time:>10.3f} {cumulative_time:>10.3f}  {name} [tracked]")
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self) -> Path:
+        """Writes the summary of all profiled stages to `summary.txt` and returns its path"""
+        if not self.enabled or len(self.stages) == 0:
+            return None
+        summary_path = self.output_path / "summary.txt"
+        with open(summary_path, "w") as file:
+            file.write(self.get_summary())
+        return summary_path
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import statistics
+from datetime import datetime
+from sqlalchemy import Table, Column, Integer, BigInteger, String, Float, MetaData, TIMESTAMP, JSON, Index
+
+try:
+    from connectors.postgresql import PostgreSqlClient
+except ModuleNotFoundError:
+    from app.connectors.postgresql import PostgreSqlClient
+
+
+def get_plan_rows(plan_node: dict) -> int:
+    """Returns the rows produced by a plan, for insert plans the rows of the inserted select"""
+    if plan_node.get("Node Type") == "ModifyTable" and plan_node.get("Plans"):
+        return get_plan_rows(plan_node["Plans"][0])
+    return plan_node.get("Actual Rows")
+
+
+def get_plan_signature(plan_node: dict) -> str:
+    """
+    Returns a hash of the shape of a plan (node types, relations, indexes, join types and strategies),
+    which changes when postgres picks a different plan but not with costs, timings or row counts
+    """
+    def get_shape(node: dict) -> list:
+        return [
+            node.get("Node Type"),
+            node.get("Relation Name"),
+            node.get("Index Name"),
+            node.get("Join Type"),
+            node.get("Strategy"),
+            [get_shape(child) for child in node.get("Plans", [])],
+        ]
+
+    return hashlib.sha1(json.dumps(get_shape(plan_node)).encode()).hexdigest()
+
+
+def find_plan_regressions(record: dict, history: list[dict], slowdown_threshold: float, min_execution_ms: float) -> list[str]:
+    """
+    Compares the plan of a node with the earlier plans of the same template, latest first.
+    Reports a changed plan shape and an execution time above slowdown_threshold times the median of the history
+    (node executions faster than min_execution_ms are never reported as slow).
+    """
+    if len(history) == 0:
+        return []
+    regressions = []
+    if record["plan_signature"] != history[0]["plan_signature"]:
+        regressions.append(
+            f"Plan of {record['node']} changed since run {history[0]['run_id']} "
+            f"(template {record['template_hash'][:8]}), rows {history[0]['rows_produced']} -> {record['rows_produced']}"
+        )
+    median_execution_ms = statistics.median(previous["execution_ms"] for previous in history)
+    if record["execution_ms"] > max(median_execution_ms * slowdown_threshold, min_execution_ms):
+        regressions.append(
+            f"{record['node']} took {record['execution_ms']:.0f} ms, "
+            f"{record['execution_ms'] / max(median_execution_ms, 0.001):.1f}x its median of {median_execution_ms:.0f} ms "
+            f"over the last {len(history)} runs (template {record['template_hash'][:8]})"
+        )
+    return regressions
+
+
+class QueryPlanRecorder:
+    def __init__(
+        self,
+        postgresql_client: PostgreSqlClient,
+        run_id: int,
+        logger: logging.Logger,
+        table_name: str = "transform_query_plans",
+        history_runs: int = 10,
+        slowdown_threshold: float = 2.0,
+        min_execution_ms: float = 100,
+    ):
+        """
+        Stores the `explain (analyze, buffers, format json)` output of every SQL transform node, keyed by run_id and node,
+        together with its template hash, execution time and produced rows. Each plan is compared with the plans
+        recorded for the same template in the last history_runs runs, regressions are logged as warnings
+        (see find_plan_regressions).
+
+        Parameters:
+        - postgresql_client (PostgreSqlClient): client of the database the transforms run in
+        - run_id (int): id of the pipeline run
+        - logger (logging.Logger): logger of the warnings
+        - table_name (str): table of the recorded plans
+        - history_runs (int): number of earlier runs a plan is compared with
+        - slowdown_threshold (float): slowdown factor over the median execution time reported as a regression
+        - min_execution_ms (float): execution time below which a node is never reported as slow
+        """
+        self.postgresql_client = postgresql_client
+        self.run_id = run_id
+        self.logger = logger
+        self.table_name = table_name
+        self.history_runs = history_runs
+        self.slowdown_threshold = slowdown_threshold
+        self.min_execution_ms = min_execution_ms
+        self.metadata = MetaData()
+        self.table = Table(
+            self.table_name,
+            self.metadata,
+            Column("run_id", Integer, primary_key=True),
+            Column("node", String, primary_key=True),
+            Column("template_hash", String),
+            Column("recorded_at", TIMESTAMP),
+            Column("execution_ms", Float),
+            Column("planning_ms", Float),
+            Column("rows_produced", BigInteger),
+            Column("shared_hit_blocks", BigInteger),
+            Column("shared_read_blocks", BigInteger),
+            Column("plan_signature", String),
+            Column("plan", JSON),
+        )
+        Index(
+            f"{self.table_name}_node_template_hash_idx",
+            self.table.columns["node"],
+            self.table.columns["template_hash"],
+            self.table.columns["recorded_at"],
+        )
+        self.postgresql_client.create_table(table_name=self.table_name, metadata=self.metadata)
+
+    def get_history(self, node: str, template_hash: str) -> list[dict]:
+        """Returns the plans recorded for the template in earlier runs, latest first"""
+        return self.postgresql_client.run_sql(
+            f"""
+            select run_id, rows_produced, execution_ms, plan_signature
+            from {self.table_name}
+            where node = '{node}' and template_hash = '{template_hash}' and run_id <> {int(self.run_id)}
+            order by recorded_at desc
+            limit {int(self.history_runs)}
+            """
+        )
+
+    def record(self, node: str, template_hash: str, plan) -> dict:
+        """
+        Records the explain output of a node and logs a warning for every regression against its history
+        """
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        plan = plan[0]
+        record = dict(
+            run_id=self.run_id,
+            node=node,
+            template_hash=template_hash,
+            recorded_at=datetime.now(),
+            execution_ms=plan["Execution Time"],
+            planning_ms=plan["Planning Time"],
+            rows_produced=get_plan_rows(plan["Plan"]),
+            shared_hit_blocks=plan["Plan"].get("Shared Hit Blocks"),
+            shared_read_blocks=plan["Plan"].get("Shared Read Blocks"),
+            plan_signature=get_plan_signature(plan["Plan"]),
+            plan=plan,
+        )
+        for regression in find_plan_regressions(
+            record, self.get_history(node, template_hash), self.slowdown_threshold, self.min_execution_ms
+        ):
+            self.logger.warning(f"Query plan regression: {regression}")
+        self.postgresql_client.upsert(data=[record], table=self.table, metadata=self.metadata)
+        return record
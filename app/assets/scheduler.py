@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+from typing import Callable
+from sqlalchemy import text, bindparam
+
+try:
+    from connectors.postgresql import PostgreSqlClient
+    from assets.Chess import get_month_window
+except ModuleNotFoundError:
+    from app.connectors.postgresql import PostgreSqlClient
+    from app.assets.Chess import get_month_window
+
+
+class UserScheduler:
+    def __init__(
+        self,
+        postgresql_client: PostgreSqlClient,
+        games_table: str = "games",
+        players_table: str = "players",
+        max_snapshot_age_minutes: int = 60,
+        dormant_grace_minutes: int = 30,
+        recent_days: int = 30,
+    ):
+        """
+        Decides which users the games ETL extracts and in which order, before any games are requested.
+
+        A user is skipped as dormant when the latest profile snapshot (players table) shows they have not been online
+        since shortly after their last loaded game ended. The snapshot is only trusted while it is younger than
+        max_snapshot_age_minutes, as the user may have played since. The remaining users are checked against their
+        archive index: users without an archive month in their window are skipped and the window is narrowed to
+        the months they played. Users are ordered by expected new games (their games per day over the recent_days
+        before their last loaded game, times the days since), users without loaded games first.
+
+        Parameters:
+        - postgresql_client (PostgreSqlClient): client of the database holding the games and players tables
+        - games_table (str): games table name
+        - players_table (str): table of the profile snapshots
+        - max_snapshot_age_minutes (int): age after which a profile snapshot is not used to skip a user
+        - dormant_grace_minutes (int): time a user may stay online after their last game and still count as dormant
+        - recent_days (int): days before the last loaded game used to estimate a user's games per day
+        """
+        self.postgresql_client = postgresql_client
+        self.games_table = games_table
+        self.players_table = players_table
+        self.max_snapshot_age = timedelta(minutes=max_snapshot_age_minutes)
+        self.dormant_grace = timedelta(minutes=dormant_grace_minutes)
+        self.recent_days = recent_days
+
+    def _query(self, sql: str, usernames: list[str]) -> dict:
+        statement = text(sql).bindparams(bindparam("usernames", expanding=True))
+        with self.postgresql_client.engine.connect() as connection:
+            rows = connection.execute(statement, {"usernames": [username.lower() for username in usernames]})
+            return {row["username"]: dict(row) for row in rows.mappings()}
+
+    def get_activity(self, usernames: list[str]) -> dict:
+        """
+        Returns the last loaded game (start date and end time), the number of games in the recent_days before it
+        and the latest profile snapshot of every user, keyed by lower case username. One query per table.
+        """
+        activity = {username.lower(): {} for username in usernames}
+        if self.postgresql_client.table_exists(self.games_table):
+            games = self._query(
+                f"""
+                with last_games as (
+                    select lower(username) as username,
+                        max(cast(start_date as date)) as last_game_date,
+                        max(cast(end_date_time as timestamp)) as last_game_end
+                    from {self.games_table}
+                    where lower(username) in :usernames
+                    group by lower(username)
+                )
+                select last_games.username, last_games.last_game_date, last_games.last_game_end, count(*) as recent_games
+                from last_games
+                join {self.games_table} as games
+                    on lower(games.username) = last_games.username
+                    and cast(games.start_date as date) > last_games.last_game_date - {int(self.recent_days)}
+                group by last_games.username, last_games.last_game_date, last_games.last_game_end
+                """,
+                usernames,
+            )
+            for username, row in games.items():
+                activity[username].update(row)
+        if self.postgresql_client.table_exists(self.players_table):
+            players = self._query(
+                f"""
+                select distinct on (lower(username)) lower(username) as username, last_online, snaphot_date
+                from {self.players_table}
+                where lower(username) in :usernames
+                order by lower(username), snaphot_date desc
+                """,
+                usernames,
+            )
+            for username, row in players.items():
+                activity[username].update(row)
+        return activity
+
+    def is_dormant(self, user_activity: dict, now: datetime) -> bool:
+        """Checks if a fresh profile snapshot shows the user was not online since their last loaded game"""
+        last_game_end = user_activity.get("last_game_end")
+        last_online = user_activity.get("last_online")
+        snapshot_date = user_activity.get("snaphot_date")
+        if last_game_end is None or last_online is None or snapshot_date is None:
+            return False
+        return now - snapshot_date <= self.max_snapshot_age and last_online <= last_game_end + self.dormant_grace
+
+    def get_expected_games(self, user_activity: dict, now: datetime) -> float:
+        """Estimates the number of new games of a user, users without loaded games are expected to have the most"""
+        if user_activity.get("last_game_date") is None:
+            return float("inf")
+        days_since = (now.date() - user_activity["last_game_date"]).days + 1
+        return user_activity["recent_games"] / self.recent_days * days_since
+
+    def plan(
+        self,
+        usernames: list[str],
+        get_date_window: Callable[[str], tuple[str, str]],
+        get_archive_months: Callable[[str], list[str]],
+    ) -> list[dict]:
+        """
+        Returns a run per user (username, start_date, end_date, expected_games, skip_reason), the runs to extract
+        (skip_reason None) ordered by expected_games, busiest users first, followed by the skipped users.
+
+        Parameters:
+        - usernames (list): users to extract
+        - get_date_window (callable): returns the (start_date, end_date) window of a user
+        - get_archive_months (callable): returns the months ('YYYY-MM') of a user's archive index
+        """
+        now = datetime.now()
+        activity = self.get_activity(usernames)
+        runs = []
+        for username in usernames:
+            user_activity = activity[username.lower()]
+            run = dict(username=username, start_date=None, end_date=None, expected_games=0, skip_reason=None)
+            runs.append(run)
+            if self.is_dormant(user_activity, now):
+                run["skip_reason"] = f"not online since {user_activity['last_online']} (last game ended {user_activity['last_game_end']})"
+                continue
+            start_date, end_date = get_date_window(username)
+            window_months = [month for month in get_archive_months(username) if start_date[:7] <= month <= end_date[:7]]
+            if len(window_months) == 0:
+                run["skip_reason"] = f"no archive months between {start_date} and {end_date}"
+                continue
+            run["start_date"] = max(start_date, get_month_window(window_months[0])[0])
+            run["end_date"] = min(end_date, get_month_window(window_months[-1])[1])
+            run["expected_games"] = self.get_expected_games(user_activity, now)
+        return sorted(runs, key=lambda run: (run["skip_reason"] is not None, -run["expected_games"]))
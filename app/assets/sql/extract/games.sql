@@ -1,5 +1,6 @@
 {% set config = {
-    "extract_type": "full",
+    "extract_type": "cdc",
+    "batch_size": 1000,
     "source_table_name": "games"
 } %}
 
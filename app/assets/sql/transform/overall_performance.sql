@@ -1,11 +1,11 @@
 SELECT
     username,
-    ROUND((SUM(CASE WHEN match_result = 'win' THEN 1 ELSE 0 END) * 100.0 / COUNT(game_id)), 2)   AS win_perc,
-    ROUND((SUM(CASE WHEN match_result = 'defet' THEN 1 ELSE 0 END) * 100.0 / COUNT(game_id)), 2) AS defeat_perc,
-    ROUND((SUM(CASE WHEN match_result = 'draw' THEN 1 ELSE 0 END) * 100.0 / COUNT(game_id)), 2)  AS draw_perc
+    ROUND((total_wins * 100.0 / total_games), 2)   AS win_perc,
+    ROUND((total_losses * 100.0 / total_games), 2) AS defeat_perc,
+    ROUND((total_draws * 100.0 / total_games), 2)  AS draw_perc
 FROM
-    public.games
-GROUP BY
-    username
+    user_aggregates
+WHERE
+    grouping_level = 'user'
 ORDER BY
     username ASC
@@ -9,25 +9,24 @@ WITH players_last_online AS (
 )
 
 SELECT
-    games.username,
-    COUNT(games.game_id)                                           AS total_games,
-    AVG(games.user_rating)                                         AS avg_user_rating,
-    AVG(games.opponent_rating)                                     AS avg_opponent_rating,
-    SUM(CASE WHEN games.match_result = 'win' THEN 1 ELSE 0 END)    AS total_wins,
-    SUM(CASE WHEN games.match_result = 'defeat' THEN 1 ELSE 0 END) AS total_losses,
-    SUM(CASE WHEN games.match_result = 'draw' THEN 1 ELSE 0 END)   AS total_draws,
+    user_aggregates.username,
+    user_aggregates.total_games,
+    user_aggregates.sum_user_rating::NUMERIC / NULLIF(user_aggregates.user_rating_count, 0)         AS avg_user_rating,
+    user_aggregates.sum_opponent_rating::NUMERIC / NULLIF(user_aggregates.opponent_rating_count, 0) AS avg_opponent_rating,
+    user_aggregates.total_wins,
+    user_aggregates.total_losses,
+    user_aggregates.total_draws,
     CASE WHEN
             players_last_online.is_active
-            AND MAX(CAST(games.start_date_time AS TIMESTAMP)) >= NOW() - INTERVAL '1 month'
+            AND user_aggregates.last_start_date_time >= NOW() - INTERVAL '1 month'
             THEN 'Active and playing'
         WHEN players_last_online.is_active THEN 'Active not playing'
         WHEN players_last_online.is_active IS NULL THEN 'Unknown (missing players data)'
         ELSE 'Not active'
-    END                                                            AS player_status
+    END                                                                                             AS player_status
 FROM
-    public.games
+    user_aggregates
 LEFT JOIN
-    players_last_online ON games.username = players_last_online.username
-GROUP BY
-    games.username,
-    players_last_online.is_active
+    players_last_online ON user_aggregates.username = players_last_online.username
+WHERE
+    user_aggregates.grouping_level = 'user'
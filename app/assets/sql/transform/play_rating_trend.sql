@@ -1,9 +1,18 @@
+{% if daily_ratings_table %}
+SELECT
+    start_date,
+    username,
+    game_mode,
+    last_rating,
+    rating_delta AS increase_in_rating
+FROM {{ daily_ratings_table }}
+{% else %}
 WITH games_per_date AS (
     SELECT
         start_date,
         username,
         FIRST_VALUE(user_rating)
-            OVER (PARTITION BY username, start_date ORDER BY CAST(start_date_time AS TIMESTAMP) DESC)
+            OVER (PARTITION BY username, start_date ORDER BY {{ 'start_date_time' if typed_schema else 'CAST(start_date_time AS TIMESTAMP)' }} DESC)
             AS last_rating
     FROM games
 ),
@@ -23,3 +32,4 @@ SELECT
     last_rating,
     last_rating - LAG(last_rating) OVER (PARTITION BY username ORDER BY start_date) AS increase_in_rating
 FROM date_user_rating
+{% endif %}
@@ -0,0 +1,26 @@
+-- all per user counters of the summary tables in a single scan of games
+-- grouping_level: 'user' (all games of a user) and 'user_opening_game_mode'
+SELECT
+    username,
+    opening,
+    game_mode,
+    CASE GROUPING(opening, game_mode)
+        WHEN 3 THEN 'user'
+        ELSE 'user_opening_game_mode'
+    END                                                      AS grouping_level,
+    COUNT(game_id)                                           AS total_games,
+    SUM(CASE WHEN match_result = 'win' THEN 1 ELSE 0 END)    AS total_wins,
+    -- lost games are stored as 'defet', the performance summary used to compare with 'defeat' and always reported 0 losses
+    SUM(CASE WHEN match_result = 'defet' THEN 1 ELSE 0 END)  AS total_losses,
+    SUM(CASE WHEN match_result = 'draw' THEN 1 ELSE 0 END)   AS total_draws,
+    SUM(user_rating)                                         AS sum_user_rating,
+    COUNT(user_rating)                                       AS user_rating_count,
+    SUM(opponent_rating)                                     AS sum_opponent_rating,
+    COUNT(opponent_rating)                                   AS opponent_rating_count,
+    MAX({{ 'start_date_time' if typed_schema else 'CAST(start_date_time AS TIMESTAMP)' }}) AS last_start_date_time
+FROM
+    public.games
+GROUP BY GROUPING SETS (
+    (username),
+    (username, opening, game_mode)
+)
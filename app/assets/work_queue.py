@@ -0,0 +1,175 @@
+from sqlalchemy import Table, Column, BigInteger, Integer, String, MetaData, TIMESTAMP, Index, text
+
+try:
+    from connectors.postgresql import PostgreSqlClient
+except ModuleNotFoundError:
+    from app.connectors.postgresql import PostgreSqlClient
+
+
+class TaskStatus:
+    """Data class for task status"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        postgresql_client: PostgreSqlClient,
+        table_name: str = "extract_tasks",
+        lease_seconds: int = 900,
+        max_attempts: int = 3,
+    ):
+        """
+        Postgres backed queue of user-month extraction tasks shared by any number of workers.
+
+        Workers lease one task at a time with `select ... for update skip locked`, so concurrent workers never get
+        the same task and never wait for each other. A lease expires after lease_seconds, after which the task can
+        be leased again (e.g. when its worker died). Failed tasks are retried until they were attempted max_attempts times.
+
+        Parameters:
+        - postgresql_client (PostgreSqlClient): client of the database holding the task table
+        - table_name (str): task table name
+        - lease_seconds (int): time a worker has to finish a task before others may take it over
+        - max_attempts (int): number of leases of a task before it is marked as failed
+        """
+        self.postgresql_client = postgresql_client
+        self.table_name = table_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.metadata = MetaData()
+        self.table = Table(
+            self.table_name,
+            self.metadata,
+            Column("task_id", BigInteger, primary_key=True),
+            Column("username", String),
+            Column("month", String),
+            Column("status", String),
+            Column("attempts", Integer),
+            Column("lease_owner", String),
+            Column("lease_expires_at", TIMESTAMP),
+            Column("loaded_rows", Integer),
+            Column("last_error", String),
+            Column("updated_at", TIMESTAMP),
+        )
+        Index(f"{self.table_name}_username_month_idx", self.table.columns["username"], self.table.columns["month"], unique=True)
+        Index(f"{self.table_name}_status_month_idx", self.table.columns["status"], self.table.columns["month"])
+        self.postgresql_client.create_table(table_name=self.table_name, metadata=self.metadata)
+
+    def _execute(self, sql: str, **params) -> list[dict]:
+        with self.postgresql_client.engine.begin() as connection:
+            result = connection.execute(text(sql), params)
+            return [dict(row) for row in result.mappings().all()] if result.returns_rows else []
+
+    def enqueue(self, usernames: list[str], months: list[str], requeue_months: list[str] = None) -> int:
+        """
+        Adds a pending task for every user and month ('YYYY-MM') which has no task yet.
+        Finished tasks of requeue_months (e.g. the current month, which still gets new games) are made pending again.
+        Returns the number of added or requeued tasks.
+        """
+        requeue_months = requeue_months or []
+        tasks_count = 0
+        for username in usernames:
+            for month in months:
+                rows = self._execute(
+                    f"""
+                    insert into {self.table_name} (username, month, status, attempts, updated_at)
+                    values (:username, :month, :pending, 0, now())
+                    on conflict (username, month) do update
+                    set status = :pending, attempts = 0, last_error = null, updated_at = now()
+                    where :requeue and {self.table_name}.status in (:done, :failed)
+                    returning task_id
+                    """,
+                    username=username,
+                    month=month,
+                    requeue=month in requeue_months,
+                    pending=TaskStatus.PENDING,
+                    done=TaskStatus.DONE,
+                    failed=TaskStatus.FAILED,
+                )
+                tasks_count += len(rows)
+        return tasks_count
+
+    def lease(self, worker_id: str) -> dict:
+        """
+        Leases the next pending (or expired) task to the worker, oldest month first.
+        Returns the task (task_id, username, month, attempts) or None if there is no task to work on.
+        """
+        # expired leases of tasks without attempts left are not retried
+        self._execute(
+            f"""
+            update {self.table_name}
+            set status = :failed, last_error = coalesce(last_error, 'lease expired'), updated_at = now()
+            where status = :running and lease_expires_at < now() and attempts >= :max_attempts
+            """,
+            failed=TaskStatus.FAILED,
+            running=TaskStatus.RUNNING,
+            max_attempts=self.max_attempts,
+        )
+        rows = self._execute(
+            f"""
+            update {self.table_name}
+            set status = :running,
+                attempts = attempts + 1,
+                lease_owner = :worker_id,
+                lease_expires_at = now() + make_interval(secs => :lease_seconds),
+                updated_at = now()
+            where task_id = (
+                select task_id
+                from {self.table_name}
+                where (status = :pending or (status = :running and lease_expires_at < now()))
+                    and attempts < :max_attempts
+                order by month, task_id
+                limit 1
+                for update skip locked
+            )
+            returning task_id, username, month, attempts
+            """,
+            running=TaskStatus.RUNNING,
+            pending=TaskStatus.PENDING,
+            worker_id=worker_id,
+            lease_seconds=self.lease_seconds,
+            max_attempts=self.max_attempts,
+        )
+        return rows[0] if len(rows) > 0 else None
+
+    def complete(self, task_id: int, worker_id: str, loaded_rows: int = None) -> None:
+        """Marks a leased task as done"""
+        self._execute(
+            f"""
+            update {self.table_name}
+            set status = :done, loaded_rows = :loaded_rows, last_error = null, lease_expires_at = null, updated_at = now()
+            where task_id = :task_id and lease_owner = :worker_id
+            """,
+            done=TaskStatus.DONE,
+            loaded_rows=loaded_rows,
+            task_id=task_id,
+            worker_id=worker_id,
+        )
+
+    def fail(self, task_id: int, worker_id: str, error: str) -> None:
+        """Releases a leased task after an error, it is retried unless it has no attempts left"""
+        self._execute(
+            f"""
+            update {self.table_name}
+            set status = case when attempts < :max_attempts then :pending else :failed end,
+                last_error = :error,
+                lease_expires_at = null,
+                updated_at = now()
+            where task_id = :task_id and lease_owner = :worker_id
+            """,
+            max_attempts=self.max_attempts,
+            pending=TaskStatus.PENDING,
+            failed=TaskStatus.FAILED,
+            error=error[:1000],
+            task_id=task_id,
+            worker_id=worker_id,
+        )
+
+    def get_status_counts(self) -> dict:
+        """Returns the number of tasks per status"""
+        rows = self._execute(f"select status, count(*) as tasks from {self.table_name} group by status")
+        return {row["status"]: row["tasks"] for row in rows}
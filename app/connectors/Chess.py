@@ -1,4 +1,5 @@
 import requests
+import time
 from datetime import datetime
 from typing import Union
 from requests import JSONDecodeError
@@ -9,23 +10,62 @@ import re
 # urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class ChessApiClient:
-    def __init__(self, username: str, user_agent: str):
+    RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+    def __init__(
+        self,
+        username: str,
+        user_agent: str,
+        api_path: str = "http://api.chess.com/pub",
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+    ):
         """
         Class to connect to chess.com API
 
         Parameters:
         - username (str): a chess.com user's username
-
+        - user_agent (str): user agent sent with every request
+        - api_path (str): root of the API, can point to a local stand-in server for testing
+        - max_retries (int): retries of a request throttled (429) or failed by the server (5xx)
+        - backoff_factor (float): seconds to wait before the first retry, doubled on each following one.
+          A Retry-After header sent by the server takes precedence.
         """
         self.username = username
-        self.api_path = "http://api.chess.com/pub"
+        self.api_path = api_path
         self.headers = {'User-Agent': f"{user_agent}"}
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.request_log = []
+
+    def _get(self, url: str, period: str = None) -> requests.Response:
+        """
+        Sends a GET request, retrying throttled and server failed requests with exponential backoff.
+        Every response is recorded in `request_log` (with the month of the archive as `period` if provided).
+        """
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            response = requests.get(url=url, headers=self.headers)
+            self.request_log.append({
+                "url": url,
+                "period": period,
+                "status_code": response.status_code,
+                "bytes": len(response.content),
+                "latency_sec": time.perf_counter() - start,
+            })
+            if response.status_code not in self.RETRY_STATUS_CODES or attempt == self.max_retries:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None and retry_after.isdigit():
+                time.sleep(int(retry_after))
+            else:
+                time.sleep(self.backoff_factor * 2 ** attempt)
 
     def get_archive_urls(self) -> list:
         """
         Returns a list of urls of months played by a user
         """
-        response = requests.get(url=f"{self.api_path}/player/{self.username}/games/archives", headers=self.headers)
+        response = self._get(url=f"{self.api_path}/player/{self.username}/games/archives")
         if response.status_code == 200 and response.json().get("archives") is not None:
             return response.json().get("archives")
         else:
@@ -40,15 +80,36 @@ class ChessApiClient:
         - month (int): the month the games were played
         """
         url = f"{self.api_path}/player/{self.username}/games/{year}/{str(month).zfill(2)}"
-        response = requests.get(url=url, headers=self.headers)
+        response = self._get(url=url, period=f"{year}-{str(month).zfill(2)}")
         if response.status_code == 200 and response.json().get("games") is not None:
             return response.json().get("games")
+        else:
+            raise Exception(
+                f"failed to extract games of {self.username} for {year}-{str(month).zfill(2)} from chess API. "
+                f"status Codes: {response.status_code}. Response: {response.text[:200]}"
+            )
+
+    def get_request_stats(self) -> list[dict]:
+        """
+        Returns number of requests, failed requests, bytes and latency of the requests sent so far, grouped by period
+        """
+        stats = {}
+        for request in self.request_log:
+            period_stats = stats.setdefault(
+                request["period"],
+                {"period": request["period"], "requests": 0, "failed_requests": 0, "bytes": 0, "latency_sec": 0.0},
+            )
+            period_stats["requests"] += 1
+            period_stats["failed_requests"] += int(request["status_code"] != 200)
+            period_stats["bytes"] += request["bytes"]
+            period_stats["latency_sec"] += request["latency_sec"]
+        return list(stats.values())
 
     def get_user_info(self) -> dict:
         """
         Returns info about the user
         """
-        response = requests.get(url=f"{self.api_path}/player/{self.username}", headers=self.headers)
+        response = self._get(url=f"{self.api_path}/player/{self.username}")
         if response.status_code == 200:
             return response.json()
         else:
@@ -61,7 +122,7 @@ class ChessApiClient:
         info = self.get_user_info()
         country_url = info.get("country")
         if country_url is not None:
-            response = requests.get(url=country_url, headers=self.headers)
+            response = self._get(url=country_url)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -0,0 +1,76 @@
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class ParquetCheckpoint:
+    def __init__(self, base_path: str, partition_date_column: str = "start_date"):
+        """
+        Class to checkpoint transformed dataframes as parquet files between transform and load
+
+        Files are partitioned by username and month:
+        `{base_path}/username={username}/month={YYYY-MM}/part-{timestamp}.parquet`
+        A file is pending until it gets a `.loaded` marker next to it, so a failed load can be resumed
+        by loading the pending files again. Loaded files are kept for bulk loads and offline analysis.
+
+        Parameters:
+        - base_path (str): root folder of the checkpoint
+        - partition_date_column (str): 'YYYY-MM-DD' column used to derive the month partition
+        """
+        self.base_path = Path(base_path)
+        self.partition_date_column = partition_date_column
+
+    def write(self, df: pd.DataFrame) -> list[Path]:
+        """
+        Writes a dataframe to the checkpoint, one parquet file per username and month.
+        Returns the list of written files.
+        """
+        file_paths = []
+        if df.shape[0] == 0:
+            return file_paths
+        part_name = f"part-{time.time_ns()}.parquet"
+        months = df[self.partition_date_column].astype(str).str.slice(0, 7)
+        for (username, month), partition in df.groupby([df["username"].str.lower(), months], sort=True):
+            partition_path = self.base_path / f"username={username}" / f"month={month}"
+            partition_path.mkdir(parents=True, exist_ok=True)
+            file_path = partition_path / part_name
+            tmp_path = file_path.with_suffix(".tmp")
+            pq.write_table(pa.Table.from_pandas(partition, preserve_index=False), tmp_path)
+            tmp_path.replace(file_path)
+            file_paths.append(file_path)
+        return file_paths
+
+    def pending_files(self, username: str = None) -> list[Path]:
+        """
+        Returns checkpoint files that were not loaded yet, optionally only for a single user
+        """
+        if username is None:
+            pattern = "username=*/month=*/*.parquet"
+        else:
+            pattern = f"username={username.lower()}/month=*/*.parquet"
+        return sorted(
+            file_path
+            for file_path in self.base_path.glob(pattern)
+            if not self._get_marker_path(file_path).exists()
+        )
+
+    def iter_batches(self, file_path: Path, batch_size: int = 10000) -> Iterator[pd.DataFrame]:
+        """
+        Streams a checkpoint file as dataframes of at most batch_size rows
+        """
+        parquet_file = pq.ParquetFile(file_path)
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+            yield record_batch.to_pandas()
+
+    def mark_loaded(self, file_path: Path) -> None:
+        """
+        Marks a checkpoint file as loaded to the database
+        """
+        self._get_marker_path(file_path).touch()
+
+    def _get_marker_path(self, file_path: Path) -> Path:
+        return file_path.with_name(f"{file_path.name}.loaded")
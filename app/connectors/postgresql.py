@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine, Table, MetaData, inspect, Column
+from datetime import date
+from sqlalchemy import create_engine, Table, MetaData, inspect, Column, Index
 from sqlalchemy.engine import URL, CursorResult
 from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
 
 
 class PostgreSqlClient:
@@ -32,9 +34,22 @@ class PostgreSqlClient:
         )
 
         self.engine = create_engine(connection_url)
+        # tables (and their monthly partitions) already created by this client, to skip repeated DDL on every load
+        self.created_tables: set[str] = set()
+        self.created_partitions: set[str] = set()
 
-    def execute_sql(self, sql: str) -> None:
-        self.engine.execute(sql)
+    def execute_sql(self, sql: str, autocommit: bool = False) -> None:
+        """
+        Executes SQL code in a transaction which is committed at the end (whatever statement it starts with).
+        With autocommit the statements run outside of a transaction block, as needed by e.g.
+        `refresh materialized view concurrently`.
+        """
+        if autocommit:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(sql)
+        else:
+            with self.engine.begin() as connection:
+                connection.execute(sql)
 
     def select_all(self, table: Table) -> list[dict]:
         """
@@ -73,16 +88,53 @@ class PostgreSqlClient:
 
     def create_table(self, table_name: str, metadata: MetaData) -> None:
         """
-        Creates a single table provided in the metadata object
+        Creates a single table provided in the metadata object, together with its indexes.
+        Table options like `postgresql_partition_by` are kept. Indexes declared on a table which already exists
+        are created if they are missing.
         """
+        if table_name in self.created_tables:
+            return
         existing_table = metadata.tables[table_name]
         new_metadata = MetaData()
         columns = [
             Column(column.name, column.type, primary_key=column.primary_key)
             for column in existing_table.columns
         ]
-        new_table = Table(table_name, new_metadata, *columns)
+        new_table = Table(table_name, new_metadata, *columns, info=existing_table.info, **existing_table.kwargs)
+        for index in existing_table.indexes:
+            Index(index.name, *[new_table.columns[column.name] for column in index.columns], unique=index.unique)
         new_metadata.create_all(bind=self.engine)
+        for index in new_table.indexes:
+            self.engine.execute(CreateIndex(index, if_not_exists=True))
+        self.created_tables.add(table_name)
+
+    def get_monthly_partition_sql(self, table_name: str, month: str) -> str:
+        """
+        Returns the statement creating the partition of a range partitioned table for a month ('YYYY-MM')
+        """
+        year, month_number = [int(part) for part in month.split("-")]
+        start = date(year, month_number, 1)
+        end = date(year + month_number // 12, month_number % 12 + 1, 1)
+        return (
+            f"create table if not exists {table_name}_p{start:%Y_%m} partition of {table_name} "
+            f"for values from ('{start:%Y-%m-%d}') to ('{end:%Y-%m-%d}')"
+        )
+
+    def create_partitions(self, data: list[dict], table: Table) -> None:
+        """
+        Creates the monthly partitions needed by the data, for tables declared with a
+        `monthly_partition_column` in their info (and `postgresql_partition_by="RANGE (<column>)"`).
+        """
+        partition_column = table.info.get("monthly_partition_column")
+        if partition_column is None:
+            return
+        months = sorted({str(row[partition_column])[:7] for row in data})
+        for month in months:
+            partition_key = f"{table.name}:{month}"
+            if partition_key in self.created_partitions:
+                continue
+            self.engine.execute(self.get_monthly_partition_sql(table.name, month))
+            self.created_partitions.add(partition_key)
 
     def create_all_tables(self, metadata: MetaData) -> None:
         """
@@ -95,12 +147,17 @@ class PostgreSqlClient:
         Drops a specified table if it exists
         """
         self.engine.execute(f"drop table if exists {table_name};")
+        self.created_tables.discard(table_name)
+        self.created_partitions = {
+            partition for partition in self.created_partitions if not partition.startswith(f"{table_name}:")
+        }
 
     def insert(self, data: list[dict], table: Table, metadata: MetaData) -> None:
         """
         Insert data into a database table. This method creates the table also if it doesn't exist.
         """
         self.create_table(table_name=table.name, metadata=metadata)
+        self.create_partitions(data=data, table=table)
         insert_statement = postgresql.insert(table).values(data)
         self.engine.execute(insert_statement)
 
@@ -116,6 +173,7 @@ class PostgreSqlClient:
         Upserts data into a database table. This method creates the table also if it doesn't exist.
         """
         self.create_table(table_name=table.name, metadata=metadata)
+        self.create_partitions(data=data, table=table)
         key_columns = [
             pk_column.name for pk_column in table.primary_key.columns.values()
         ]
@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+from pathlib import Path
+
+
+class RawArchiveLake:
+    def __init__(self, base_path: str):
+        """
+        Class to persist raw chess.com monthly archives on local disk (or a mounted volume)
+
+        Files are gzip compressed json and partitioned by user and month:
+        `{base_path}/username={username}/month={YYYY-MM}/games.json.gz`
+
+        Parameters:
+        - base_path (str): root folder of the lake
+        """
+        self.base_path = Path(base_path)
+
+    def get_partition_path(self, username: str, year: int, month: int) -> Path:
+        """
+        Returns the path of the file holding a user's games for a month
+        """
+        return (
+            self.base_path
+            / f"username={username.lower()}"
+            / f"month={year}-{str(month).zfill(2)}"
+            / "games.json.gz"
+        )
+
+    def write_monthly_games(self, username: str, year: int, month: int, games: list) -> Path:
+        """
+        Writes the raw games of a month to the lake, replacing the previous copy of the partition.
+        The file is written to a temporary path first so readers never see a half written partition.
+        """
+        file_path = self.get_partition_path(username=username, year=year, month=month)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            json.dump({"games": games}, file)
+        os.replace(tmp_path, file_path)
+        return file_path
+
+    def read_monthly_games(self, username: str, year: int, month: int) -> list:
+        """
+        Returns the raw games of a month from the lake or None if the partition does not exist
+        """
+        file_path = self.get_partition_path(username=username, year=year, month=month)
+        if not file_path.exists():
+            return None
+        with gzip.open(file_path, "rt", encoding="utf-8") as file:
+            return json.load(file).get("games")
+
+    def list_months(self, username: str) -> list[str]:
+        """
+        Returns a sorted list of months (YYYY-MM) stored in the lake for a user
+        """
+        user_path = self.base_path / f"username={username.lower()}"
+        if not user_path.exists():
+            return []
+        return sorted(
+            partition.name.split("=", maxsplit=1)[1]
+            for partition in user_path.iterdir()
+            if partition.is_dir() and (partition / "games.json.gz").exists()
+        )
+
+    def list_usernames(self) -> list[str]:
+        """
+        Returns a sorted list of usernames stored in the lake
+        """
+        if not self.base_path.exists():
+            return []
+        return sorted(
+            partition.name.split("=", maxsplit=1)[1]
+            for partition in self.base_path.iterdir()
+            if partition.is_dir() and partition.name.startswith("username=")
+        )
+
+
+class RawArchiveChessClient:
+    def __init__(self, username: str, raw_archive: RawArchiveLake):
+        """
+        Drop-in replacement for ChessApiClient that replays monthly games from a RawArchiveLake
+        instead of calling chess.com API. Used for reprocessing without the API (replay mode).
+
+        Parameters:
+        - username (str): a chess.com user's username
+        - raw_archive (RawArchiveLake): the lake to read the games from
+        """
+        self.username = username
+        self.raw_archive = raw_archive
+
+    def get_monthly_games(self, year: int, month: int) -> list:
+        """
+        Returns a list of games stored in the lake for a user in a month.
+        Missing months are returned as an empty list.
+        """
+        games = self.raw_archive.read_monthly_games(username=self.username, year=year, month=month)
+        if games is None:
+            return []
+        return games
@@ -1,26 +1,46 @@
 import sys
 import os
+import socket
+import time
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime
 import logging
 import yaml
-from sqlalchemy import Table, MetaData, Column, Integer, String, Float, BigInteger, DATE, TIMESTAMP, Boolean
+from sqlalchemy import Table, MetaData, Column, String, BigInteger, TIMESTAMP, Boolean
 from jinja2 import Environment, FileSystemLoader
 
 from assets.Chess import (
-    extract_eco_codes, 
-    extract_games, 
-    extract_user_info, 
-    load, 
-    incremental_modify_dates, 
-    transform as transform_etl, 
+    extract_eco_codes,
+    extract_games,
+    extract_user_info,
+    load,
+    load_from_checkpoint,
+    incremental_modify_dates,
+    generate_months,
+    get_month_window,
+    transform as transform_etl,
+    transform_moves,
+    transform_columnar,
+    transform_game_facts,
+    update_daily_ratings,
+    backfill_daily_ratings,
     transform_players,
 )
 from connectors.Chess import ChessApiClient
+from connectors.raw_archive import RawArchiveLake, RawArchiveChessClient
+from connectors.parquet_checkpoint import ParquetCheckpoint
 from connectors.postgresql import PostgreSqlClient
 from assets.pipeline_logging import PipelineLogging
 from assets.metadata_logging import MetaDataLoggingStatus, MetaDataLogging
+from assets.profiling import StageProfiler
+from assets.work_queue import WorkQueue
+from assets.extract_progress import ExtractProgress
+from assets.game_store import GameStore
+from assets.scheduler import UserScheduler
+from assets.query_plans import QueryPlanRecorder
+from assets.opening_classifier import OpeningTrie
+from assets.games_schema import GamesSchemaMode, get_games_table, get_game_moves_table, get_game_facts_table, get_daily_ratings_table, to_typed_games, migrate_games_to_typed, migrate_games_primary_key, is_partitioned_table
 from assets.extract_load_transform import (
     extract_load,
     transform,
@@ -28,207 +48,532 @@ from assets.extract_load_transform import (
 )
 from graphlib import TopologicalSorter
 
+# stages of a full pipeline run, in order
+PIPELINE_STAGES = ["games", "players", "elt"]
+# all stages which could be run separately, "transform" is the sql transform part of "elt" only,
+# "enqueue" adds user-month tasks to the work queue and "worker" processes them (instead of "games")
+STAGES = PIPELINE_STAGES + ["transform", "enqueue", "worker"]
 
-if __name__ == "__main__":
-    # setting up environment variables
-    load_dotenv()
-    LOGGING_SERVER_NAME = os.environ.get("LOGGING_SERVER_NAME")
-    LOGGING_DATABASE_NAME = os.environ.get("LOGGING_DATABASE_NAME")
-    LOGGING_USERNAME = os.environ.get("LOGGING_USERNAME")
-    LOGGING_PASSWORD = os.environ.get("LOGGING_PASSWORD")
-    LOGGING_PORT = os.environ.get("LOGGING_PORT")
 
-    # get config file
-    yaml_file_path = __file__.replace(".py", ".yaml")
+def get_pipeline_config(yaml_file_path: str = None) -> dict:
+    """
+    Reads the pipeline config file (Chess.yaml next to this module by default)
+    """
+    if yaml_file_path is None:
+        yaml_file_path = __file__.replace(".py", ".yaml")
     if Path(yaml_file_path).exists():
         with open(yaml_file_path) as yaml_file:
-            pipeline_config = yaml.safe_load(yaml_file)
-            PIPLINE_NAME = pipeline_config.get("name")
+            return yaml.safe_load(yaml_file)
     else:
         raise Exception(
             f"Missing {yaml_file_path} file! Please create the yaml file with at least a `name` key for the pipeline name."
         )
 
-    # defining logger
-    pipeline_logging = PipelineLogging(
-        pipeline_name=pipeline_config.get("name"),
-        log_folder_path=pipeline_config.get('config').get("log_folder_path"),
-    )
 
-    #defining postgres sql for logging storage
-    postgresql_logging_client = PostgreSqlClient(
-        server_name=LOGGING_SERVER_NAME,
-        database_name=LOGGING_DATABASE_NAME,
-        username=LOGGING_USERNAME,
-        password=LOGGING_PASSWORD,
-        port=LOGGING_PORT,
+def get_players_table(metadata: MetaData) -> Table:
+    return Table("players",
+        metadata,
+        Column('player_id', BigInteger, primary_key=True),
+        Column('snaphot_date', TIMESTAMP, default=datetime.now(), primary_key=True),
+        Column('name',String),
+        Column('username', String),
+        Column('title', String),
+        Column('followers', BigInteger),
+        Column('country', String),
+        Column('location', String),
+        Column('last_online', TIMESTAMP),
+        Column('joined', TIMESTAMP),
+        Column('is_streamer', Boolean)
     )
 
-    metadata_logger = MetaDataLogging(
-        pipeline_name=PIPLINE_NAME,
-        postgresql_client=postgresql_logging_client,
-        config=pipeline_config.get('config'),
-    )
-    try:
-        metadata_logger.log()
-        # extracting variables from config file
-        pipeline_logging.logger.info("Starting pipeline run")
-        pipeline_logging.logger.info("Getting pipeline environment variables")
-        USER_AGENT = os.environ.get("USER_AGENT")
-        SERVER_NAME = os.environ.get("SERVER_NAME")
-        DATABASE_NAME = os.environ.get("DATABASE_NAME")
-        DB_USERNAME = os.environ.get("DB_USERNAME")
-        DB_PASSWORD = os.environ.get("DB_PASSWORD")
-        PORT = os.environ.get("PORT")
-        start_date = pipeline_config.get("config").get("games").get("start_date")
-        end_date = pipeline_config.get("config").get("games").get("end_date")
-        target_table_games = pipeline_config.get("config").get("games").get("target_table")
-        target_column = pipeline_config.get("config").get("games").get("target_column")
-        usernames = pipeline_config.get("config").get("games").get("usernames")
-
-        # extracting players from config, either from players section or from games section (if players section is missing/empty)
-        players = pipeline_config.get("config").get("players").get("usernames")
-        if players is None:
-            players = pipeline_config.get("config").get("games").get("username")
-
-        target_table_players = pipeline_config.get("config").get("players").get("target_table")
 
+def get_postgresql_client() -> PostgreSqlClient:
+    """
+    Client of the database the ETL loads games and players to
+    """
+    return PostgreSqlClient(server_name=os.environ.get("SERVER_NAME"),
+                    database_name=os.environ.get("DATABASE_NAME"),
+                    username=os.environ.get("DB_USERNAME"),
+                    password=os.environ.get("DB_PASSWORD"),
+                    port=os.environ.get("PORT"))
+
+
+class GamesEtl:
+    def __init__(
+        self,
+        pipeline_config: dict,
+        pipeline_logging: PipelineLogging,
+        metadata_logger: MetaDataLogging,
+        profiler: StageProfiler,
+    ):
+        """
+        Extracts games from chess.com API (or the raw archive lake in replay mode), transforms and loads them to postgres.
+        Sets up the target tables, eco codes and opening classifier once, so games of any user and date window
+        can then be processed with `run_user`, either for the configured users or for tasks of the work queue.
+        """
+        self.pipeline_logging = pipeline_logging
+        self.metadata_logger = metadata_logger
+        self.profiler = profiler
+        games_config = pipeline_config.get("config").get("games")
+        self.user_agent = os.environ.get("USER_AGENT")
+        self.start_date = games_config.get("start_date")
+        self.end_date = games_config.get("end_date")
+        self.target_table_games = games_config.get("target_table")
+        self.target_column = games_config.get("target_column")
+        self.usernames = games_config.get("usernames")
+        # "api" extracts games from chess.com, "replay" re-runs parse/transform/load from the raw archive lake
+        self.games_mode = games_config.get("mode", "api")
+        raw_archive_path = games_config.get("raw_archive_path")
+        if self.games_mode not in ["api", "replay"]:
+            raise Exception(f"Games mode '{self.games_mode}' is not supported. Please choose from ['api', 'replay'].")
+        if self.games_mode == "replay" and raw_archive_path is None:
+            raise Exception("Please specify a raw_archive_path in the games config block to run in replay mode.")
+        self.raw_archive = RawArchiveLake(raw_archive_path) if raw_archive_path is not None else None
+        # "legacy" stores dates, times and durations as strings, "typed" uses native types and enums
+        self.schema_mode = games_config.get("schema_mode", GamesSchemaMode.LEGACY)
+        # "columnar" transforms games column by column with categorical text columns, "rows" is the original transform
+        self.transform_mode = games_config.get("transform_mode", "rows")
+        if self.transform_mode not in ["rows", "columnar"]:
+            raise Exception(f"Transform mode '{self.transform_mode}' is not supported. Please choose from ['rows', 'columnar'].")
+        # if set - per ply clocks and think times of every game are stored in this table
+        target_table_moves = games_config.get("moves_target_table")
+        # if set - the perspective-neutral facts of every game are stored once in this table
+        target_table_facts = games_config.get("facts_target_table")
+        # if set - last rating and rating change per user, game mode and day are maintained in this table after each load
+        daily_ratings_table = games_config.get("daily_ratings_table")
+        # monthly range partitions of the games table, only applies when the table is created
+        partitioned = games_config.get("partitioned", False)
+        # if set - loaded user-months are recorded in this table and skipped by reruns (see ExtractProgress)
+        progress_table = games_config.get("progress_table")
+        checkpoint_path = games_config.get("checkpoint_path")
+        self.checkpoint = ParquetCheckpoint(checkpoint_path) if checkpoint_path is not None else None
 
         # defining postrgesql client
-        postgres_sql_client = PostgreSqlClient(server_name=SERVER_NAME,
-                        database_name=DATABASE_NAME,
-                        username=DB_USERNAME,
-                        password=DB_PASSWORD,
-                        port=PORT)
-        metadata = MetaData()
+        self.postgres_sql_client = get_postgresql_client()
+        self.metadata = MetaData()
 
         # TODO - add check for the availability of the postgres instance
 
-        games_tbl = Table("games",
-                metadata,
-                Column('game_id',BigInteger, primary_key=True),
-                Column('game_url', String),
-                Column('game_mode', String),
-                Column('start_date', String),
-                Column('username', String),
-                Column('user_color', String),
-                Column('user_rating', Integer),
-                Column('user_accuracy', Float),
-                Column('opponent', String),
-                Column('opponent_rating', Integer),
-                Column('opponent_accuracy', Float),
-                Column('rating_diff', Integer),
-                Column('match_result', String),
-                Column('result_subcategory', String),
-                Column('start_date_time', String),
-                Column('end_date_time', String),
-                Column('game_duration', String),
-                Column('game_duration_sec', Integer),
-                Column('rounds', Integer),
-                Column('user_avg_move_time_sec', Float),
-                Column('opening', String)
-                )
-        eco_codes = extract_eco_codes(pipeline_config.get("config").get("eco_codes_path"))
-        pipeline_logging.logger.info('Begining Games ETL')
-        for username in usernames:
-            chess_api_client = ChessApiClient(username, USER_AGENT)
-            # run this "incremental_modify_dates" function to check if the username exists, if so the start date will update to one day ahead of max date
-            # end date will evaluate to current date
-            start_date, end_date = incremental_modify_dates(ChessApiClient=chess_api_client,
-                                                            PostgreSqlClient=postgres_sql_client,
-                                                            target_table=target_table_games,
-                                                            target_column=target_column,
-                                                            start_date=start_date,
-                                                            end_date=end_date)
+        self.games_tbl = get_games_table(self.metadata, schema_mode=self.schema_mode, table_name=self.target_table_games, partitioned=partitioned)
+        if partitioned and self.postgres_sql_client.table_exists(self.target_table_games) and not is_partitioned_table(self.postgres_sql_client, self.target_table_games):
+            raise Exception(
+                f"Table {self.target_table_games} already exists without partitions. Please rename or drop it to create the partitioned table."
+            )
+        if migrate_games_primary_key(self.postgres_sql_client, table_name=self.target_table_games, partitioned=partitioned):
+            pipeline_logging.logger.info(f'Migrated the primary key of {self.target_table_games} to (game_id, username)')
+        if self.schema_mode == GamesSchemaMode.TYPED:
+            migrated_columns = migrate_games_to_typed(self.postgres_sql_client, table_name=self.target_table_games)
+            if migrated_columns > 0:
+                pipeline_logging.logger.info(f'Migrated {migrated_columns} columns of {self.target_table_games} to the typed schema')
+        self.progress = ExtractProgress(self.postgres_sql_client, table_name=progress_table) if progress_table is not None else None
+        self.game_moves_tbl = get_game_moves_table(self.metadata, table_name=target_table_moves) if target_table_moves is not None else None
+        self.game_facts_tbl = get_game_facts_table(self.metadata, table_name=target_table_facts) if target_table_facts is not None else None
+        # games shared by tracked users are parsed once per run and loaded once to the game centric tables
+        self.game_store = GameStore(tracked_usernames=self.usernames)
+        self.daily_ratings_tbl = get_daily_ratings_table(self.metadata, table_name=daily_ratings_table) if daily_ratings_table is not None else None
+        if self.daily_ratings_tbl is not None:
+            # history of users without daily ratings (all users when the table is new), whether or not they have new games
+            backfilled_usernames = backfill_daily_ratings(postgresql_client=self.postgres_sql_client,
+                                                          games_table=self.target_table_games,
+                                                          daily_ratings_table=self.daily_ratings_tbl,
+                                                          metadata=self.metadata,
+                                                          usernames=self.usernames)
+            if len(backfilled_usernames) > 0:
+                pipeline_logging.logger.info(f'Backfilled daily ratings of {backfilled_usernames}')
+        self.eco_codes = extract_eco_codes(pipeline_config.get("config").get("eco_codes_path"))
+        # "eco_csv" names openings by the ECO code of the game, "trie" by the deepest known line its moves follow
+        opening_classifier_mode = pipeline_config.get("config").get("opening_classifier", "eco_csv")
+        if opening_classifier_mode not in ["eco_csv", "trie"]:
+            raise Exception(f"Opening classifier '{opening_classifier_mode}' is not supported. Please choose from ['eco_csv', 'trie'].")
+        self.opening_classifier = None
+        if opening_classifier_mode == "trie":
+            self.opening_classifier = OpeningTrie.load(pipeline_config.get("config").get("opening_lines_path"),
+                                                       cache_path=pipeline_config.get("config").get("opening_trie_cache_path"))
+
+    def get_chess_api_client(self, username: str):
+        if self.games_mode == "replay":
+            return RawArchiveChessClient(username, self.raw_archive)
+        return ChessApiClient(username, self.user_agent)
+
+    def get_archive_months(self, username: str) -> list[str]:
+        """Returns the months ('YYYY-MM') with games of a user, from the archive index"""
+        # archive urls end with /{YYYY}/{MM}
+        return [archive_url[-7:].replace("/", "-") for archive_url in self.get_chess_api_client(username).get_archive_urls()]
+
+    def get_date_window(self, username: str) -> tuple[str, str]:
+        """
+        Returns the dates to extract for a user: the configured window in replay mode, otherwise the window
+        starting from the latest loaded game of the user (see incremental_modify_dates)
+        """
+        if self.games_mode == "replay":
+            # replaying the whole configured window from the lake, no API calls and no incremental dates
+            return self.start_date, self.end_date
+        # run this "incremental_modify_dates" function to check if the username exists, if so the start date will update to one day ahead of max date
+        # end date will evaluate to current date
+        return incremental_modify_dates(ChessApiClient=self.get_chess_api_client(username),
+                                        PostgreSqlClient=self.postgres_sql_client,
+                                        target_table=self.target_table_games,
+                                        target_column=self.target_column,
+                                        start_date=self.start_date,
+                                        end_date=self.end_date)
+
+    def load_pending_checkpoint_files(self) -> None:
+        if self.checkpoint is None:
+            return
+        # resuming loads of transformed games left over by a failed run
+        self.pipeline_logging.logger.info('Loading pending checkpoint files to postgres')
+        loaded_rows = load_from_checkpoint(checkpoint=self.checkpoint,
+                                           postgresql_client=self.postgres_sql_client,
+                                           table=self.games_tbl,
+                                           metadata=self.metadata,
+                                           load_method="upsert")
+        self.pipeline_logging.logger.info(f'Loaded {loaded_rows} rows from pending checkpoint files')
+
+    def run_user(self, username: str, start_date: str, end_date: str, month: str = None) -> int:
+        """
+        Extracts, transforms and loads the games of a user between start_date and end_date.
+        The month labels the logged metrics of single month runs, and with progress tracking the window is
+        skipped if the month was already loaded (see ExtractProgress).
+        Returns the number of loaded games.
+        """
+        pipeline_logging, metadata_logger, profiler = self.pipeline_logging, self.metadata_logger, self.profiler
+        postgres_sql_client, metadata = self.postgres_sql_client, self.metadata
+        track_progress = self.progress is not None and month is not None
+        # facts of the previous user-month's games are only kept if another tracked user played them
+        self.game_store.evict_unshared()
+        if track_progress and self.progress.is_complete(username, month, start_date, end_date):
+            pipeline_logging.logger.info(f'Skipping completed month: username: {username}, month: {month}')
+            return 0
+        extract_stats = {}
+        loaded_rows = 0
+        chess_api_client = self.get_chess_api_client(username)
+        if self.games_mode == "replay":
+            pipeline_logging.logger.info(f'Replaying games from raw archive: username: {chess_api_client.username}, start_date: {start_date}, end_date: {end_date}')
+            with metadata_logger.timer(stage="extract", username=username, month=month) as stage_metrics, profiler.profile(f"extract:{username}"):
+                valid_games = extract_games(start_date=start_date,
+                            end_date=end_date,
+                            chess_api_client=chess_api_client,
+                            stats=extract_stats,
+                            game_store=self.game_store)
+                stage_metrics["rows"] = valid_games.shape[0]
+        else:
             # extract
             pipeline_logging.logger.info(f'Extracting data from Chess API games: username: {chess_api_client.username}, start_date: {start_date}, end_date: {end_date}')
-            valid_games = extract_games(start_date=start_date,
-                        end_date=end_date,
-                        chess_api_client=chess_api_client)
-            if valid_games.shape[0] > 0:
-                #transform
-                pipeline_logging.logger.info('Trasforming dataframes')
-                trasformed_games = transform_etl(valid_games, eco_codes)
-                #load
-                pipeline_logging.logger.info('Loading data to postgres')
-                load(df=trasformed_games,
-                    postgresql_client=postgres_sql_client,
-                    table=games_tbl,
-                    metadata=metadata,
-                    load_method="upsert")
-        pipeline_logging.logger.info('Games ETL run successful')
-        # players
-
-        # defining target table
-        players_tbl = Table("players",
-            metadata,
-            Column('player_id', BigInteger, primary_key=True),
-            Column('snaphot_date', TIMESTAMP, default=datetime.now(), primary_key=True),
-            Column('name',String),
-            Column('username', String),
-            Column('title', String),
-            Column('followers', BigInteger),
-            Column('country', String),
-            Column('location', String),
-            Column('last_online', TIMESTAMP),
-            Column('joined', TIMESTAMP),
-            Column('is_streamer', Boolean)
-        )
-
-        # looping through players in config file
-        # making sure players is a list to iretare through
-        if not isinstance(players, list):
-            players = [players]
-        pipeline_logging.logger.info('Begining players ETL')
-        for username in players:
-
-            chess_api_client = ChessApiClient(username, user_agent=USER_AGENT)
-
-            # extract player info
-            pipeline_logging.logger.info(f'Extracting data from Chess API users: username: {chess_api_client.username}')
-            player_df = extract_user_info(chess_api_client=chess_api_client)
-
-            # transform player (adding missing columns if needed)
+            with metadata_logger.timer(stage="extract", username=username, month=month) as stage_metrics, profiler.profile(f"extract:{username}"):
+                valid_games = extract_games(start_date=start_date,
+                            end_date=end_date,
+                            chess_api_client=chess_api_client,
+                            raw_archive=self.raw_archive,
+                            stats=extract_stats,
+                            game_store=self.game_store)
+                stage_metrics["rows"] = valid_games.shape[0]
+            for request_stats in chess_api_client.get_request_stats():
+                for metric in ["requests", "failed_requests", "bytes", "latency_sec"]:
+                    metadata_logger.log_metric(stage="http",
+                                               metric=metric,
+                                               value=request_stats[metric],
+                                               username=username,
+                                               month=request_stats["period"])
+        if track_progress:
+            archive_fingerprint = extract_stats["archive_fingerprints"].get(month)
+            if self.progress.is_unchanged(username, month, start_date, end_date, archive_fingerprint):
+                pipeline_logging.logger.info(f'Skipping unchanged month: username: {username}, month: {month}')
+                # recording the month again closes it once it is over, so later runs skip its fetch as well
+                self.progress.record(username,
+                                     month,
+                                     start_date,
+                                     end_date,
+                                     games_fetched=extract_stats["games_fetched"],
+                                     loaded_rows=self.progress.get(username, month)["loaded_rows"],
+                                     archive_fingerprint=archive_fingerprint)
+                return 0
+        metadata_logger.log_metric(stage="parse", metric="games_skipped", value=extract_stats["games_skipped"], username=username, month=month)
+        metadata_logger.log_metric(stage="parse", metric="games_parsed", value=extract_stats["games_parsed"], username=username, month=month)
+        if extract_stats["parse_sec"] > 0:
+            metadata_logger.log_metric(stage="parse",
+                                       metric="games_per_sec",
+                                       value=extract_stats["games_parsed"] / extract_stats["parse_sec"],
+                                       username=username,
+                                       month=month)
+        if valid_games.shape[0] > 0:
+            #transform
             pipeline_logging.logger.info('Trasforming dataframes')
-            player_transformed = transform_players(player_df)
-
-            player_final = player_transformed.reindex(columns=['player_id',
-                                                            'name',
-                                                            'username',
-                                                            'title',
-                                                            'followers',
-                                                            'country',
-                                                            'location',
-                                                            'last_online',
-                                                            'joined',
-                                                            'is_streamer'])
-
-            #load player
+            with metadata_logger.timer(stage="transform", username=username, month=month) as stage_metrics, profiler.profile(f"transform:{username}"):
+                if self.transform_mode == "columnar":
+                    trasformed_games = transform_columnar(valid_games, self.eco_codes, opening_classifier=self.opening_classifier)
+                else:
+                    trasformed_games = transform_etl(valid_games, self.eco_codes, opening_classifier=self.opening_classifier)
+                if self.schema_mode == GamesSchemaMode.TYPED:
+                    trasformed_games = to_typed_games(trasformed_games)
+                stage_metrics["rows"] = trasformed_games.shape[0]
+            #load
             pipeline_logging.logger.info('Loading data to postgres')
-            load(df=player_final,
-                postgresql_client=postgres_sql_client,
-                table=players_tbl,
-                metadata=metadata,
-                load_method="insert"
-            )
-            pipeline_logging.logger.info("Loading data to postgres")
-        pipeline_logging.logger.info("Players ETL run successful")
-
-
-        # Adding ELT Pipeline
-
-        SOURCE_DATABASE_NAME = os.environ.get("SOURCE_DATABASE_NAME")
-        SOURCE_SERVER_NAME = os.environ.get("SOURCE_SERVER_NAME")
-        SOURCE_DB_USERNAME = os.environ.get("SOURCE_DB_USERNAME")
-        SOURCE_DB_PASSWORD = os.environ.get("SOURCE_DB_PASSWORD")
-        SOURCE_PORT = os.environ.get("SOURCE_PORT")
-        TARGET_DATABASE_NAME = os.environ.get("TARGET_DATABASE_NAME")
-        TARGET_SERVER_NAME = os.environ.get("TARGET_SERVER_NAME")
-        TARGET_DB_USERNAME = os.environ.get("TARGET_DB_USERNAME")
-        TARGET_DB_PASSWORD = os.environ.get("TARGET_DB_PASSWORD")
-        TARGET_PORT = os.environ.get("TARGET_PORT")
+            with metadata_logger.timer(stage="load", username=username, month=month) as stage_metrics, profiler.profile(f"load:{username}"):
+                if self.checkpoint is not None:
+                    self.checkpoint.write(trasformed_games)
+                    stage_metrics["rows"] = load_from_checkpoint(checkpoint=self.checkpoint,
+                                                                 postgresql_client=postgres_sql_client,
+                                                                 table=self.games_tbl,
+                                                                 metadata=metadata,
+                                                                 load_method="upsert",
+                                                                 username=chess_api_client.username)
+                else:
+                    load(df=trasformed_games,
+                        postgresql_client=postgres_sql_client,
+                        table=self.games_tbl,
+                        metadata=metadata,
+                        load_method="upsert")
+                    stage_metrics["rows"] = trasformed_games.shape[0]
+                loaded_rows = stage_metrics["rows"]
+            # games already loaded for another tracked user are not loaded to the game centric tables again
+            new_game_ids = self.game_store.get_unloaded(valid_games["game_id"])
+            if self.game_facts_tbl is not None and len(new_game_ids) > 0:
+                pipeline_logging.logger.info('Loading game facts to postgres')
+                with metadata_logger.timer(stage="load_facts", username=username, month=month) as stage_metrics, profiler.profile(f"load_facts:{username}"):
+                    game_facts = transform_game_facts([self.game_store.games[game_id] for game_id in new_game_ids])
+                    load(df=game_facts,
+                        postgresql_client=postgres_sql_client,
+                        table=self.game_facts_tbl,
+                        metadata=metadata,
+                        load_method="upsert")
+                    stage_metrics["rows"] = game_facts.shape[0]
+            if self.game_moves_tbl is not None and len(new_game_ids) > 0:
+                pipeline_logging.logger.info('Loading game moves to postgres')
+                with metadata_logger.timer(stage="load_moves", username=username, month=month) as stage_metrics, profiler.profile(f"load_moves:{username}"):
+                    game_moves = transform_moves(valid_games[valid_games["game_id"].isin(new_game_ids)])
+                    load(df=game_moves,
+                        postgresql_client=postgres_sql_client,
+                        table=self.game_moves_tbl,
+                        metadata=metadata,
+                        load_method="upsert")
+                    stage_metrics["rows"] = game_moves.shape[0]
+            self.game_store.mark_loaded(new_game_ids)
+            if self.daily_ratings_tbl is not None:
+                pipeline_logging.logger.info('Updating daily ratings')
+                with metadata_logger.timer(stage="daily_ratings", username=username, month=month), profiler.profile(f"daily_ratings:{username}"):
+                    update_daily_ratings(postgresql_client=postgres_sql_client,
+                                         games_table=self.target_table_games,
+                                         daily_ratings_table=self.daily_ratings_tbl,
+                                         metadata=metadata,
+                                         username=chess_api_client.username,
+                                         dates=valid_games["start_date"].astype(str).tolist())
+        if track_progress:
+            self.progress.record(username,
+                                 month,
+                                 start_date,
+                                 end_date,
+                                 games_fetched=extract_stats["games_fetched"],
+                                 loaded_rows=loaded_rows,
+                                 archive_fingerprint=archive_fingerprint)
+        return loaded_rows
+
+    def run_user_by_month(self, username: str, start_date: str, end_date: str) -> int:
+        """
+        Runs the window of a user one month at a time, so every month is loaded and recorded before the next
+        one is fetched and a rerun continues from the first unfinished month. Returns the number of loaded games.
+        """
+        loaded_rows = 0
+        for month in generate_months(start_date, end_date):
+            month_start, month_end = get_month_window(month)
+            loaded_rows += self.run_user(username, max(start_date, month_start), min(end_date, month_end), month=month)
+        return loaded_rows
+
+
+def run_games_etl(
+    pipeline_config: dict,
+    pipeline_logging: PipelineLogging,
+    metadata_logger: MetaDataLogging,
+    profiler: StageProfiler,
+) -> None:
+    """
+    Extracts games of the configured users from chess.com API (or the raw archive lake in replay mode),
+    transforms and loads them to postgres.
+    """
+    games_etl = GamesEtl(pipeline_config, pipeline_logging, metadata_logger, profiler)
+    pipeline_logging.logger.info('Begining Games ETL')
+    games_etl.load_pending_checkpoint_files()
+    scheduler_config = pipeline_config.get("config").get("games").get("scheduler") or {}
+    if scheduler_config.get("enabled", False) and games_etl.games_mode == "api":
+        scheduler = UserScheduler(postgresql_client=games_etl.postgres_sql_client,
+                                  games_table=games_etl.target_table_games,
+                                  max_snapshot_age_minutes=scheduler_config.get("max_snapshot_age_minutes", 60),
+                                  dormant_grace_minutes=scheduler_config.get("dormant_grace_minutes", 30),
+                                  recent_days=scheduler_config.get("recent_days", 30))
+        runs = scheduler.plan(games_etl.usernames,
+                              get_date_window=games_etl.get_date_window,
+                              get_archive_months=games_etl.get_archive_months)
+    else:
+        runs = [dict(username=username, start_date=None, end_date=None, skip_reason=None) for username in games_etl.usernames]
+    for run in runs:
+        username = run["username"]
+        if run["skip_reason"] is not None:
+            pipeline_logging.logger.info(f'Skipping games of {username}: {run["skip_reason"]}')
+            metadata_logger.log_metric(stage="schedule", metric="skipped", value=1, username=username)
+            continue
+        if run["start_date"] is not None:
+            start_date, end_date = run["start_date"], run["end_date"]
+            pipeline_logging.logger.info(f'Scheduled {username}: {run["expected_games"]:.0f} expected games')
+        else:
+            start_date, end_date = games_etl.get_date_window(username)
+        if games_etl.progress is not None:
+            games_etl.run_user_by_month(username, start_date, end_date)
+        else:
+            games_etl.run_user(username, start_date, end_date)
+    pipeline_logging.logger.info(f'Games shared by tracked users (parsed once): {games_etl.game_store.hits}')
+    pipeline_logging.logger.info('Games ETL run successful')
+
+
+def get_work_queue(pipeline_config: dict) -> WorkQueue:
+    work_queue_config = pipeline_config.get("config").get("work_queue") or {}
+    return WorkQueue(postgresql_client=get_postgresql_client(),
+                     table_name=work_queue_config.get("table_name", "extract_tasks"),
+                     lease_seconds=work_queue_config.get("lease_seconds", 900),
+                     max_attempts=work_queue_config.get("max_attempts", 3))
+
+
+def run_enqueue(pipeline_config: dict, pipeline_logging: PipelineLogging) -> None:
+    """
+    Adds a user-month task to the work queue for every configured user and month of the configured window
+    (up to the current month). The current month is requeued on every run, as it still gets new games.
+    """
+    games_config = pipeline_config.get("config").get("games")
+    current_month = datetime.now().strftime("%Y-%m")
+    end_date = min(games_config.get("end_date"), datetime.now().strftime("%Y-%m-%d"))
+    months = generate_months(games_config.get("start_date"), end_date)
+    work_queue = get_work_queue(pipeline_config)
+    tasks_count = work_queue.enqueue(usernames=games_config.get("usernames"), months=months, requeue_months=[current_month])
+    pipeline_logging.logger.info(f"Enqueued {tasks_count} tasks, tasks per status: {work_queue.get_status_counts()}")
+
+
+def run_worker(
+    pipeline_config: dict,
+    pipeline_logging: PipelineLogging,
+    metadata_logger: MetaDataLogging,
+    profiler: StageProfiler,
+) -> None:
+    """
+    Processes user-month tasks of the work queue until it is empty (or `work_queue.max_tasks` tasks were processed).
+    Any number of workers can run at the same time, each task is leased to a single worker.
+    With `work_queue.idle_sleep_seconds` the worker keeps polling an empty queue instead of exiting.
+    """
+    work_queue_config = pipeline_config.get("config").get("work_queue") or {}
+    max_tasks = work_queue_config.get("max_tasks")
+    idle_sleep_seconds = work_queue_config.get("idle_sleep_seconds")
+    work_queue = get_work_queue(pipeline_config)
+    games_etl = GamesEtl(pipeline_config, pipeline_logging, metadata_logger, profiler)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    pipeline_logging.logger.info(f'Begining worker {worker_id}')
+    games_etl.load_pending_checkpoint_files()
+    processed_tasks = 0
+    failed_tasks = 0
+    while max_tasks is None or processed_tasks < max_tasks:
+        task = work_queue.lease(worker_id)
+        if task is None:
+            if idle_sleep_seconds is None:
+                break
+            time.sleep(idle_sleep_seconds)
+            continue
+        start_date, end_date = get_month_window(task["month"])
+        pipeline_logging.logger.info(f"Processing task {task['task_id']}: username: {task['username']}, month: {task['month']}, attempt: {task['attempts']}")
+        try:
+            loaded_rows = games_etl.run_user(task["username"], start_date, end_date, month=task["month"])
+            work_queue.complete(task["task_id"], worker_id, loaded_rows=loaded_rows)
+        except Exception as e:
+            pipeline_logging.logger.error(f"Task {task['task_id']} failed: {e}")
+            work_queue.fail(task["task_id"], worker_id, error=str(e))
+            failed_tasks += 1
+        processed_tasks += 1
+    pipeline_logging.logger.info(f'Worker {worker_id} processed {processed_tasks} tasks ({failed_tasks} failed)')
+
+
+def run_players_etl(pipeline_config: dict, pipeline_logging: PipelineLogging) -> None:
+    """
+    Takes a snapshot of the configured players' profiles from chess.com API and loads it to postgres.
+    """
+    USER_AGENT = os.environ.get("USER_AGENT")
+    # extracting players from config, either from players section or from games section (if players section is missing/empty)
+    players = pipeline_config.get("config").get("players").get("usernames")
+    if players is None:
+        players = pipeline_config.get("config").get("games").get("username")
+
+    postgres_sql_client = get_postgresql_client()
+    metadata = MetaData()
+
+    # defining target table
+    players_tbl = get_players_table(metadata)
+
+    # looping through players in config file
+    # making sure players is a list to iretare through
+    if not isinstance(players, list):
+        players = [players]
+    pipeline_logging.logger.info('Begining players ETL')
+    for username in players:
+
+        chess_api_client = ChessApiClient(username, user_agent=USER_AGENT)
+
+        # extract player info
+        pipeline_logging.logger.info(f'Extracting data from Chess API users: username: {chess_api_client.username}')
+        player_df = extract_user_info(chess_api_client=chess_api_client)
+
+        # transform player (adding missing columns if needed)
+        pipeline_logging.logger.info('Trasforming dataframes')
+        player_transformed = transform_players(player_df)
+
+        player_final = player_transformed.reindex(columns=['player_id',
+                                                        'name',
+                                                        'username',
+                                                        'title',
+                                                        'followers',
+                                                        'country',
+                                                        'location',
+                                                        'last_online',
+                                                        'joined',
+                                                        'is_streamer'])
+
+        #load player
+        pipeline_logging.logger.info('Loading data to postgres')
+        load(df=player_final,
+            postgresql_client=postgres_sql_client,
+            table=players_tbl,
+            metadata=metadata,
+            load_method="insert"
+        )
+        pipeline_logging.logger.info("Loading data to postgres")
+    pipeline_logging.logger.info("Players ETL run successful")
+
+
+def run_elt(
+    pipeline_config: dict,
+    pipeline_logging: PipelineLogging,
+    metadata_logger: MetaDataLogging,
+    profiler: StageProfiler,
+    transform_only: bool = False,
+) -> None:
+    """
+    Copies source tables to the target database (if `elt_extract_load` is enabled in the config) and builds
+    the summary tables of the transform DAG. With transform_only, only the summary tables are built.
+    """
+    SOURCE_DATABASE_NAME = os.environ.get("SOURCE_DATABASE_NAME")
+    SOURCE_SERVER_NAME = os.environ.get("SOURCE_SERVER_NAME")
+    SOURCE_DB_USERNAME = os.environ.get("SOURCE_DB_USERNAME")
+    SOURCE_DB_PASSWORD = os.environ.get("SOURCE_DB_PASSWORD")
+    SOURCE_PORT = os.environ.get("SOURCE_PORT")
+    TARGET_DATABASE_NAME = os.environ.get("TARGET_DATABASE_NAME")
+    TARGET_SERVER_NAME = os.environ.get("TARGET_SERVER_NAME")
+    TARGET_DB_USERNAME = os.environ.get("TARGET_DB_USERNAME")
+    TARGET_DB_PASSWORD = os.environ.get("TARGET_DB_PASSWORD")
+    TARGET_PORT = os.environ.get("TARGET_PORT")
+
+    pipeline_logging.logger.info(f'Begining ELT')
+    target_postgresql_client = PostgreSqlClient(
+        server_name=TARGET_SERVER_NAME,
+        database_name=TARGET_DATABASE_NAME,
+        username=TARGET_DB_USERNAME,
+        password=TARGET_DB_PASSWORD,
+        port=TARGET_PORT,
+    )
 
-        pipeline_logging.logger.info(f'Begining ELT')
+    if not transform_only and pipeline_config.get("config").get("elt_extract_load", False):
         source_postgresql_client = PostgreSqlClient(
             server_name=SOURCE_SERVER_NAME,
             database_name=SOURCE_DATABASE_NAME,
@@ -237,76 +582,178 @@ if __name__ == "__main__":
             port=SOURCE_PORT,
         )
 
-        target_postgresql_client = PostgreSqlClient(
-            server_name=TARGET_SERVER_NAME,
-            database_name=TARGET_DATABASE_NAME,
-            username=TARGET_DB_USERNAME,
-            password=TARGET_DB_PASSWORD,
-            port=TARGET_PORT,
-        )
-
         extract_template_environment = Environment(
             loader=FileSystemLoader(pipeline_config.get("config").get("extract_template_path"))
         )
 
-        # extract_load(
-        #     template_environment=extract_template_environment,
-        #     source_postgresql_client=source_postgresql_client,
-        #     target_postgresql_client=target_postgresql_client,
-        # )
-
-        transform_template_environment = Environment(
-            loader=FileSystemLoader(pipeline_config.get("config").get("transform_template_path"))
+        pipeline_logging.logger.info("Perform extract load")
+        extract_load(
+            template_environment=extract_template_environment,
+            source_postgresql_client=source_postgresql_client,
+            target_postgresql_client=target_postgresql_client,
         )
 
-        # create nodes
-        performance = SqlTransform(
-            table_name="performance",
-            postgresql_client=target_postgresql_client,
-            environment=transform_template_environment,
-        )
-        overall_performance = SqlTransform(
-            table_name="overall_performance",
-            postgresql_client=target_postgresql_client,
-            environment=transform_template_environment,
-        )
-        top_openings = SqlTransform(
-            table_name="top_openings",
-            postgresql_client=target_postgresql_client,
-            environment=transform_template_environment,
-        )
-        play_rating_trend = SqlTransform(
-            table_name="play_rating_trend",
-            postgresql_client=target_postgresql_client,
-            environment=transform_template_environment,
-        )
-        # create DAG
-        dag = TopologicalSorter()
-        dag.add(performance)
-        dag.add(overall_performance)
-        dag.add(play_rating_trend)
-        pipeline_logging.logger.info("Perform transform")
-        transform(dag=dag)
+    # typed games columns need no casts in the transform templates
+    template_params = {
+        "typed_schema": pipeline_config.get("config").get("games").get("schema_mode", GamesSchemaMode.LEGACY) == GamesSchemaMode.TYPED,
+        # the rating trend reads the daily ratings maintained by the games ETL if enabled
+        "daily_ratings_table": pipeline_config.get("config").get("games").get("daily_ratings_table"),
+    }
+    transform_template_environment = Environment(
+        loader=FileSystemLoader(pipeline_config.get("config").get("transform_template_path"))
+    )
+
+    # create nodes
+    user_aggregates = SqlTransform(
+        table_name="user_aggregates",
+        postgresql_client=target_postgresql_client,
+        environment=transform_template_environment,
+        template_params=template_params,
+    )
+    performance = SqlTransform(
+        table_name="performance",
+        postgresql_client=target_postgresql_client,
+        environment=transform_template_environment,
+        template_params=template_params,
+    )
+    overall_performance = SqlTransform(
+        table_name="overall_performance",
+        postgresql_client=target_postgresql_client,
+        environment=transform_template_environment,
+        template_params=template_params,
+    )
+    top_openings = SqlTransform(
+        table_name="top_openings",
+        postgresql_client=target_postgresql_client,
+        environment=transform_template_environment,
+        template_params=template_params,
+    )
+    play_rating_trend = SqlTransform(
+        table_name="play_rating_trend",
+        postgresql_client=target_postgresql_client,
+        environment=transform_template_environment,
+        template_params=template_params,
+    )
+    # create DAG
+    dag = TopologicalSorter()
+    # the summary tables are derived from the counters of user_aggregates (a single scan of games)
+    dag.add(user_aggregates)
+    dag.add(performance, user_aggregates)
+    dag.add(overall_performance, user_aggregates)
+    dag.add(top_openings, user_aggregates)
+    dag.add(play_rating_trend)
+    # explain analyze of every node, compared with the plans of earlier runs
+    query_plans_config = pipeline_config.get("config").get("query_plans") or {}
+    plan_recorder = None
+    if query_plans_config.get("enabled", False):
+        plan_recorder = QueryPlanRecorder(postgresql_client=target_postgresql_client,
+                                          run_id=metadata_logger.run_id,
+                                          logger=pipeline_logging.logger,
+                                          table_name=query_plans_config.get("table_name", "transform_query_plans"),
+                                          history_runs=query_plans_config.get("history_runs", 10),
+                                          slowdown_threshold=query_plans_config.get("slowdown_threshold", 2.0),
+                                          min_execution_ms=query_plans_config.get("min_execution_ms", 100))
+    pipeline_logging.logger.info("Perform transform")
+    transform(dag=dag, metadata_logger=metadata_logger, profiler=profiler, plan_recorder=plan_recorder)
+
+
+def run_pipeline(stages: list[str] = PIPELINE_STAGES, profile: bool = None, yaml_file_path: str = None) -> bool:
+    """
+    Runs the given pipeline stages (see STAGES) in order and logs the run to the logging database.
+
+    Parameters:
+    - stages (list): stages to run, all stages of the pipeline by default
+    - profile (bool): turns profiling on or off, overriding `profiling.enabled` in the config
+    - yaml_file_path (str): path of the pipeline config file
+
+    Returns:
+    - bool: True if the run was successful
+    """
+    for stage in stages:
+        if stage not in STAGES:
+            raise Exception(f"Stage '{stage}' is not supported. Please choose from {STAGES}.")
+
+    # setting up environment variables
+    load_dotenv()
+    LOGGING_SERVER_NAME = os.environ.get("LOGGING_SERVER_NAME")
+    LOGGING_DATABASE_NAME = os.environ.get("LOGGING_DATABASE_NAME")
+    LOGGING_USERNAME = os.environ.get("LOGGING_USERNAME")
+    LOGGING_PASSWORD = os.environ.get("LOGGING_PASSWORD")
+    LOGGING_PORT = os.environ.get("LOGGING_PORT")
+
+    # get config file
+    pipeline_config = get_pipeline_config(yaml_file_path)
+    PIPLINE_NAME = pipeline_config.get("name")
+
+    # defining logger
+    pipeline_logging = PipelineLogging(
+        pipeline_name=pipeline_config.get("name"),
+        log_folder_path=pipeline_config.get('config').get("log_folder_path"),
+        log_buffer_capacity_bytes=pipeline_config.get('config').get("log_buffer_capacity_bytes", 5 * 1024 * 1024),
+    )
+
+    #defining postgres sql for logging storage
+    postgresql_logging_client = PostgreSqlClient(
+        server_name=LOGGING_SERVER_NAME,
+        database_name=LOGGING_DATABASE_NAME,
+        username=LOGGING_USERNAME,
+        password=LOGGING_PASSWORD,
+        port=LOGGING_PORT,
+    )
+
+    metadata_logger = MetaDataLogging(
+        pipeline_name=PIPLINE_NAME,
+        postgresql_client=postgresql_logging_client,
+        config=pipeline_config.get('config'),
+    )
+    # profiling mode writes cProfile/tracemalloc artifacts of every stage to the logs folder
+    profiling_config = pipeline_config.get('config').get("profiling") or {}
+    profiler = StageProfiler(
+        output_folder_path=pipeline_config.get('config').get("log_folder_path"),
+        run_name=f"{PIPLINE_NAME}_profile_run_{metadata_logger.run_id}",
+        enabled=profiling_config.get("enabled", False) if profile is None else profile,
+        top_functions=profiling_config.get("top_functions", 15),
+    )
+    try:
+        metadata_logger.log()
+        pipeline_logging.logger.info(f"Starting pipeline run, stages: {stages}")
+        if "enqueue" in stages:
+            run_enqueue(pipeline_config, pipeline_logging)
+        if "worker" in stages:
+            run_worker(pipeline_config, pipeline_logging, metadata_logger, profiler)
+        # the games scheduler skips users by their last_online, so their profiles are snapshotted before the games ETL
+        players_first = (pipeline_config.get("config").get("games").get("scheduler") or {}).get("enabled", False)
+        if "players" in stages and players_first:
+            run_players_etl(pipeline_config, pipeline_logging)
+        if "games" in stages:
+            run_games_etl(pipeline_config, pipeline_logging, metadata_logger, profiler)
+        if "players" in stages and not players_first:
+            run_players_etl(pipeline_config, pipeline_logging)
+        if "elt" in stages or "transform" in stages:
+            run_elt(pipeline_config, pipeline_logging, metadata_logger, profiler, transform_only="elt" not in stages)
         pipeline_logging.logger.info("Pipeline complete")
-        # performance.create_table_as()
-        # overall_performance.create_table_as()
-        # play_rating_trend.create_table_as()
 
          # log end
+        summary_path = profiler.write_summary()
+        if summary_path is not None:
+            pipeline_logging.logger.info(f"Profiling summary written to {summary_path}")
         metadata_logger.log(
             status=MetaDataLoggingStatus.RUN_SUCCESS, logs=pipeline_logging.get_logs()
         )
+        metadata_logger.close()
         pipeline_logging.logger.handlers.clear()
+        return True
     except Exception as e:
         pipeline_logging.logger.error(f"Pipeline run failed. See detailed logs: {e}")
+        profiler.write_summary()
         metadata_logger.log(
             status=MetaDataLoggingStatus.RUN_FAILURE, logs=pipeline_logging.get_logs()
     )
+        metadata_logger.close()
         pipeline_logging.logger.handlers.clear()
+        return False
 
 
-
-
-
-
-
+if __name__ == "__main__":
+    # stages can be given as arguments, e.g. `python -m pipelines.Chess worker`
+    run_pipeline(stages=sys.argv[1:] or PIPELINE_STAGES)
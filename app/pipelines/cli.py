@@ -0,0 +1,154 @@
+"""
+Command line entry point of the Chess pipeline, run from the `app` folder:
+
+    python -m pipelines.cli games            # games ETL
+    python -m pipelines.cli players          # players ETL
+    python -m pipelines.cli elt              # extract load (if enabled) and sql transforms
+    python -m pipelines.cli transform-only   # sql transforms only
+    python -m pipelines.cli enqueue          # adds user-month tasks of the games config to the work queue
+    python -m pipelines.cli worker           # games ETL of work queue tasks, any number of workers can run at once
+    python -m pipelines.cli all              # full pipeline run, same as `python -m pipelines.Chess`
+    python -m pipelines.cli dry-run          # validates the config and prints the run plan
+
+Heavy modules (pandas, SQLAlchemy, the pipeline itself) are only imported by the subcommands running a stage,
+so health checks and dry runs start fast. Every command reports its startup time.
+"""
+import time
+
+STARTED_AT = time.perf_counter()
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import yaml
+
+DEFAULT_CONFIG_PATH = Path(__file__).with_name("Chess.yaml")
+# subcommand -> pipeline stages it runs
+COMMAND_STAGES = {
+    "games": ["games"],
+    "players": ["players"],
+    "elt": ["elt"],
+    "transform-only": ["transform"],
+    "enqueue": ["enqueue"],
+    "worker": ["worker"],
+    "all": ["games", "players", "elt"],
+}
+REQUIRED_ENV_VARIABLES = {
+    "games": ["USER_AGENT", "SERVER_NAME", "DATABASE_NAME", "DB_USERNAME", "DB_PASSWORD", "PORT"],
+    "players": ["USER_AGENT", "SERVER_NAME", "DATABASE_NAME", "DB_USERNAME", "DB_PASSWORD", "PORT"],
+    "elt": ["TARGET_SERVER_NAME", "TARGET_DATABASE_NAME", "TARGET_DB_USERNAME", "TARGET_DB_PASSWORD", "TARGET_PORT"],
+    "transform": ["TARGET_SERVER_NAME", "TARGET_DATABASE_NAME", "TARGET_DB_USERNAME", "TARGET_DB_PASSWORD", "TARGET_PORT"],
+    "enqueue": ["SERVER_NAME", "DATABASE_NAME", "DB_USERNAME", "DB_PASSWORD", "PORT"],
+    "worker": ["USER_AGENT", "SERVER_NAME", "DATABASE_NAME", "DB_USERNAME", "DB_PASSWORD", "PORT"],
+}
+LOGGING_ENV_VARIABLES = ["LOGGING_SERVER_NAME", "LOGGING_DATABASE_NAME", "LOGGING_USERNAME", "LOGGING_PASSWORD", "LOGGING_PORT"]
+
+
+def get_startup_ms() -> float:
+    return (time.perf_counter() - STARTED_AT) * 1000
+
+
+def read_config(config_path: Path) -> dict:
+    if not config_path.exists():
+        raise Exception(
+            f"Missing {config_path} file! Please create the yaml file with at least a `name` key for the pipeline name."
+        )
+    with open(config_path) as yaml_file:
+        return yaml.safe_load(yaml_file)
+
+
+def get_config_errors(pipeline_config: dict, stages: list[str]) -> list[str]:
+    """Checks the config keys needed by the stages, without connecting to chess.com or databases"""
+    errors = []
+    if not pipeline_config.get("name"):
+        errors.append("`name` is missing")
+    config = pipeline_config.get("config") or {}
+    if not config.get("log_folder_path"):
+        errors.append("`config.log_folder_path` is missing")
+    if "games" in stages or "enqueue" in stages or "worker" in stages:
+        games_config = config.get("games") or {}
+        for key in ["start_date", "end_date", "usernames", "target_table", "target_column"]:
+            if not games_config.get(key):
+                errors.append(f"`config.games.{key}` is missing")
+        if games_config.get("mode", "api") not in ["api", "replay"]:
+            errors.append(f"`config.games.mode` '{games_config.get('mode')}' is not one of ['api', 'replay']")
+        if games_config.get("mode") == "replay" and not games_config.get("raw_archive_path"):
+            errors.append("`config.games.raw_archive_path` is needed in replay mode")
+        if config.get("eco_codes_path") and not Path(config.get("eco_codes_path")).exists():
+            errors.append(f"`config.eco_codes_path` {config.get('eco_codes_path')} does not exist")
+    if "elt" in stages or "transform" in stages:
+        transform_path = config.get("transform_template_path")
+        if not transform_path or not Path(transform_path).is_dir():
+            errors.append(f"`config.transform_template_path` {transform_path} is not a folder")
+    return errors
+
+
+def dry_run(config_path: Path, stages: list[str]) -> int:
+    """Prints what a run of the stages would do, only reading the config, the environment and the template folders"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    pipeline_config = read_config(config_path)
+    config = pipeline_config.get("config") or {}
+    print(f"pipeline: {pipeline_config.get('name')} ({config_path})")
+    print(f"stages: {stages}")
+    if "games" in stages:
+        games_config = config.get("games") or {}
+        print(
+            f"games: mode={games_config.get('mode', 'api')}, users={games_config.get('usernames')}, "
+            f"window={games_config.get('start_date')}..{games_config.get('end_date')} (api mode starts from the loaded max date), "
+            f"target={games_config.get('target_table')}"
+        )
+    if "players" in stages:
+        players_config = config.get("players") or {}
+        print(f"players: users={players_config.get('usernames')}, target={players_config.get('target_table')}")
+    if "elt" in stages or "transform" in stages:
+        transform_path = config.get("transform_template_path")
+        templates = sorted(path.name for path in Path(transform_path).glob("*.sql")) if transform_path else []
+        print(f"transform templates: {templates}")
+        if "elt" in stages:
+            print(f"extract load: {'enabled' if config.get('elt_extract_load', False) else 'disabled'}")
+
+    errors = get_config_errors(pipeline_config, stages)
+    required_env_variables = LOGGING_ENV_VARIABLES + [
+        variable for stage in stages for variable in REQUIRED_ENV_VARIABLES.get(stage, [])
+    ]
+    missing_env_variables = sorted({variable for variable in required_env_variables if not os.environ.get(variable)})
+    if missing_env_variables:
+        errors.append(f"missing environment variables: {missing_env_variables}")
+    for error in errors:
+        print(f"ERROR: {error}")
+    print(f"startup time: {get_startup_ms():.0f} ms")
+    return 1 if errors else 0
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="pipelines.cli", description="Chess.com EtLT pipeline")
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG_PATH, help="pipeline yaml config")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in COMMAND_STAGES:
+        command_parser = subparsers.add_parser(command, help=f"run the {', '.join(COMMAND_STAGES[command])} stage(s)")
+        command_parser.add_argument("--profile", action="store_true", default=None, help="profile every stage")
+    dry_run_parser = subparsers.add_parser("dry-run", help="validate the config and print the run plan")
+    dry_run_parser.add_argument(
+        "--stages", nargs="+", default=COMMAND_STAGES["all"], choices=["games", "players", "elt", "transform", "enqueue", "worker"]
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "dry-run":
+        return dry_run(args.config, args.stages)
+
+    import_started_at = time.perf_counter()
+    from pipelines.Chess import run_pipeline
+
+    print(
+        f"startup time: {get_startup_ms():.0f} ms (pipeline imports: {(time.perf_counter() - import_started_at) * 1000:.0f} ms)"
+    )
+    succeeded = run_pipeline(stages=COMMAND_STAGES[args.command], profile=args.profile, yaml_file_path=args.config)
+    return 0 if succeeded else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+from app.assets.database_extractor import SqlExtractParser, DatabaseTableExtractor, SqlExtractConfig
+from jinja2 import Environment, DictLoader
+from sqlalchemy import Table, Column, MetaData, BigInteger, String, DATE
+import pytest
+import re
+
+
+def get_extractor() -> DatabaseTableExtractor:
+    environment = Environment(loader=DictLoader({
+        "games.sql": '{% set config = {"extract_type": "cdc", "source_table_name": "games"} %}select * from games'
+    }))
+    sql_extract_parser = SqlExtractParser(file_path="games.sql", environment=environment)
+    return DatabaseTableExtractor(sql_extract_parser, source_postgresql_client=None, target_postgresql_client=None)
+
+
+def test_cdc_extract_config():
+    config = get_extractor().sql_extract_parser.get_config()
+    assert (config.extract_type, config.batch_size, config.prune_changelog) == (SqlExtractConfig.CDC_EXTRACT, 1000, True)
+
+
+def test_key_columns_of_cdc_tables():
+    database_table_extractor = get_extractor()
+    metadata = MetaData()
+    games = Table("games", metadata, Column("game_id", BigInteger, primary_key=True), Column("username", String))
+    daily_ratings = Table("daily_ratings", metadata, Column("username", String, primary_key=True), Column("start_date", DATE, primary_key=True))
+    assert database_table_extractor._get_key_columns(games) == ["game_id"]
+    assert database_table_extractor._get_key_columns(daily_ratings) == ["username", "start_date"]
+    with pytest.raises(Exception, match="Table 'players' has no primary key"):
+        database_table_extractor._get_key_columns(Table("players", metadata, Column("username", String)))
+
+
+def test_changes_filter_selects_transactions_committed_between_snapshots():
+    changes_filter = re.sub(r"\s+", " ", get_extractor()._get_changes_filter("100:104:102", "110:110:")).strip()
+    assert changes_filter == (
+        "changes.table_name = 'games' "
+        "and changes.txid >= txid_snapshot_xmin(cast('100:104:102' as txid_snapshot)) "
+        "and changes.txid < txid_snapshot_xmax(cast('110:110:' as txid_snapshot)) "
+        "and txid_visible_in_snapshot(changes.txid, cast('110:110:' as txid_snapshot)) "
+        "and not txid_visible_in_snapshot(changes.txid, cast('100:104:102' as txid_snapshot))"
+    )
+
+
+def test_trigger_logs_changes_of_partitions_under_the_source_table_name():
+    trigger_sql = re.sub(r"\s+", " ", get_extractor()._get_trigger_sql(["username", "start_date"])).strip()
+    assert trigger_sql == (
+        "drop trigger if exists games_cdc on games; "
+        "create trigger games_cdc after insert or update or delete on games "
+        "for each row execute procedure cdc_log_change('games', 'username', 'start_date');"
+    )
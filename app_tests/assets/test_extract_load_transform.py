@@ -0,0 +1,99 @@
+from app.assets.extract_load_transform import SqlTransform, SqlTransformConfig
+from app.assets.games_schema import MATCH_RESULTS
+from jinja2 import Environment, DictLoader, FileSystemLoader
+from types import SimpleNamespace
+import pytest
+import re
+
+
+class FakePostgreSqlClient:
+    def __init__(self, relation_kinds: dict = None, dependent_views: dict = None, view_comment: str = None):
+        self.relation_kinds = relation_kinds or {}
+        self.dependent_views = dependent_views or {}
+        self.view_comment = view_comment
+        self.executed_sql = []
+
+    def run_sql(self, sql: str) -> list[dict]:
+        if "select relkind" in sql:
+            return [dict(relkind=kind) for name, kind in self.relation_kinds.items() if f"relname = '{name}'" in sql]
+        if "from pg_depend" in sql:
+            return [dict(view_name=view_name) for name, view_names in self.dependent_views.items()
+                    if f"relation.relname = '{name}'" in sql for view_name in view_names]
+        if "obj_description" in sql:
+            return [dict(description=self.view_comment)] if self.view_comment is not None else []
+        return []
+
+    def execute_sql(self, sql: str, autocommit: bool = False) -> None:
+        self.executed_sql.append(sql)
+
+
+def get_transform(postgresql_client: FakePostgreSqlClient, template: str, table_name: str = "user_summary") -> SqlTransform:
+    environment = Environment(loader=DictLoader({f"{table_name}.sql": template}))
+    return SqlTransform(postgresql_client=postgresql_client, environment=environment, table_name=table_name)
+
+
+def test_sql_transform_config_validation():
+    assert SqlTransformConfig().materialization == SqlTransformConfig.TABLE
+    with pytest.raises(Exception, match="not supported"):
+        SqlTransformConfig(materialization="view")
+    with pytest.raises(Exception, match="unique_key"):
+        SqlTransformConfig(materialization="matview")
+    with pytest.raises(Exception, match="incremental_column"):
+        SqlTransformConfig(materialization="incremental", unique_key=["username"])
+
+
+def test_matview_is_refreshed_until_its_template_changes():
+    template = '{% set config = {"materialization": "matview", "unique_key": ["username"]} %}select username from games'
+    postgresql_client = FakePostgreSqlClient(relation_kinds={"user_summary": "m"})
+    sql_transform = get_transform(postgresql_client, template)
+    postgresql_client.view_comment = f"template_hash:{sql_transform.get_template_hash()}"
+    sql_transform.materialize()
+    assert postgresql_client.executed_sql == ["refresh materialized view concurrently user_summary"]
+
+    # refreshes are not explained, so recording plans doesn't run the view's query a second time
+    recorded_nodes = []
+    sql_transform.plan_recorder = SimpleNamespace(record=lambda node, template_hash, plan: recorded_nodes.append(node))
+    sql_transform.materialize()
+    assert postgresql_client.executed_sql[1:] == ["refresh materialized view concurrently user_summary"]
+    assert recorded_nodes == []
+
+    changed_transform = get_transform(postgresql_client, template + " where username is not null")
+    assert changed_transform.get_template_hash() != sql_transform.get_template_hash()
+    changed_transform.materialize()
+    assert "drop materialized view if exists user_summary;" in postgresql_client.executed_sql[-1]
+    assert "create materialized view user_summary" in postgresql_client.executed_sql[-1]
+    assert f"comment on materialized view user_summary is 'template_hash:{changed_transform.get_template_hash()}'" in postgresql_client.executed_sql[-1]
+
+
+def test_table_drop_only_drops_views_rebuilt_by_the_dag():
+    postgresql_client = FakePostgreSqlClient(
+        relation_kinds={"user_aggregates": "r"},
+        dependent_views={"user_aggregates": ["user_summary"], "user_summary": ["top_users"]},
+    )
+    sql_transform = get_transform(postgresql_client, "select username from games", table_name="user_aggregates")
+    sql_transform.later_node_names = {"user_summary", "top_users"}
+    assert sql_transform._get_drop_sql().split("\n") == [
+        "drop materialized view if exists top_users;",
+        "drop materialized view if exists user_summary;",
+        "drop table if exists user_aggregates;",
+    ]
+
+    sql_transform.later_node_names = {"user_summary"}
+    with pytest.raises(Exception, match="View 'top_users' depends on 'user_summary'"):
+        sql_transform._get_drop_sql()
+
+
+def test_summary_templates_read_the_grouping_levels_of_user_aggregates():
+    environment = Environment(loader=FileSystemLoader("app/assets/sql/transform"))
+    render = lambda table_name: SqlTransform(FakePostgreSqlClient(), environment, table_name, {"typed_schema": False}).get_templated_sql(is_incremental=False)
+    user_aggregates = render("user_aggregates")
+    produced_levels = set(re.findall(r"(?:THEN|ELSE) '(\w+)'", user_aggregates))
+    read_levels = {
+        level
+        for table_name in ["performance", "overall_performance", "top_openings"]
+        for level in re.findall(r"grouping_level = '(\w+)'", render(table_name))
+    }
+
+    assert produced_levels == read_levels == {"user", "user_opening_game_mode"}
+    # the counters compare with the match results written by the games transform, e.g. 'defet' for lost games
+    assert set(re.findall(r"match_result = '(\w+)'", user_aggregates)) == set(MATCH_RESULTS)
@@ -0,0 +1,60 @@
+from app.assets.extract_progress import ExtractProgress
+from app.connectors.postgresql import PostgreSqlClient
+from datetime import date, datetime
+
+
+class InMemoryExtractProgress(ExtractProgress):
+    """Keeps the progress rows in memory instead of the progress table"""
+
+    def __init__(self):
+        postgresql_client = PostgreSqlClient(server_name='localhost', database_name='postgres', username='postgres', password='postgres')
+        postgresql_client.create_table = lambda table_name, metadata: None
+        super().__init__(postgresql_client)
+        self.rows = {}
+
+    def _execute(self, sql: str, **params) -> list[dict]:
+        if sql.strip().startswith('select'):
+            return [row for (username, month), row in self.rows.items() if username == params['username']]
+        row = {**params,
+               'window_start': date.fromisoformat(params['window_start']),
+               'window_end': date.fromisoformat(params['window_end']),
+               'completed_at': datetime.now()}
+        self.rows[(params['username'], params['month'])] = row
+        return [row]
+
+
+def test_covers_and_merges_windows_of_the_same_archive():
+    progress = InMemoryExtractProgress()
+    assert not progress.covers('dolols', '2024-05', '2024-05-01', '2024-05-31')
+
+    progress.record('dolols', '2024-05', '2024-05-01', '2024-05-10', games_fetched=10, loaded_rows=4, archive_fingerprint='a')
+    assert progress.covers('dolols', '2024-05', '2024-05-02', '2024-05-10')
+    assert not progress.covers('dolols', '2024-05', '2024-05-02', '2024-05-11')
+
+    progress.record('dolols', '2024-05', '2024-05-11', '2024-05-31', games_fetched=10, loaded_rows=6, archive_fingerprint='a')
+    assert progress.covers('dolols', '2024-05', '2024-05-01', '2024-05-31')
+    assert progress.is_complete('dolols', '2024-05', '2024-05-01', '2024-05-31')
+
+    # a changed archive only vouches for the window loaded from it
+    progress.record('dolols', '2024-05', '2024-05-20', '2024-05-31', games_fetched=11, loaded_rows=7, archive_fingerprint='b')
+    assert not progress.covers('dolols', '2024-05', '2024-05-01', '2024-05-31')
+    assert progress.covers('dolols', '2024-05', '2024-05-20', '2024-05-31')
+
+
+def test_month_recorded_while_open_is_fetched_again_until_recorded_closed():
+    progress = InMemoryExtractProgress()
+    progress.record('dolols', '2024-05', '2024-05-01', '2024-05-31', games_fetched=10, loaded_rows=10, archive_fingerprint='a')
+    # as if the month was loaded while it was still the current month
+    progress.rows[('dolols', '2024-05')]['closed'] = False
+
+    assert not progress.is_complete('dolols', '2024-05', '2024-05-01', '2024-05-31')
+    assert progress.is_unchanged('dolols', '2024-05', '2024-05-01', '2024-05-31', 'a')
+    assert not progress.is_unchanged('dolols', '2024-05', '2024-05-01', '2024-05-31', 'b')
+
+    # the run fetching the month after it is over records it again, later runs skip it
+    progress.record('dolols', '2024-05', '2024-05-01', '2024-05-31', games_fetched=10, loaded_rows=10, archive_fingerprint='a')
+    assert progress.is_complete('dolols', '2024-05', '2024-05-01', '2024-05-31')
+
+    current_month = datetime.now().strftime('%Y-%m')
+    progress.record('dolols', current_month, f'{current_month}-01', f'{current_month}-01', games_fetched=1, loaded_rows=1, archive_fingerprint='c')
+    assert not progress.is_complete('dolols', current_month, f'{current_month}-01', f'{current_month}-01')
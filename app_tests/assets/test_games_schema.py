@@ -0,0 +1,77 @@
+from app.assets.Chess import parse_game, transform, extract_eco_codes, load
+from app.assets.games_schema import GamesSchemaMode, get_games_table, get_primary_key_migration_sql, get_typed_migration_sql, to_typed_games
+from app.connectors.postgresql import PostgreSqlClient
+from sqlalchemy import MetaData
+from datetime import date, timedelta
+import pandas as pd
+import json
+
+
+def test_to_typed_games():
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+    eco_codes = extract_eco_codes('app/assets/data/eco_codes.csv')
+    transformed_games = transform(pd.DataFrame([parse_game(raw_game, 'dolols')]), eco_codes)
+
+    typed_game = to_typed_games(transformed_games).to_dict(orient='records')[0]
+
+    assert typed_game['start_date'] == date(2024, 5, 16)
+    assert typed_game['game_duration'] == timedelta(seconds=int(transformed_games['game_duration_sec'][0]))
+    assert typed_game['start_date_time'] == transformed_games['start_date_time'][0]
+
+
+def test_typed_migration_sql_skips_typed_columns():
+    legacy_columns = {'game_id': 'int8', 'start_date': 'varchar', 'user_rating': 'int4', 'match_result': 'varchar'}
+    typed_columns = {'game_id': 'int8', 'start_date': 'date', 'user_rating': 'int2', 'match_result': 'match_result'}
+
+    assert get_typed_migration_sql('games', legacy_columns) == (
+        'alter table games\n'
+        '    alter column start_date type date using start_date::date,\n'
+        '    alter column user_rating type smallint using user_rating::smallint,\n'
+        '    alter column match_result type match_result using match_result::match_result'
+    )
+    assert get_typed_migration_sql('games', typed_columns) == ''
+
+
+class InMemoryUpsertClient(PostgreSqlClient):
+    """Keeps upserted rows in memory, keyed by the primary key of the table like `on conflict do update`"""
+
+    def __init__(self):
+        super().__init__(server_name='localhost', database_name='postgres', username='postgres', password='postgres')
+        self.rows = {}
+
+    def upsert(self, data, table, metadata):
+        key_columns = [pk_column.name for pk_column in table.primary_key.columns.values()]
+        for row in data:
+            self.rows[tuple(row[key_column] for key_column in key_columns)] = row
+
+
+def test_games_of_two_tracked_users_keep_a_row_per_user():
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+    eco_codes = extract_eco_codes('app/assets/data/eco_codes.csv')
+    transformed_games = transform(pd.DataFrame([parse_game(raw_game, 'dolols'), parse_game(raw_game, 'whizwars')]), eco_codes)
+
+    for schema_mode, partitioned in [(GamesSchemaMode.LEGACY, False), (GamesSchemaMode.TYPED, True)]:
+        postgresql_client = InMemoryUpsertClient()
+        games_table = get_games_table(MetaData(), schema_mode=schema_mode, partitioned=partitioned)
+        games = to_typed_games(transformed_games) if schema_mode == GamesSchemaMode.TYPED else transformed_games
+        for _, user_game in games.iterrows():
+            load(df=user_game.to_frame().T, postgresql_client=postgresql_client, table=games_table, metadata=MetaData(), load_method='upsert')
+
+        assert sorted(row['username'] for row in postgresql_client.rows.values()) == ['dolols', 'whizwars']
+        assert len({row['game_id'] for row in postgresql_client.rows.values()}) == 1
+
+
+def test_primary_key_migration_sql_replaces_the_game_id_key():
+    assert get_primary_key_migration_sql('games', 'games_pkey', ['game_id']) == (
+        'alter table games\n'
+        '    drop constraint games_pkey,\n'
+        '    add primary key (game_id, username)'
+    )
+    assert get_primary_key_migration_sql('games', 'games_pkey', ['start_date', 'game_id'], partitioned=True) == (
+        'alter table games\n'
+        '    drop constraint games_pkey,\n'
+        '    add primary key (game_id, username, start_date)'
+    )
+    assert get_primary_key_migration_sql('games', 'games_pkey', ['username', 'game_id']) == ''
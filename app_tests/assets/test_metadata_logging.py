@@ -0,0 +1,85 @@
+from app.assets.metadata_logging import MetaDataLogging
+from app.connectors.postgresql import PostgreSqlClient
+import pytest
+from types import SimpleNamespace
+from contextlib import nullcontext
+
+
+class RecordingMetaDataLogging(MetaDataLogging):
+    """Keeps the written statements instead of sending them to the database"""
+
+    def __init__(self):
+        self.statements = []
+        postgresql_client = PostgreSqlClient(server_name='localhost', database_name='postgres', username='postgres', password='postgres')
+        super().__init__(pipeline_name='test_pipeline', postgresql_client=postgresql_client, background_writer=False)
+
+    def _get_run_id(self) -> int:
+        return 7
+
+    def _write(self, statement) -> None:
+        self.statements.append(statement)
+
+
+def get_metrics(metadata_logger: RecordingMetaDataLogging) -> list[tuple]:
+    return [(metric['stage'], metric['metric']) for metric in metadata_logger.metrics]
+
+
+def test_timer_logs_stage_metrics():
+    metadata_logger = RecordingMetaDataLogging()
+    with metadata_logger.timer(stage='load', username='dolols') as stage_metrics:
+        stage_metrics['rows'] = 100
+
+    assert get_metrics(metadata_logger) == [('load', 'duration_sec'), ('load', 'rows'), ('load', 'rows_per_sec')]
+    assert [metric['metric_id'] for metric in metadata_logger.metrics] == [1, 2, 3]
+    assert {(metric['run_id'], metric['username']) for metric in metadata_logger.metrics} == {(7, 'dolols')}
+
+    metadata_logger.flush_metrics()
+    assert metadata_logger.metrics == []
+    assert len(metadata_logger.statements) == 1
+    metadata_logger.flush_metrics()
+    assert len(metadata_logger.statements) == 1
+
+
+def test_timer_logs_duration_of_failed_stages():
+    metadata_logger = RecordingMetaDataLogging()
+    with pytest.raises(ValueError):
+        with metadata_logger.timer(stage='transform', username='dolols') as stage_metrics:
+            stage_metrics['rows'] = 100
+            raise ValueError('broken game')
+
+    assert get_metrics(metadata_logger) == [('transform', 'duration_sec'), ('transform', 'failed')]
+    assert metadata_logger.metrics[1]['value'] == 1
+
+
+def test_loggers_started_together_get_different_run_ids():
+    class SequenceConnection:
+        """Answers the run id allocation like postgres would before any RUN_START row is written"""
+
+        def __init__(self, database: dict):
+            self.database = database
+
+        def execute(self, statement, params=None):
+            sql = str(statement)
+            if sql.startswith('select to_regclass'):
+                value = 'pipeline_logs_run_id_seq' if 'sequence' in self.database else None
+            elif sql.startswith('select coalesce(max(run_id), 0)'):
+                value = 41
+            elif sql.startswith('create sequence'):
+                self.database['sequence'] = int(sql.split('start with ')[1]) - 1
+                value = None
+            elif sql.startswith('select nextval'):
+                self.database['sequence'] += 1
+                value = self.database['sequence']
+            else:
+                value = None
+            return SimpleNamespace(scalar=lambda: value)
+
+    database = {}
+    postgresql_client = SimpleNamespace(
+        create_table=lambda metadata, table_name: None,
+        execute_sql=lambda sql: None,
+        engine=SimpleNamespace(begin=lambda: nullcontext(SequenceConnection(database))),
+    )
+    loggers = [MetaDataLogging('test_pipeline', postgresql_client, background_writer=False) for _ in range(2)]
+
+    assert [metadata_logger.run_id for metadata_logger in loggers] == [42, 43]
@@ -0,0 +1,33 @@
+from app.assets.opening_classifier import OpeningTrie
+
+
+def write_opening_lines(tmp_path):
+    opening_lines_path = tmp_path / 'opening_lines.tsv'
+    opening_lines_path.write_text(
+        'eco\tname\tmoves\n'
+        'C20\tKing\'s Pawn Game\te4 e5\n'
+        'C60\tRuy Lopez\te4 e5 Nf3 Nc6 Bb5\n'
+        'C65\tRuy Lopez: Berlin Defense\te4 e5 Nf3 Nc6 Bb5 Nf6\n'
+    )
+    return opening_lines_path
+
+
+def test_opening_trie_labels_deepest_line(tmp_path):
+    trie = OpeningTrie.from_tsv(write_opening_lines(tmp_path))
+    pgn = '[Event "Live Chess"]\n[ECO "C65"]\n\n1. e4 {[%clk 0:09:59.9]} 1... e5 {[%clk 0:09:59]} 2. Nf3 {[%clk 0:09:58]} 2... Nc6 {[%clk 0:09:57]} 3. Bb5 {[%clk 0:09:56]} 3... a6 {[%clk 0:09:55]} 1-0\n'
+
+    assert trie.classify_pgn(pgn) == ('C60', 'Ruy Lopez')
+    assert trie.classify(['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O']) == ('C65', 'Ruy Lopez: Berlin Defense')
+    assert trie.classify(['e4', 'c5']) is None
+
+
+def test_opening_trie_cache(tmp_path):
+    opening_lines_path = write_opening_lines(tmp_path)
+    cache_path = tmp_path / 'cache' / 'opening_trie.pickle'
+    OpeningTrie.load(opening_lines_path, cache_path=cache_path)
+    opening_lines_path.write_text(opening_lines_path.read_text() + 'B20\tSicilian Defense\te4 c5\n')
+
+    trie = OpeningTrie.load(opening_lines_path, cache_path=cache_path)
+
+    assert cache_path.exists()
+    assert trie.classify(['e4', 'c5']) == ('B20', 'Sicilian Defense')
@@ -0,0 +1,15 @@
+from app.assets.pipeline_logging import PipelineLogging
+
+
+def test_pipeline_logs_are_capped(tmp_path):
+    pipeline_logging = PipelineLogging(pipeline_name='test_pipeline', log_folder_path=tmp_path, log_buffer_capacity_bytes=1000)
+    for i in range(100):
+        pipeline_logging.logger.info(f'message {i}')
+    pipeline_logging.logger.handlers.clear()
+
+    logs = pipeline_logging.get_logs()
+
+    assert logs.startswith('... ')
+    assert logs.endswith('message 99\n')
+    assert 'message 0\n' not in logs
+    assert len(logs) < 1100
@@ -0,0 +1,21 @@
+from app.assets.Chess import parse_game, transform, extract_eco_codes
+from app.assets.profiling import StageProfiler
+import pandas as pd
+import json
+
+
+def test_stage_profiler_summary(tmp_path):
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+    eco_codes = extract_eco_codes('app/assets/data/eco_codes.csv')
+    profiler = StageProfiler(output_folder_path=tmp_path, run_name='run_1', top_functions=3)
+
+    with profiler.profile('parse'):
+        valid_games = pd.DataFrame([parse_game(raw_game, 'dolols')])
+    with profiler.profile('transform'):
+        transform(valid_games, eco_codes)
+    summary = profiler.write_summary().read_text()
+
+    assert [stage['profile_path'].name for stage in profiler.stages] == ['001_parse.prof', '002_transform.prof']
+    assert '== transform (002_transform.prof)' in summary
+    assert '_get_avg_move_time (Chess.py' in summary
@@ -0,0 +1,37 @@
+from app.assets.query_plans import find_plan_regressions, get_plan_rows, get_plan_signature
+
+
+def get_plan(join_type: str, rows: int) -> dict:
+    return {
+        'Node Type': 'ModifyTable',
+        'Actual Rows': 0,
+        'Plans': [{
+            'Node Type': f'{join_type} Join',
+            'Actual Rows': rows,
+            'Plans': [{'Node Type': 'Seq Scan', 'Relation Name': 'games'}, {'Node Type': 'Seq Scan', 'Relation Name': 'players'}],
+        }],
+    }
+
+
+def test_plan_signature_and_rows():
+    assert get_plan_rows(get_plan('Hash', 42)) == 42
+    assert get_plan_signature(get_plan('Hash', 42)) == get_plan_signature(get_plan('Hash', 7))
+    assert get_plan_signature(get_plan('Hash', 42)) != get_plan_signature(get_plan('Nested Loop', 42))
+
+
+def test_find_plan_regressions():
+    history = [
+        dict(run_id=run_id, rows_produced=100, execution_ms=execution_ms, plan_signature=get_plan_signature(get_plan('Hash', 100)))
+        for run_id, execution_ms in [(3, 900), (2, 1000), (1, 1100)]
+    ]
+    record = dict(node='top_openings', template_hash='0123456789', rows_produced=100,
+                  execution_ms=1200, plan_signature=get_plan_signature(get_plan('Hash', 100)))
+
+    assert find_plan_regressions(record, history, slowdown_threshold=2.0, min_execution_ms=100) == []
+    assert find_plan_regressions(record, [], slowdown_threshold=2.0, min_execution_ms=100) == []
+
+    slow_record = {**record, 'execution_ms': 10000, 'plan_signature': get_plan_signature(get_plan('Nested Loop', 100))}
+    assert find_plan_regressions(slow_record, history, slowdown_threshold=2.0, min_execution_ms=100) == [
+        'Plan of top_openings changed since run 3 (template 01234567), rows 100 -> 100',
+        'top_openings took 10000 ms, 10.0x its median of 1000 ms over the last 3 runs (template 01234567)',
+    ]
@@ -0,0 +1,38 @@
+from app.assets.scheduler import UserScheduler
+from app.connectors.postgresql import PostgreSqlClient
+from datetime import datetime, date, timedelta
+
+
+def test_scheduler_skips_dormant_users_and_orders_by_expected_games():
+    now = datetime.now()
+    activity = {
+        'dormant': dict(last_game_date=date(2024, 1, 10), last_game_end=datetime(2024, 1, 10, 12), recent_games=30,
+                        last_online=datetime(2024, 1, 10, 12, 5), snaphot_date=now),
+        'casual': dict(last_game_date=now.date(), last_game_end=now, recent_games=30),
+        'busy': dict(last_game_date=now.date(), last_game_end=now, recent_games=900),
+        'new': {},
+        'no_archive': dict(last_game_date=now.date(), last_game_end=now, recent_games=900),
+    }
+    postgresql_client = PostgreSqlClient(server_name='localhost', database_name='postgres', username='postgres', password='postgres')
+    scheduler = UserScheduler(postgresql_client)
+    scheduler.get_activity = lambda usernames: activity
+    this_month = now.strftime('%Y-%m')
+
+    runs = scheduler.plan(list(activity),
+                          get_date_window=lambda username: ('2024-01-01', now.strftime('%Y-%m-%d')),
+                          get_archive_months=lambda username: [] if username == 'no_archive' else ['2023-12', this_month])
+
+    assert [(run['username'], run['skip_reason'] is None) for run in runs] == [
+        ('new', True), ('busy', True), ('casual', True), ('dormant', False), ('no_archive', False)
+    ]
+    # the window starts at the first archive month within it
+    assert runs[0]['start_date'] == f'{this_month}-01'
+
+
+def test_scheduler_ignores_stale_snapshots():
+    scheduler = UserScheduler(PostgreSqlClient(server_name='localhost', database_name='postgres', username='postgres', password='postgres'))
+    now = datetime.now()
+    user_activity = dict(last_game_end=datetime(2024, 1, 10, 12), last_online=datetime(2024, 1, 10, 12, 5), snaphot_date=now)
+
+    assert scheduler.is_dormant(user_activity, now)
+    assert not scheduler.is_dormant({**user_activity, 'snaphot_date': now - timedelta(hours=2)}, now)
@@ -1,4 +1,8 @@
-from app.assets.Chess import parse_game
+from app.assets.Chess import parse_game, parse_game_facts, transform_moves, extract_games, get_archive_fingerprint, get_daily_ratings_sql, get_move_times, update_daily_ratings
+from types import SimpleNamespace
+from contextlib import nullcontext
+from app.assets.game_store import GameStore
+import pandas as pd
 import json
 
 def test_game_parsing():
@@ -11,3 +15,129 @@ def test_game_parsing():
         expected_result = json.loads(file.read())
 
     assert parse_game(test_input, username) == expected_result
+
+
+def test_transform_moves():
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+    valid_games = pd.DataFrame([parse_game(raw_game, 'dolols'), parse_game(raw_game, 'whizwars')])
+
+    game_moves = transform_moves(valid_games).to_dict(orient='records')
+
+    assert len(game_moves) == 1
+    assert game_moves[0]['time_control'] == '600'
+    assert game_moves[0]['plies'] == 30
+    assert game_moves[0]['clocks_sec'][:8] == [600.0, 599.6, 599.2, 597.2, 595.3, 591.5, 580.0, 585.7]
+    assert game_moves[0]['think_times_sec'][:8] == [0.0, 0.4, 0.8, 2.4, 3.9, 5.7, 15.3, 5.8]
+
+
+def test_extract_games_fingerprints_monthly_archives():
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+
+    class MonthlyGamesClient:
+        username = 'dolols'
+
+        def get_monthly_games(self, year, month):
+            return [raw_game] if month == 5 else []
+
+    stats = {}
+    valid_games = extract_games('2024-04-01', '2024-05-31', MonthlyGamesClient(), stats=stats)
+
+    assert valid_games.shape[0] == 1
+    assert stats['archive_fingerprints'] == {'2024-04': get_archive_fingerprint([]), '2024-05': get_archive_fingerprint([raw_game])}
+    # the fingerprint does not depend on the key order of the response
+    assert get_archive_fingerprint([dict(reversed(list(raw_game.items())))]) == stats['archive_fingerprints']['2024-05']
+
+
+def test_game_store_parses_shared_games_once():
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+
+    class MonthlyGamesClient:
+        def __init__(self, username):
+            self.username = username
+
+        def get_monthly_games(self, year, month):
+            return [raw_game]
+
+    game_store = GameStore()
+    white_games = extract_games('2024-05-01', '2024-05-31', MonthlyGamesClient('dolols'), game_store=game_store)
+    black_games = extract_games('2024-05-01', '2024-05-31', MonthlyGamesClient('whizwars'), game_store=game_store)
+
+    assert game_store.hits == 1
+    assert white_games.to_dict(orient='records') == [parse_game(raw_game, 'dolols')]
+    assert black_games.to_dict(orient='records') == [parse_game(raw_game, 'whizwars')]
+    assert black_games['opponent'][0] == 'Dolols'
+
+
+def test_extract_games_skips_games_outside_window_before_parsing():
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+
+    class MonthlyGamesClient:
+        username = 'dolols'
+
+        def get_monthly_games(self, year, month):
+            return [raw_game]
+
+    stats = {}
+    assert extract_games('2024-05-17', '2024-05-31', MonthlyGamesClient(), stats=stats).shape[0] == 0
+    assert (stats['games_skipped'], stats['games_parsed']) == (1, 0)
+    assert extract_games('2024-05-16', '2024-05-16', MonthlyGamesClient(), stats=stats).shape[0] == 1
+    assert (stats['games_skipped'], stats['games_parsed']) == (0, 1)
+
+
+def test_daily_ratings_refresh_touched_days_or_backfill_users_without_ratings():
+    class RecordingConnection:
+        def __init__(self, has_ratings):
+            self.has_ratings = has_ratings
+            self.executed = []
+
+        def execute(self, statement, params):
+            self.executed.append((statement, params))
+            return SimpleNamespace(first=lambda: (1,) if self.has_ratings else None)
+
+    def refresh(has_ratings, dates):
+        connection = RecordingConnection(has_ratings)
+        postgresql_client = SimpleNamespace(create_table=lambda table_name, metadata: None,
+                                            engine=SimpleNamespace(begin=lambda: nullcontext(connection)))
+        daily_ratings_table = SimpleNamespace(name='daily_ratings')
+        update_daily_ratings(postgresql_client, 'games', daily_ratings_table, None, username="o'neil", dates=dates)
+        statements = connection.executed[1:]
+        # every bound parameter of the statements is given, the username is never part of the sql
+        for statement, params in statements:
+            assert set(statement.compile().params) <= set(params)
+            assert "o'neil" not in str(statement)
+        return [params for statement, params in statements]
+
+    touched = refresh(has_ratings=True, dates=['2024-05-16', '2024-05-02', '2024-05-16'])
+    assert touched == [dict(username="o'neil", dates=['2024-05-02', '2024-05-16'], first_date='2024-05-02')] * 2
+    # users without daily ratings get all their days, as do calls without dates
+    assert refresh(has_ratings=False, dates=['2024-05-16']) == [dict(username="o'neil")] * 2
+    assert refresh(has_ratings=True, dates=None) == [dict(username="o'neil")] * 2
+    assert ':dates' not in str(get_daily_ratings_sql('games', 'daily_ratings', backfill=True)[0])
+
+
+def test_game_store_keeps_only_games_between_tracked_users():
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+    game_store = GameStore(tracked_usernames=['dolols'])
+    game_facts = parse_game(raw_game, 'dolols')
+    shared_game = {**game_facts, 'game_id': '1', 'white_username': 'Dolols', 'black_username': 'dolols'}
+    other_game = {**game_facts, 'game_id': '2', 'white_username': 'Dolols', 'black_username': 'WhizWars'}
+    game_store.add(shared_game)
+    game_store.add(other_game)
+
+    game_store.evict_unshared()
+    assert list(game_store.games) == ['1']
+    assert 'pgn' not in parse_game_facts(raw_game)
+
+
+def test_move_times_of_daily_games_use_the_move_allowance():
+    pgn = ('[TimeControl "1/86400"]\n\n'
+           '1. e4 {[%clk 23:59:50]} 1... e5 {[%clk 20:00:00]} 2. Nf3 {[%clk 23:00:00]} 2... Nc6 {[%clk 12:00:00]} 1-0')
+    move_times = get_move_times(pgn)
+
+    assert (move_times['base_time_sec'], move_times['increment_sec']) == (None, 0.0)
+    assert move_times['think_times_sec'] == [10.0, 14400.0, 3600.0, 43200.0]
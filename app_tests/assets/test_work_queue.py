@@ -0,0 +1,55 @@
+from app.assets.work_queue import WorkQueue, TaskStatus
+from app.connectors.postgresql import PostgreSqlClient
+import re
+
+
+class RecordingWorkQueue(WorkQueue):
+    def __init__(self, rows: list[dict] = None, **kwargs):
+        postgresql_client = PostgreSqlClient(server_name='localhost', database_name='postgres', username='postgres', password='postgres')
+        postgresql_client.create_table = lambda table_name, metadata: None
+        super().__init__(postgresql_client, **kwargs)
+        self.rows = rows or []
+        self.statements = []
+
+    def _execute(self, sql: str, **params) -> list[dict]:
+        self.statements.append((re.sub(r'\s+', ' ', sql).strip(), params))
+        return self.rows
+
+
+def test_enqueue_only_requeues_finished_tasks_of_requeue_months():
+    queue = RecordingWorkQueue(rows=[dict(task_id=1)])
+
+    assert queue.enqueue(['dolols'], ['2024-04', '2024-05'], requeue_months=['2024-05']) == 2
+    assert [(params['month'], params['requeue']) for sql, params in queue.statements] == [('2024-04', False), ('2024-05', True)]
+    sql, params = queue.statements[0]
+    # existing tasks are only updated when requeued and finished, so other months are never duplicated or reset
+    assert 'on conflict (username, month) do update' in sql
+    assert 'where :requeue and extract_tasks.status in (:done, :failed)' in sql
+    assert (params['done'], params['failed'], params['pending']) == (TaskStatus.DONE, TaskStatus.FAILED, TaskStatus.PENDING)
+
+
+def test_lease_fails_expired_tasks_without_attempts_left_and_retakes_the_others():
+    queue = RecordingWorkQueue(rows=[dict(task_id=1, username='dolols', month='2024-05', attempts=2)], max_attempts=3, lease_seconds=60)
+
+    assert queue.lease('worker-1')['task_id'] == 1
+    (expire_sql, expire_params), (lease_sql, lease_params) = queue.statements
+    assert 'set status = :failed' in expire_sql
+    assert 'where status = :running and lease_expires_at < now() and attempts >= :max_attempts' in expire_sql
+    assert expire_params['max_attempts'] == 3
+    assert '(status = :pending or (status = :running and lease_expires_at < now())) and attempts < :max_attempts' in lease_sql
+    assert 'attempts = attempts + 1' in lease_sql
+    assert 'for update skip locked' in lease_sql
+    assert (lease_params['worker_id'], lease_params['lease_seconds'], lease_params['max_attempts']) == ('worker-1', 60, 3)
+
+    assert RecordingWorkQueue(rows=[]).lease('worker-1') is None
+
+
+def test_fail_retries_until_max_attempts():
+    queue = RecordingWorkQueue(max_attempts=3)
+
+    queue.fail(task_id=1, worker_id='worker-1', error='x' * 2000)
+    sql, params = queue.statements[0]
+    assert 'set status = case when attempts < :max_attempts then :pending else :failed end' in sql
+    # only the worker holding the lease may release the task
+    assert 'where task_id = :task_id and lease_owner = :worker_id' in sql
+    assert len(params['error']) == 1000
@@ -0,0 +1,67 @@
+"""
+Extraction throughput benchmark of ChessApiClient and extract_games against the local fake chess.com API.
+
+Run from the repository root:
+
+    python -m app_tests.benchmarks.bench_extract --users 5 --start-date 2023-01-01 --end-date 2023-12-31 --latency 0.05 --error-rate 0.05
+"""
+import argparse
+import time
+
+from app.assets.Chess import generate_monthly_dates, extract_games
+from app.connectors.Chess import ChessApiClient
+from app_tests.benchmarks.fake_chess_api import FakeChessApiServer
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of extract_games against a local fake chess.com API")
+    parser.add_argument("--users", type=int, default=3, help="number of users to extract")
+    parser.add_argument("--start-date", default="2023-01-01")
+    parser.add_argument("--end-date", default="2023-06-30")
+    parser.add_argument("--games-per-month", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="random seconds added on top of latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429/5xx")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After header of injected 429 responses")
+    parser.add_argument("--backoff-factor", type=float, default=0.1, help="backoff_factor of ChessApiClient")
+    parser.add_argument("--max-retries", type=int, default=3, help="max_retries of ChessApiClient")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    usernames = [f"benchmark_user_{i}" for i in range(args.users)]
+    months = sorted({date.strftime("%Y-%m") for date in generate_monthly_dates(args.start_date, args.end_date)})
+    with FakeChessApiServer(
+        usernames=usernames,
+        months=months,
+        games_per_month=args.games_per_month,
+        seed=args.seed,
+        latency_sec=args.latency,
+        latency_jitter_sec=args.latency_jitter,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+    ) as server:
+        # generating the archives up front so the benchmark only measures extraction
+        for username in usernames:
+            for month in months:
+                server._get_monthly_games_body(username, int(month[:4]), int(month[5:]))
+
+        games_count = 0
+        start = time.perf_counter()
+        for username in usernames:
+            chess_api_client = ChessApiClient(
+                username,
+                user_agent="bench_extract",
+                api_path=server.api_path,
+                max_retries=args.max_retries,
+                backoff_factor=args.backoff_factor,
+            )
+            games_count += extract_games(args.start_date, args.end_date, chess_api_client).shape[0]
+        seconds = time.perf_counter() - start
+
+    print(f"users: {len(usernames)}, months: {len(months)}, games extracted: {games_count}")
+    print(f"time: {seconds:.3f} s, {games_count / seconds:.1f} games/s")
+    print(f"requests: {server.requests_count}, bytes sent: {server.bytes_sent}, statuses: {server.status_counts}")
+
+
+if __name__ == "__main__":
+    main()
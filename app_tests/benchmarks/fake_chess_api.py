@@ -0,0 +1,194 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app_tests.benchmarks.game_generator import GameGenerator
+
+ARCHIVES_PATH = re.compile(r"^/pub/player/(?P<username>[^/]+)/games/archives$")
+MONTHLY_GAMES_PATH = re.compile(r"^/pub/player/(?P<username>[^/]+)/games/(?P<year>\d{4})/(?P<month>\d{2})$")
+PLAYER_PATH = re.compile(r"^/pub/player/(?P<username>[^/]+)$")
+COUNTRY_PATH = re.compile(r"^/pub/country/(?P<code>[A-Z]{2})$")
+
+
+class FakeChessApiServer:
+    def __init__(
+        self,
+        usernames: list[str],
+        months: list[str],
+        games_per_month: int = 100,
+        seed: int = 0,
+        latency_sec: float = 0.0,
+        latency_jitter_sec: float = 0.0,
+        error_rate: float = 0.0,
+        error_status_codes: list[int] = [429, 500, 503],
+        fail_first_requests: int = 0,
+        retry_after: int = 1,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Local stand-in for chess.com public API serving generated games, used for load and latency testing
+        of ChessApiClient and extract_games without the network.
+
+        Serves `/pub/player/{username}/games/archives`, `/pub/player/{username}/games/{YYYY}/{MM}`,
+        `/pub/player/{username}` and `/pub/country/{code}`. Responses carry an ETag and requests with a
+        matching If-None-Match header are answered with 304.
+
+        Parameters:
+        - usernames (list): users known to the server
+        - months (list): months ('YYYY-MM') in every user's archive
+        - games_per_month (int): number of games in each monthly archive
+        - seed (int): seed of the game generator, monthly archives are generated once and cached
+        - latency_sec (float): delay added to every response
+        - latency_jitter_sec (float): random delay added on top of latency_sec
+        - error_rate (float): share of requests failed with one of error_status_codes
+        - error_status_codes (list): statuses used for injected failures (429 is sent with a Retry-After header)
+        - fail_first_requests (int): number of requests failed before any request succeeds
+        - retry_after (int): value of the Retry-After header of injected 429 responses
+        - host (str), port (int): address to listen on, port 0 picks a free port
+        """
+        self.usernames = {username.lower(): username for username in usernames}
+        self.months = sorted(months)
+        self.games_per_month = games_per_month
+        self.seed = seed
+        self.latency_sec = latency_sec
+        self.latency_jitter_sec = latency_jitter_sec
+        self.error_rate = error_rate
+        self.error_status_codes = error_status_codes
+        self.fail_first_requests = fail_first_requests
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.archives: dict[tuple, bytes] = {}
+        self.requests_count = 0
+        self.status_counts: dict[int, int] = {}
+        self.bytes_sent = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._get_handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def api_path(self) -> str:
+        """Root of the API to pass to ChessApiClient"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/pub"
+
+    def start(self) -> "FakeChessApiServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self) -> "FakeChessApiServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _get_monthly_games_body(self, username: str, year: int, month: int) -> bytes:
+        key = (username, year, month)
+        with self.lock:
+            if key not in self.archives:
+                month_seed = int(hashlib.sha1(f"{self.seed}/{username}/{year}/{month}".encode()).hexdigest()[:8], 16)
+                generator = GameGenerator(seed=month_seed, first_game_id=month_seed * 100000)
+                archive = generator.generate_monthly_archive(self.usernames[username], year, month, self.games_per_month)
+                self.archives[key] = json.dumps(archive).encode()
+            return self.archives[key]
+
+    def _get_player(self, username: str) -> dict:
+        player_id = int(hashlib.sha1(username.encode()).hexdigest()[:8], 16)
+        last_online = datetime.strptime(self.months[-1], "%Y-%m") if self.months else datetime(2024, 1, 1)
+        return {
+            "@id": f"{self.api_path}/player/{username}",
+            "url": f"https://www.chess.com/member/{username}",
+            "username": username,
+            "player_id": player_id,
+            "name": self.usernames[username],
+            "title": None,
+            "followers": player_id % 10000,
+            "country": f"{self.api_path}/country/US",
+            "location": "Localhost",
+            "last_online": int(last_online.timestamp()),
+            "joined": 1262304000,
+            "status": "basic",
+            "is_streamer": False,
+            "verified": False,
+            "league": "Wood",
+        }
+
+    def _route(self, path: str) -> tuple[int, bytes]:
+        match = ARCHIVES_PATH.match(path)
+        if match and match.group("username").lower() in self.usernames:
+            username = match.group("username").lower()
+            archives = [f"{self.api_path}/player/{username}/games/{month.replace('-', '/')}" for month in self.months]
+            return 200, json.dumps({"archives": archives}).encode()
+        match = MONTHLY_GAMES_PATH.match(path)
+        if match and match.group("username").lower() in self.usernames:
+            month = f"{match.group('year')}-{match.group('month')}"
+            if month not in self.months:
+                return 200, json.dumps({"games": []}).encode()
+            return 200, self._get_monthly_games_body(
+                match.group("username").lower(), int(match.group("year")), int(match.group("month"))
+            )
+        match = PLAYER_PATH.match(path)
+        if match and match.group("username").lower() in self.usernames:
+            return 200, json.dumps(self._get_player(match.group("username").lower())).encode()
+        match = COUNTRY_PATH.match(path)
+        if match:
+            code = match.group("code")
+            return 200, json.dumps({"@id": f"{self.api_path}/country/{code}", "name": code, "code": code}).encode()
+        return 404, json.dumps({"code": 0, "message": "Data provider not found for key"}).encode()
+
+    def _get_handler_class(self):
+        server = self
+
+        class FakeChessApiHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status_code: int, body: bytes = b"", headers: dict = {}) -> None:
+                self.send_response(status_code)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server.lock:
+                    server.status_counts[status_code] = server.status_counts.get(status_code, 0) + 1
+                    server.bytes_sent += len(body)
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests_count += 1
+                    inject_error = (
+                        server.requests_count <= server.fail_first_requests
+                        or server.random.random() < server.error_rate
+                    )
+                    delay = server.latency_sec + server.random.uniform(0, server.latency_jitter_sec)
+                    error_status_code = server.random.choice(server.error_status_codes)
+                if delay > 0:
+                    time.sleep(delay)
+                if inject_error:
+                    headers = {"Retry-After": str(server.retry_after)} if error_status_code == 429 else {}
+                    self._send(error_status_code, b"Injected failure", headers)
+                    return
+                status_code, body = server._route(self.path.split("?")[0])
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                if status_code == 200 and self.headers.get("If-None-Match") == etag:
+                    self._send(304, headers={"ETag": etag})
+                    return
+                self._send(status_code, body, {"Content-Type": "application/json", "ETag": etag})
+
+        return FakeChessApiHandler
@@ -0,0 +1,237 @@
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+# opening lines used as the first moves of generated games: (ECO, chess.com opening url slug, SAN moves)
+OPENINGS = [
+    ("C25", "Vienna-Game", ["e4", "e5", "Nc3"]),
+    ("C50", "Giuoco-Piano-Game", ["e4", "e5", "Nf3", "Nc6", "Bc4", "Bc5"]),
+    ("C60", "Ruy-Lopez-Opening", ["e4", "e5", "Nf3", "Nc6", "Bb5"]),
+    ("C65", "Ruy-Lopez-Opening-Berlin-Defense", ["e4", "e5", "Nf3", "Nc6", "Bb5", "Nf6"]),
+    ("C42", "Petrovs-Defense", ["e4", "e5", "Nf3", "Nf6"]),
+    ("C41", "Philidor-Defense", ["e4", "e5", "Nf3", "d6"]),
+    ("C00", "French-Defense", ["e4", "e6"]),
+    ("B01", "Scandinavian-Defense", ["e4", "d5"]),
+    ("B06", "Modern-Defense", ["e4", "g6"]),
+    ("B10", "Caro-Kann-Defense", ["e4", "c6"]),
+    ("B20", "Sicilian-Defense", ["e4", "c5"]),
+    ("B22", "Sicilian-Defense-Alapin-Variation", ["e4", "c5", "c3"]),
+    ("B90", "Sicilian-Defense-Najdorf-Variation", ["e4", "c5", "Nf3", "d6", "d4", "cxd4", "Nxd4", "Nf6", "Nc3", "a6"]),
+    ("D02", "Queens-Pawn-Opening-London-System", ["d4", "d5", "Nf3", "Nf6", "Bf4"]),
+    ("D06", "Queens-Gambit-Declined", ["d4", "d5", "c4"]),
+    ("D37", "Queens-Gambit-Declined-Three-Knights-Variation", ["d4", "d5", "c4", "e6", "Nc3", "Nf6", "Nf3", "Be7", "Bf4"]),
+    ("A45", "Indian-Game", ["d4", "Nf6"]),
+    ("E20", "Nimzo-Indian-Defense", ["d4", "Nf6", "c4", "e6", "Nc3", "Bb4"]),
+    ("E60", "Kings-Indian-Defense", ["d4", "Nf6", "c4", "g6"]),
+    ("A80", "Dutch-Defense", ["d4", "f5"]),
+    ("A10", "English-Opening", ["c4"]),
+    ("A04", "Reti-Opening", ["Nf3"]),
+]
+
+# plausible SAN moves used after the opening line, legality is not needed for benchmarking
+FILLER_MOVES = [
+    "Nf3", "Nc6", "Nf6", "Nc3", "Be2", "Be7", "Bd3", "Bd6", "O-O", "O-O", "Qd2", "Qe7", "Qc2", "Re1",
+    "Rfe1", "Rad8", "Rac1", "h3", "h6", "a3", "a6", "a4", "b4", "b5", "Bb2", "Bb7", "exd5", "exd4",
+    "Nxd4", "Nxe5", "Bxf6", "Bxc6", "Qxd8+", "Rxd8", "Kf1", "Kg7", "g3", "g6", "Bg2", "Bg7", "Nbd7",
+    "Nd5", "c4", "c5", "d4", "d5", "e4", "e5", "f4", "f5", "Rxe8+", "Qh5", "Ng5", "Kh1", "Rc8", "Rb1",
+]
+
+# (time_class, time_control, base seconds, increment seconds)
+TIME_CONTROLS = {
+    "bullet": [("60", 60, 0), ("120+1", 120, 1)],
+    "blitz": [("180", 180, 0), ("180+2", 180, 2), ("300", 300, 0)],
+    "rapid": [("600", 600, 0), ("900+10", 900, 10)],
+    "daily": [("1/86400", 86400, 0), ("1/259200", 259200, 0)],
+}
+
+DEFAULT_TIME_CLASS_WEIGHTS = {"bullet": 0.35, "blitz": 0.4, "rapid": 0.2, "daily": 0.05}
+
+WIN_RESULTS = ["resigned", "checkmated", "timeout", "abandoned"]
+DRAW_RESULTS = ["agreed", "repetition", "stalemate", "insufficient", "timevsinsufficient"]
+
+
+class GameGenerator:
+    def __init__(
+        self,
+        seed: int = 0,
+        time_class_weights: dict = None,
+        accuracy_rate: float = 0.3,
+        first_game_id: int = 100000000000,
+    ):
+        """
+        Seeded generator of games in the shape of chess.com monthly archives (see app_tests/assets/inputs/raw_game.txt)
+
+        Parameters:
+        - seed (int): random seed, the same seed always generates the same games
+        - time_class_weights (dict): share of bullet/blitz/rapid/daily games
+        - accuracy_rate (float): share of games having computer accuracies
+        - first_game_id (int): id of the first generated game, following games get consecutive ids
+        """
+        self.random = random.Random(seed)
+        self.time_class_weights = time_class_weights or DEFAULT_TIME_CLASS_WEIGHTS
+        self.accuracy_rate = accuracy_rate
+        self.next_game_id = first_game_id
+
+    def _format_clock(self, seconds: float) -> str:
+        hours, remainder = divmod(int(round(seconds * 10)), 36000)
+        minutes, remainder = divmod(remainder, 600)
+        seconds, tenths = divmod(remainder, 10)
+        # chess.com only prints tenths of a second when there are any
+        if tenths == 0:
+            return f"{hours}:{minutes:02}:{seconds:02}"
+        return f"{hours}:{minutes:02}:{seconds:02}.{tenths}"
+
+    def _generate_moves(self, base: int, increment: int, time_class: str) -> tuple[str, int, float, str, str]:
+        """Returns the movetext, number of plies, time spent by both players and the opening (ECO, url slug)"""
+        eco, eco_slug, opening_moves = self.random.choice(OPENINGS)
+        plies = self.random.randint(max(len(opening_moves), 16), 120)
+        moves = opening_moves + [self.random.choice(FILLER_MOVES) for _ in range(plies - len(opening_moves))]
+        clocks = [float(base), float(base)]
+        # think time scales with the time control, daily games take hours per move
+        mean_think = base / 60 if time_class != "daily" else 3600 * 4
+        movetext = []
+        for ply, move in enumerate(moves):
+            color = ply % 2
+            think = min(self.random.expovariate(1 / mean_think), clocks[color] * 0.3)
+            clocks[color] = round(clocks[color] - think + increment, 1)
+            clock = self._format_clock(clocks[color])
+            if color == 0:
+                movetext.append(f"{ply // 2 + 1}. {move} {{[%clk {clock}]}}")
+            else:
+                movetext.append(f"{ply // 2 + 1}... {move} {{[%clk {clock}]}}")
+        time_spent = (2 * base + increment * plies) - sum(clocks)
+        return " ".join(movetext), plies, time_spent, eco, eco_slug
+
+    def generate_game(self, username: str, year: int, month: int) -> dict:
+        """
+        Generates a single game of a user which ended in the given month (chess.com archives games by end time)
+        """
+        time_class = self.random.choices(
+            list(self.time_class_weights.keys()), weights=list(self.time_class_weights.values())
+        )[0]
+        time_control, base, increment = self.random.choice(TIME_CONTROLS[time_class])
+        movetext, plies, time_spent, eco, eco_slug = self._generate_moves(base, increment, time_class)
+
+        month_start = datetime(year, month, 1, tzinfo=timezone.utc)
+        month_end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+        end = month_start + timedelta(
+            seconds=self.random.randint(0, int((month_end - month_start).total_seconds()) - 1)
+        )
+        start = end - timedelta(seconds=int(time_spent) + 1)
+
+        game_id = self.next_game_id
+        self.next_game_id += 1
+        game_type = "daily" if time_class == "daily" else "live"
+        url = f"https://www.chess.com/game/{game_type}/{game_id}"
+
+        opponent = f"opponent{self.random.randint(1, 5000)}"
+        user_rating = self.random.randint(800, 2800)
+        opponent_rating = user_rating + self.random.randint(-150, 150)
+        if self.random.random() < 0.5:
+            white, black = (username, user_rating), (opponent, opponent_rating)
+        else:
+            white, black = (opponent, opponent_rating), (username, user_rating)
+
+        outcome = self.random.random()
+        if outcome < 0.47:
+            pgn_result, white_result, black_result = "1-0", "win", self.random.choice(WIN_RESULTS)
+            termination = f"{white[0]} won by {black_result}"
+        elif outcome < 0.94:
+            pgn_result, white_result, black_result = "0-1", self.random.choice(WIN_RESULTS), "win"
+            termination = f"{black[0]} won by {white_result}"
+        else:
+            draw_result = self.random.choice(DRAW_RESULTS)
+            pgn_result, white_result, black_result = "1/2-1/2", draw_result, draw_result
+            termination = f"Game drawn by {draw_result}"
+
+        headers = [
+            ("Event", "Live Chess" if game_type == "live" else "Let's Play!"),
+            ("Site", "Chess.com"),
+            ("Date", start.strftime("%Y.%m.%d")),
+            ("Round", "-"),
+            ("White", white[0]),
+            ("Black", black[0]),
+            ("Result", pgn_result),
+            ("CurrentPosition", "8/8/8/8/8/8/8/8 w - -"),
+            ("Timezone", "UTC"),
+            ("ECO", eco),
+            ("ECOUrl", f"https://www.chess.com/openings/{eco_slug}"),
+            ("UTCDate", start.strftime("%Y.%m.%d")),
+            ("UTCTime", start.strftime("%H:%M:%S")),
+            ("WhiteElo", str(white[1])),
+            ("BlackElo", str(black[1])),
+            ("TimeControl", time_control),
+            ("Termination", termination),
+            ("StartTime", start.strftime("%H:%M:%S")),
+            ("EndDate", end.strftime("%Y.%m.%d")),
+            ("EndTime", end.strftime("%H:%M:%S")),
+            ("Link", url),
+        ]
+        pgn = "\n".join(f'[{key} "{value}"]' for key, value in headers)
+        pgn = f"{pgn}\n\n{movetext} {pgn_result}\n"
+
+        game = {
+            "url": url,
+            "pgn": pgn,
+            "time_control": time_control,
+            "end_time": int(end.timestamp()),
+            "rated": True,
+            "uuid": str(uuid.UUID(int=self.random.getrandbits(128))),
+            "initial_setup": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+            "fen": "8/8/8/8/8/8/8/8 w - -",
+            "time_class": time_class,
+            "rules": "chess",
+            "white": {
+                "rating": white[1],
+                "result": white_result,
+                "@id": f"https://api.chess.com/pub/player/{white[0].lower()}",
+                "username": white[0],
+            },
+            "black": {
+                "rating": black[1],
+                "result": black_result,
+                "@id": f"https://api.chess.com/pub/player/{black[0].lower()}",
+                "username": black[0],
+            },
+        }
+        if game_type == "daily":
+            game["start_time"] = int(start.timestamp())
+        if self.random.random() < self.accuracy_rate:
+            game["accuracies"] = {
+                "white": round(self.random.uniform(40, 99), 2),
+                "black": round(self.random.uniform(40, 99), 2),
+            }
+        return game
+
+    def generate_monthly_archive(self, username: str, year: int, month: int, games_count: int) -> dict:
+        """
+        Generates the response body of `/player/{username}/games/{YYYY}/{MM}`, games are sorted by end time
+        """
+        games = [self.generate_game(username, year, month) for _ in range(games_count)]
+        games.sort(key=lambda game: game["end_time"])
+        return {"games": games}
+
+    def generate_archives(
+        self, username: str, games_count: int, start_year: int = 2023, start_month: int = 1, games_per_month: int = 1000
+    ) -> Iterator[tuple[int, int, list]]:
+        """
+        Generates games_count games of a user spread over consecutive monthly archives.
+        Yields (year, month, games) tuples.
+        """
+        year, month = start_year, start_month
+        while games_count > 0:
+            month_games_count = min(games_per_month, games_count)
+            yield year, month, self.generate_monthly_archive(username, year, month, month_games_count)["games"]
+            games_count -= month_games_count
+            year, month = year + month // 12, month % 12 + 1
+
+    def generate_games(self, username: str, games_count: int, games_per_month: int = 1000) -> list[dict]:
+        """
+        Generates a flat list of games_count games of a user
+        """
+        return [
+            game
+            for _, _, games in self.generate_archives(username, games_count, games_per_month=games_per_month)
+            for game in games
+        ]
@@ -0,0 +1,213 @@
+"""
+Throughput benchmarks of the games ETL functions on synthetic chess.com games.
+
+Run from the repository root:
+
+    python -m app_tests.benchmarks.run_benchmarks --scales 1000 100000 1000000
+
+Every run appends its timings to a jsonl history file, and each timing is compared with the best
+earlier timing of the same stage and scale. Stages slower than `--threshold` times the best are reported as
+regressions (and fail the run with `--fail-on-regression`).
+The `load` stage needs a postgres database configured with the same environment variables as the pipeline
+(SERVER_NAME, DATABASE_NAME, DB_USERNAME, DB_PASSWORD, PORT) and is only run with `--load`.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import MetaData
+
+from app.assets.Chess import (
+    pgn_to_dict,
+    parse_game,
+    extract_games,
+    _get_avg_move_time,
+    extract_eco_codes,
+    transform,
+    transform_columnar,
+    load,
+)
+from app.assets.games_schema import get_games_table
+from app_tests.benchmarks.game_generator import GameGenerator
+
+DEFAULT_SCALES = [1000, 100000, 1000000]
+STAGES = ["pgn_to_dict", "parse_game", "extract_games", "_get_avg_move_time", "transform", "transform_columnar", "load"]
+BENCHMARK_USERNAME = "benchmark_user"
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class InMemoryArchiveClient:
+    def __init__(self, username: str, games: list[dict]):
+        """Serves games as monthly archives (by end time, like chess.com) to time extract_games without http"""
+        self.username = username
+        self.archives = {}
+        for game in games:
+            end = datetime.fromtimestamp(game["end_time"], tz=timezone.utc)
+            self.archives.setdefault((end.year, end.month), []).append(game)
+
+    def get_monthly_games(self, year: int, month: int) -> list[dict]:
+        return self.archives.get((year, month), [])
+
+
+def extract_partial_months(chess_api_client: InMemoryArchiveClient) -> int:
+    """
+    Extracts days 11 to 20 of every month of the archives, like the partial first and last months of a window
+    and the overlap of incremental runs. Returns the number of extracted games.
+    """
+    games_count = 0
+    for year, month in sorted(chess_api_client.archives):
+        games_count += extract_games(f"{year}-{month:02d}-11", f"{year}-{month:02d}-20", chess_api_client).shape[0]
+    return games_count
+
+
+def timed(func, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_scale(scale: int, seed: int, stages: list[str], eco_codes: pd.DataFrame, load_batch_size: int) -> list[dict]:
+    """Generates `scale` games and times every requested stage on them"""
+    games = GameGenerator(seed=seed).generate_games(BENCHMARK_USERNAME, scale)
+    results = []
+
+    def add_result(stage: str, seconds: float) -> None:
+        results.append({"stage": stage, "scale": scale, "seconds": round(seconds, 4),
+                        "games_per_sec": round(scale / seconds, 1) if seconds > 0 else None})
+        print(f"{stage:>20} | {scale:>9} games | {seconds:10.3f} s | {scale / seconds:12.1f} games/s")
+
+    if "pgn_to_dict" in stages:
+        seconds, _ = timed(lambda: [pgn_to_dict(game["pgn"]) for game in games])
+        add_result("pgn_to_dict", seconds)
+
+    if "extract_games" in stages:
+        # games/s of all games in the fetched archives, about two thirds of them are outside the windows
+        seconds, _ = timed(extract_partial_months, InMemoryArchiveClient(BENCHMARK_USERNAME, games))
+        add_result("extract_games", seconds)
+
+    seconds, parsed_games = timed(lambda: [parse_game(game, BENCHMARK_USERNAME) for game in games])
+    if "parse_game" in stages:
+        add_result("parse_game", seconds)
+    del games
+    valid_games = pd.DataFrame(parsed_games)
+    del parsed_games
+
+    if "_get_avg_move_time" in stages:
+        seconds, _ = timed(_get_avg_move_time, valid_games.copy())
+        add_result("_get_avg_move_time", seconds)
+
+    if "transform_columnar" in stages:
+        seconds, _ = timed(transform_columnar, valid_games, eco_codes)
+        add_result("transform_columnar", seconds)
+
+    seconds, transformed_games = timed(transform, valid_games, eco_codes)
+    if "transform" in stages:
+        add_result("transform", seconds)
+
+    if "load" in stages:
+        from app.connectors.postgresql import PostgreSqlClient
+
+        postgresql_client = PostgreSqlClient(
+            server_name=os.environ.get("SERVER_NAME"),
+            database_name=os.environ.get("DATABASE_NAME"),
+            username=os.environ.get("DB_USERNAME"),
+            password=os.environ.get("DB_PASSWORD"),
+            port=os.environ.get("PORT"),
+        )
+        metadata = MetaData()
+        table = get_games_table(metadata, table_name="benchmark_games")
+        postgresql_client.drop_table(table.name)
+
+        def load_in_batches():
+            for i in range(0, transformed_games.shape[0], load_batch_size):
+                load(df=transformed_games.iloc[i:i + load_batch_size],
+                     postgresql_client=postgresql_client,
+                     table=table,
+                     metadata=metadata,
+                     load_method="upsert")
+
+        seconds, _ = timed(load_in_batches)
+        add_result("load", seconds)
+        postgresql_client.drop_table(table.name)
+    return results
+
+
+def read_history(results_path: Path) -> list[dict]:
+    if not results_path.exists():
+        return []
+    with open(results_path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def find_regressions(results: list[dict], history: list[dict], threshold: float) -> list[str]:
+    """Compares every result with the best earlier timing of the same stage and scale"""
+    regressions = []
+    for result in results:
+        previous = [
+            record["seconds"] for record in history
+            if record["stage"] == result["stage"] and record["scale"] == result["scale"]
+        ]
+        if previous and result["seconds"] > min(previous) * threshold:
+            regressions.append(
+                f"{result['stage']} at {result['scale']} games took {result['seconds']:.3f} s, "
+                f"best so far is {min(previous):.3f} s (threshold x{threshold})"
+            )
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the games ETL on synthetic chess.com games")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="number of games per run")
+    parser.add_argument("--stages", nargs="+", default=STAGES[:-1], choices=STAGES, help="stages to time")
+    parser.add_argument("--load", action="store_true", help="also time the load stage (needs postgres)")
+    parser.add_argument("--load-batch-size", type=int, default=1000, help="rows per load call")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the game generator")
+    parser.add_argument("--results-file", default="app_tests/benchmarks/results.jsonl", help="jsonl history of timings")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown factor reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with 1 if a regression is found")
+    args = parser.parse_args(argv)
+
+    stages = args.stages + (["load"] if args.load and "load" not in args.stages else [])
+    eco_codes = extract_eco_codes("app/assets/data/eco_codes.csv")
+    run_info = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+    }
+
+    results = []
+    for scale in args.scales:
+        results += run_scale(scale, args.seed, stages, eco_codes, args.load_batch_size)
+
+    results_path = Path(args.results_file)
+    regressions = find_regressions(results, read_history(results_path), args.threshold)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "a") as file:
+        for result in results:
+            file.write(json.dumps({**run_info, **result}) + "\n")
+
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
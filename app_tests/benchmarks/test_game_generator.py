@@ -0,0 +1,31 @@
+from app.assets.Chess import parse_game, transform, transform_columnar, extract_eco_codes, CATEGORICAL_COLUMNS
+from app_tests.benchmarks.game_generator import GameGenerator
+import pandas as pd
+
+
+def test_generator_is_seeded():
+    assert GameGenerator(seed=7).generate_games('dolols', 50) == GameGenerator(seed=7).generate_games('dolols', 50)
+
+
+def test_generated_games_go_through_transform():
+    archive = GameGenerator(seed=1).generate_monthly_archive('dolols', year=2024, month=5, games_count=200)
+
+    valid_games = pd.DataFrame([parse_game(game, 'dolols') for game in archive['games']])
+    transformed_games = transform(valid_games, extract_eco_codes('app/assets/data/eco_codes.csv'))
+
+    assert transformed_games.shape[0] == 200
+    assert set(transformed_games['game_mode']) == {'bullet', 'blitz', 'rapid', 'daily'}
+    assert transformed_games['opening'].notna().all()
+    assert (transformed_games['game_duration_sec'] >= 0).all()
+
+
+def test_columnar_transform_matches_transform():
+    archive = GameGenerator(seed=2).generate_monthly_archive('dolols', year=2024, month=5, games_count=200)
+    valid_games = pd.DataFrame([parse_game(game, 'dolols') for game in archive['games']])
+    eco_codes = extract_eco_codes('app/assets/data/eco_codes.csv')
+
+    columnar_games = transform_columnar(valid_games, eco_codes)
+    transformed_games = transform(valid_games, eco_codes)
+
+    assert (columnar_games.dtypes[CATEGORICAL_COLUMNS] == 'category').all()
+    pd.testing.assert_frame_equal(columnar_games.astype({column: object for column in CATEGORICAL_COLUMNS}), transformed_games)
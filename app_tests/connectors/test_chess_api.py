@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 from app.connectors.Chess import ChessApiClient
+from app_tests.benchmarks.fake_chess_api import FakeChessApiServer
 import os
 import pytest
 
@@ -16,3 +17,25 @@ def test_chess_client_get_players(setup):
 
     assert type(data) == dict
     assert len(data) > 0
+
+
+def test_chess_client_retries_throttled_requests():
+    with FakeChessApiServer(usernames=['dolols'], months=['2024-04', '2024-05'], games_per_month=5,
+                            fail_first_requests=2, error_status_codes=[429], retry_after=0) as server:
+        chess_api_client = ChessApiClient('dolols', user_agent='test', api_path=server.api_path, backoff_factor=0)
+
+        assert chess_api_client.get_archive_urls() == [
+            f"{server.api_path}/player/dolols/games/2024/04",
+            f"{server.api_path}/player/dolols/games/2024/05",
+        ]
+        assert server.status_counts == {429: 2, 200: 1}
+        assert len(chess_api_client.get_monthly_games(year=2024, month=5)) == 5
+
+
+def test_chess_client_raises_when_monthly_games_fail():
+    with FakeChessApiServer(usernames=['dolols'], months=['2024-05'], games_per_month=5,
+                            fail_first_requests=5, error_status_codes=[503], retry_after=0) as server:
+        chess_api_client = ChessApiClient('dolols', user_agent='test', api_path=server.api_path, max_retries=1, backoff_factor=0)
+
+        with pytest.raises(Exception, match="failed to extract games of dolols for 2024-05 from chess API. status Codes: 503"):
+            chess_api_client.get_monthly_games(year=2024, month=5)
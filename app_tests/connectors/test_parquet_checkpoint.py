@@ -0,0 +1,25 @@
+from app.assets.Chess import parse_game, transform, extract_eco_codes
+from app.connectors.parquet_checkpoint import ParquetCheckpoint
+import pandas as pd
+import json
+
+
+def test_parquet_checkpoint_round_trip(tmp_path):
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+
+    transformed_games = transform(
+        pd.DataFrame([parse_game(raw_game, 'dolols')]),
+        extract_eco_codes('app/assets/data/eco_codes.csv'),
+    )
+    checkpoint = ParquetCheckpoint(tmp_path)
+    file_paths = checkpoint.write(transformed_games)
+
+    assert [file_path.parent.relative_to(tmp_path).as_posix() for file_path in file_paths] == ['username=dolols/month=2024-05']
+    assert checkpoint.pending_files(username='dolols') == file_paths
+
+    batches = list(checkpoint.iter_batches(file_paths[0], batch_size=1))
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), transformed_games)
+
+    checkpoint.mark_loaded(file_paths[0])
+    assert checkpoint.pending_files() == []
@@ -0,0 +1,23 @@
+from app.connectors.postgresql import PostgreSqlClient
+from sqlalchemy import Table, MetaData, Column, Integer, String, Index, create_engine, inspect
+
+
+def test_monthly_partition_sql():
+    postgresql_client = PostgreSqlClient(server_name='localhost', database_name='postgres', username='postgres', password='postgres')
+
+    assert postgresql_client.get_monthly_partition_sql('games', '2023-12') == (
+        "create table if not exists games_p2023_12 partition of games for values from ('2023-12-01') to ('2024-01-01')"
+    )
+
+
+def test_create_table_creates_declared_indexes():
+    postgresql_client = PostgreSqlClient(server_name='localhost', database_name='postgres', username='postgres', password='postgres')
+    # the DDL of tables without partitioning is portable, so it can be checked on sqlite
+    postgresql_client.engine = create_engine('sqlite://')
+    metadata = MetaData()
+    table = Table('games', metadata, Column('game_id', Integer, primary_key=True), Column('username', String))
+    Index('games_username_idx', table.columns['username'])
+
+    postgresql_client.create_table(table_name='games', metadata=metadata)
+
+    assert [index['name'] for index in inspect(postgresql_client.engine).get_indexes('games')] == ['games_username_idx']
@@ -0,0 +1,18 @@
+from app.connectors.raw_archive import RawArchiveLake, RawArchiveChessClient
+import json
+
+
+def test_raw_archive_round_trip(tmp_path):
+    with open('app_tests/assets/inputs/raw_game.txt', 'r') as file:
+        raw_game = json.loads(file.read())
+
+    raw_archive = RawArchiveLake(tmp_path)
+    file_path = raw_archive.write_monthly_games(username='Dolols', year=2024, month=5, games=[raw_game])
+
+    assert file_path == tmp_path / 'username=dolols' / 'month=2024-05' / 'games.json.gz'
+    assert raw_archive.list_usernames() == ['dolols']
+    assert raw_archive.list_months('dolols') == ['2024-05']
+
+    chess_client = RawArchiveChessClient('dolols', raw_archive)
+    assert chess_client.get_monthly_games(year=2024, month=5) == [raw_game]
+    assert chess_client.get_monthly_games(year=2024, month=6) == []